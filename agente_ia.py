@@ -1,153 +1,215 @@
 # agente_ia.py
+import asyncio
+import base64
+import json
+import logging
 import os
-from groq import Groq
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from html import escape
 from dotenv import load_dotenv
-from base_datos import BaseDatos
+from asesor_indices import AsesorIndices
+from base_datos import BaseDatos, PresupuestoConsulta, PresupuestoExcedido, TABLAS, TABLAS_BUSQUEDA
+from cache_consultas import CachePreguntas, CacheResultados, normalizar_pregunta, tablas_de_consulta
+from esquema_prompt import PREFIJO_BUSQUEDA, PREFIJO_RESUMEN, PodadorPrompt, formatear_esquema
+from metricas import MedicionPregunta, Metricas, muestra
+from motor_columnar import MotorColumnar
+from paginacion import Paginador
+from proveedores_llm import RouterLLM, crear_proveedores
+from renderizador import filas_html, formatear_valor, tipo_columna
+from trazas import GrabadorTrazas
+from ruta_rapida import IndiceEntidades, RutaRapida
+from validador_sql import ValidadorSQL, extraer_sentencia, puede_terminar, quitar_tope
 
 # Cargar variables de entorno
 load_dotenv()
 
-class AgenteIA:
-    def __init__(self):
-        self.bd = BaseDatos()
-        self.cliente_groq = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        self.esquema_bd = self._obtener_esquema_bd()
-    
-    def _obtener_esquema_bd(self):
-        """Retorna el esquema completo de la base de datos para el prompt"""
-        return """
-        ESQUEMA DE BASE DE DATOS:
-
-        TABLA categorias:
-        - id (INTEGER, PRIMARY KEY)
-        - nombre (TEXT)
-
-        TABLA proveedores:
-        - id (INTEGER, PRIMARY KEY)
-        - nombre (TEXT)
-        - contacto (TEXT)
-        - telefono (TEXT)
+registro = logging.getLogger(__name__)
 
-        TABLA productos:
-        - id (INTEGER, PRIMARY KEY)
-        - nombre (TEXT)
-        - descripcion (TEXT)
-        - precio (REAL)
-        - stock (INTEGER)
-        - categoria_id (INTEGER, FOREIGN KEY a categorias.id)
-        - proveedor_id (INTEGER, FOREIGN KEY a proveedores.id)
+# Ejemplos few-shot del prompt (pregunta, SQL esperado); también los reproduce benchmark_escala.py
+EJEMPLOS_PROMPT = [
+    ('lista de empleados',
+     "SELECT * FROM empleados"),
+    ('productos con stock bajo',
+     "SELECT nombre, precio, stock FROM productos WHERE stock < 10"),
+    ('ventas de María González',
+     "SELECT v.*, c.nombre as cliente, e.nombre as empleado FROM ventas v JOIN clientes c ON v.cliente_id = c.id JOIN empleados e ON v.empleado_id = e.id WHERE v.cliente_id IN (SELECT rowid FROM fts_clientes WHERE fts_clientes MATCH 'nombre: \"María González\"')"),
+    ('qué ha comprado Carlos Rodríguez',
+     "SELECT p.nombre as producto, dv.cantidad, dv.precio_unitario, v.fecha FROM ventas v JOIN detalles_venta dv ON v.id = dv.venta_id JOIN productos p ON dv.producto_id = p.id WHERE v.cliente_id IN (SELECT rowid FROM fts_clientes WHERE fts_clientes MATCH 'nombre: \"Carlos Rodríguez\"')"),
+    ('productos de la categoría electrónicos',
+     "SELECT p.nombre, p.precio, p.stock FROM productos p JOIN categorias c ON p.categoria_id = c.id WHERE c.nombre LIKE '%Electrónicos%'"),
+    ('ventas de este mes',
+     "SELECT v.id, c.nombre as cliente, e.nombre as empleado, v.total, v.fecha FROM ventas v JOIN clientes c ON v.cliente_id = c.id JOIN empleados e ON v.empleado_id = e.id WHERE v.fecha >= date('now', 'start of month')"),
+    ('empleados que son vendedores',
+     "SELECT nombre, email, fecha_contratacion FROM empleados WHERE id IN (SELECT rowid FROM fts_empleados WHERE fts_empleados MATCH 'rol: vendedor')"),
+    ('clientes de Bogotá',
+     "SELECT nombre, email, telefono FROM clientes WHERE id IN (SELECT rowid FROM fts_clientes WHERE fts_clientes MATCH 'ciudad: Bogotá')"),
+    ('productos más vendidos',
+     "SELECT p.nombre, SUM(r.cantidad) as total_vendido FROM resumen_ventas_producto_dia r JOIN productos p ON r.producto_id = p.id GROUP BY p.id, p.nombre ORDER BY total_vendido DESC"),
+    ('total vendido este mes',
+     "SELECT SUM(total) as total_vendido, SUM(ventas) as numero_ventas FROM resumen_ventas_cliente_dia WHERE fecha >= date('now', 'start of month')"),
+    ('ventas por categoría',
+     "SELECT c.nombre as categoria, SUM(r.cantidad) as unidades, SUM(r.ingresos) as ingresos FROM resumen_ventas_categoria_dia r JOIN categorias c ON r.categoria_id = c.id GROUP BY c.id, c.nombre ORDER BY ingresos DESC"),
+]
 
-        TABLA clientes:
-        - id (INTEGER, PRIMARY KEY)
-        - nombre (TEXT)
-        - email (TEXT)
-        - telefono (TEXT)
-        - ciudad (TEXT)
-        - fecha_registro (DATE)
+# Formatos de respuesta de procesar_pregunta: la tabla HTML armada en el servidor o el resultado por columnas
+FORMATOS = ('html', 'columnas')
 
-        TABLA empleados:
-        - id (INTEGER, PRIMARY KEY)
-        - nombre (TEXT)
-        - email (TEXT)
-        - rol (TEXT)
-        - fecha_contratacion (DATE)
-
-        TABLA ventas:
-        - id (INTEGER, PRIMARY KEY)
-        - cliente_id (INTEGER, FOREIGN KEY a clientes.id)
-        - empleado_id (INTEGER, FOREIGN KEY a empleados.id)
-        - fecha (DATE)
-        - total (REAL)
-        - estado (TEXT)
-
-        TABLA detalles_venta:
-        - id (INTEGER, PRIMARY KEY)
-        - venta_id (INTEGER, FOREIGN KEY a ventas.id)
-        - producto_id (INTEGER, FOREIGN KEY a productos.id)
-        - cantidad (INTEGER)
-        - precio_unitario (REAL)
-
-        RELACIONES PRINCIPALES:
-        - productos.categoria_id → categorias.id
-        - productos.proveedor_id → proveedores.id
-        - ventas.cliente_id → clientes.id
-        - ventas.empleado_id → empleados.id
-        - detalles_venta.venta_id → ventas.id
-        - detalles_venta.producto_id → productos.id
+class AgenteIA:
+    def __init__(self, archivo_bd="ventas.db", max_conexiones_llm=200, max_filas_streaming=1000,
+                 tamano_lote_streaming=500, max_paralelo_lote=8, timeout_lote=30.0, presupuesto=None,
+                 proveedores=None):
+        self.bd = BaseDatos(archivo_bd)
+        # Executor acotado al tamaño del pool: SQLite no gana nada con más hilos
+        self.executor_bd = ThreadPoolExecutor(max_workers=self.bd.pool.tamano, thread_name_prefix="sqlite")
+        # Llamadas al LLM de los lotes: el tope de hilos es el tope de peticiones simultáneas
+        self.executor_llm = ThreadPoolExecutor(max_workers=max_paralelo_lote, thread_name_prefix="llm")
+        self.timeout_lote = timeout_lote
+        self._esquema_texto = (None, None)
+        self.podador = PodadorPrompt(EJEMPLOS_PROMPT)
+        self.cache_preguntas = CachePreguntas()
+        self.cache_resultados = CacheResultados()
+        self.asesor_indices = AsesorIndices(self.bd, TABLAS)
+        self.validador = ValidadorSQL(self.bd)
+        # Plantillas con parámetros para las preguntas tipo "ventas de <cliente>": no pasan por el LLM
+        self.ruta_rapida = RutaRapida(IndiceEntidades(self.bd))
+        # Presupuesto de ejecución si el endpoint no pasa uno propio
+        self.presupuesto = presupuesto or PresupuestoConsulta(
+            'agente', segundos=10.0, pasos_vm=500_000_000, max_filas=self.validador.limite_filas)
+        self.max_filas_streaming = max_filas_streaming
+        self.tamano_lote_streaming = tamano_lote_streaming
+        self.metricas = Metricas()
+        # Backends que traducen preguntas a SQL, en el orden de PROVEEDORES_LLM (ver proveedores_llm.py)
+        proveedores = proveedores or crear_proveedores(os.getenv('PROVEEDORES_LLM', 'plantillas,groq'),
+                                                       self.metricas, max_conexiones_llm)
+        self.router = RouterLLM(proveedores, metricas=self.metricas)
+        # Agregaciones sobre ventas/detalles_venta con numpy sobre una copia columnar (ver motor_columnar.py)
+        self.motor_columnar = None
+        if MotorColumnar.disponible() and os.getenv('MOTOR_COLUMNAR', '1') != '0':
+            self.motor_columnar = MotorColumnar(self.bd, metricas=self.metricas)
+        # Páginas de la API JSON: siguen a la última fila entregada en vez de usar OFFSET (ver paginacion.py)
+        self.paginador = Paginador(self.bd, limite_filas=self.validador.limite_filas, metricas=self.metricas)
+        self.metricas.describir('agente_sql_rechazado_total', 'counter', "SQL del LLM rechazado por el validador")
+        self.metricas.describir('agente_ruta_rapida_total', 'counter',
+                                "Preguntas por plantilla de la ruta rápida ('ninguna' = siguieron al LLM)")
+        self.metricas.describir('agente_presupuesto_excedido_total', 'counter',
+                                "Consultas cortadas por tiempo, pasos de la VM o filas, por endpoint")
+        # Fracción de consultas cuyas filas se muestran en el log DEBUG (y solo las primeras)
+        self.muestreo_log = 0.01
+        self.filas_muestra_log = 5
+        # Pasa a True cuando precalentar() termina; lo expone la ruta /listo
+        self.listo = False
+        # Trazas de procesar_pregunta para repetirlas offline y comparar versiones (ver trazas.py)
+        self.grabador = None
+        if os.getenv('GRABAR_TRAZAS'):
+            self.grabador = GrabadorTrazas(os.environ['GRABAR_TRAZAS'],
+                                           float(os.getenv('GRABAR_TRAZAS_MUESTREO', '1')))
+    
+    def precalentar(self, ejecutar_ejemplos=True):
+        """Construye esquema, prompts, validaciones y resultados de los ejemplos antes de atender.
+        
+        servidor_prefork lo llama antes de hacer fork para que los hijos hereden todo por copy-on-write.
+        Retorna los segundos de cada paso.
         """
+        informe = {}
+        inicio = time.perf_counter()
+        self.ruta_rapida.indice.actualizar(forzar=True)
+        informe['entidades'] = time.perf_counter() - inicio
+        
+        inicio = time.perf_counter()
+        self._formatear_esquema()
+        for entrada, _ in EJEMPLOS_PROMPT:
+            self._generar_prompt(entrada)
+        informe['prompt'] = time.perf_counter() - inicio
+        
+        inicio = time.perf_counter()
+        validos = []
+        for entrada, sql in EJEMPLOS_PROMPT:
+            validacion = self.validador.validar(sql)
+            if validacion.valido:
+                # Los ejemplos son pares pregunta/SQL correctos: esas preguntas no necesitan el LLM
+                self.cache_preguntas.guardar(entrada, validacion.sql, self.esquema_bd)
+                validos.append(validacion.sql)
+            else:
+                registro.warning("Ejemplo del prompt rechazado por el validador (%s): %s", validacion.motivo, sql)
+        informe['validacion'] = time.perf_counter() - inicio
+        
+        if self.motor_columnar is not None:
+            # La primera vez copia ventas y detalles_venta completas; después, solo las filas nuevas
+            inicio = time.perf_counter()
+            try:
+                self.motor_columnar.preparar()
+            except (OSError, ValueError) as e:
+                registro.warning("Motor columnar desactivado: %s", e)
+                self.motor_columnar = None
+            informe['columnar'] = time.perf_counter() - inicio
+        
+        inicio = time.perf_counter()
+        if ejecutar_ejemplos:
+            for sql in validos:
+                try:
+                    self._consultar(sql)
+                except PresupuestoExcedido as e:
+                    registro.warning("Ejemplo del prompt sin precalentar: %s", e)
+        informe['ejemplos'] = time.perf_counter() - inicio
+        
+        self.listo = True
+        registro.info("Agente precalentado: %s", ', '.join(f"{paso} {segundos:.2f}s" for paso, segundos in informe.items()))
+        return informe
     
-    def _generar_prompt(self, pregunta):
-        """Genera el prompt estricto para Groq"""
-        return f"""
-        Eres exclusivamente un generador de consultas SQL. Tu única función es convertir preguntas en español a código SQL.
-
-        {self.esquema_bd}
-
-        REGLAS ESTRICTAS:
-        1. RESPUESTA ÚNICAMENTE CON EL CÓDIGO SQL
-        2. NO incluyas explicaciones, texto adicional, comentarios o saludos
-        3. NO uses markdown, backticks, o formato especial
-        4. SIEMPRE comienza directamente con SELECT
-        5. Si no entiendes la pregunta, genera una consulta por defecto: SELECT * FROM productos LIMIT 5
-
-        EJEMPLOS DE ENTRADA/SALIDA:
-        Entrada: "lista de empleados"
-        Salida: SELECT * FROM empleados
-
-        Entrada: "productos con stock bajo" 
-        Salida: SELECT nombre, precio, stock FROM productos WHERE stock < 10
-
-        Entrada: "ventas de María González"
-        Salida: SELECT v.*, c.nombre as cliente, e.nombre as empleado FROM ventas v JOIN clientes c ON v.cliente_id = c.id JOIN empleados e ON v.empleado_id = e.id WHERE c.nombre LIKE '%María González%'
-
-        Entrada: "qué ha comprado Carlos Rodríguez"
-        Salida: SELECT p.nombre as producto, dv.cantidad, dv.precio_unitario, v.fecha FROM ventas v JOIN clientes c ON v.cliente_id = c.id JOIN detalles_venta dv ON v.id = dv.venta_id JOIN productos p ON dv.producto_id = p.id WHERE c.nombre LIKE '%Carlos Rodríguez%'
-
-        Entrada: "productos de la categoría electrónicos"
-        Salida: SELECT p.nombre, p.precio, p.stock FROM productos p JOIN categorias c ON p.categoria_id = c.id WHERE c.nombre LIKE '%Electrónicos%'
-
-        Entrada: "ventas de este mes"
-        Salida: SELECT v.id, c.nombre as cliente, e.nombre as empleado, v.total, v.fecha FROM ventas v JOIN clientes c ON v.cliente_id = c.id JOIN empleados e ON v.empleado_id = e.id WHERE v.fecha >= date('now', 'start of month')
+    @property
+    def esquema_bd(self):
+        """Esquema completo, introspectado de SQLite; se regenera solo si cambia schema_version"""
+        return self._formatear_esquema()
+    
+    def _formatear_esquema(self):
+        """Introspecta el esquema y arma su texto para el prompt, o reusa el texto si schema_version no cambió"""
+        esquema = self.bd.introspeccionar_esquema()
+        if self._esquema_texto[0] is not esquema:
+            self._esquema_texto = (esquema, formatear_esquema(esquema))
+        return self._esquema_texto[1]
+    
+    def _generar_prompt(self, pregunta, podar=True):
+        """Genera el prompt estricto para Groq con solo las tablas y ejemplos relevantes a la pregunta"""
+        esquema = self.bd.introspeccionar_esquema()
+        tablas, ejemplos = self.podador.podar(pregunta, esquema) if podar else (None, EJEMPLOS_PROMPT)
+        reglas = [
+            "1. RESPUESTA ÚNICAMENTE CON EL CÓDIGO SQL",
+            "2. NO incluyas explicaciones, texto adicional, comentarios o saludos",
+            "3. NO uses markdown, backticks, o formato especial",
+            "4. SIEMPRE comienza directamente con SELECT",
+            "5. Si no entiendes la pregunta, genera una consulta por defecto: SELECT * FROM productos LIMIT 5",
+        ]
+        if tablas is None or any(tabla.startswith(PREFIJO_RESUMEN) for tabla in tablas):
+            reglas.append(f"{len(reglas) + 1}. Para totales, sumas y rankings por día, producto, categoría, cliente o empleado "
+                          "usa las tablas resumen_*, no ventas ni detalles_venta")
+        if tablas is None or any(tabla.startswith(PREFIJO_BUSQUEDA) for tabla in tablas):
+            reglas.append(f"{len(reglas) + 1}. Para buscar por nombre, ciudad, rol o descripción usa las tablas fts_* "
+                          "con MATCH en lugar de LIKE: id IN (SELECT rowid FROM fts_x WHERE fts_x MATCH 'columna: \"texto\"'); "
+                          "MATCH ignora tildes y mayúsculas")
+        ejemplos_texto = '\n\n'.join(f'Entrada: "{entrada}"\nSalida: {sql};' for entrada, sql in ejemplos)
+        return f"""Eres exclusivamente un generador de consultas SQL (SQLite). Tu única función es convertir preguntas en español a código SQL.
 
-        Entrada: "empleados que son vendedores"
-        Salida: SELECT nombre, email, fecha_contratacion FROM empleados WHERE rol LIKE '%vendedor%'
+{formatear_esquema(esquema, tablas)}
 
-        Entrada: "clientes de Bogotá"
-        Salida: SELECT nombre, email, telefono FROM clientes WHERE ciudad LIKE '%Bogotá%'
+REGLAS ESTRICTAS:
+{chr(10).join(reglas)}
 
-        Entrada: "productos más vendidos"
-        Salida: SELECT p.nombre, SUM(dv.cantidad) as total_vendido FROM detalles_venta dv JOIN productos p ON dv.producto_id = p.id GROUP BY p.id, p.nombre ORDER BY total_vendido DESC
+EJEMPLOS DE ENTRADA/SALIDA:
+{ejemplos_texto}
 
-        INSTRUCCIÓN FINAL: 
-        Responde EXCLUSIVAMENTE con el código SQL, sin nada más.
+INSTRUCCIÓN FINAL: Responde EXCLUSIVAMENTE con el código SQL terminado en ;, sin nada más.
 
-        Entrada: "{pregunta}"
-        Salida:
-        """
-    
-    def _es_sql_seguro(self, sql):
-        """Valida que el SQL sea seguro para ejecutar"""
-        if not sql:
-            return False
-            
-        sql_upper = sql.upper().strip()
-        
-        # Solo permitir SELECT
-        if not sql_upper.startswith('SELECT'):
-            return False
-            
-        # Bloquear palabras peligrosas
-        palabras_peligrosas = ['DROP', 'DELETE', 'UPDATE', 'INSERT', 'ALTER', 'CREATE', 'TRUNCATE']
-        for palabra in palabras_peligrosas:
-            if palabra in sql_upper:
-                return False
-                
-        return True
+Entrada: "{pregunta}"
+Salida:"""
     
-    def _formatear_sql_para_html(self, sql):
+    def _formatear_sql_para_html(self, sql, parametros=()):
         """Formatea el SQL para mostrarlo bonito en HTML"""
         # Limpiar y formatear el SQL
         sql_limpio = sql.strip()
+        if parametros:
+            # Los valores de los ? van aparte en el SQL; se muestran como comentario
+            sql_limpio += "\n-- ? = " + ', '.join(repr(valor) for valor in parametros)
         
         # Crear caja de código con estilo
         sql_html = f"""
@@ -157,86 +219,370 @@ class AgenteIA:
                 <strong>SQL Generado</strong>
             </div>
             <div class='sql-code'>
-                <pre><code>{sql_limpio}</code></pre>
+                <pre><code>{escape(sql_limpio, quote=False)}</code></pre>
             </div>
         </div>
         """
         return sql_html
     
-    def _ejecutar_sql(self, sql):
-        """Ejecuta SQL y retorna SQL formateado + resultados"""
+    def _consultar(self, sql, medicion=None, presupuesto=None, parametros=()):
+        """Ejecuta el SQL pasando por la cache de resultados"""
+        # Las versiones se leen ANTES de ejecutar: si hay una escritura en medio,
+        # la entrada queda con una versión vieja y se invalida en la próxima lectura
+        versiones = self.bd.versiones_tablas()
+        if self.cache_resultados.es_cacheable(sql):
+            resultado = self.cache_resultados.obtener(sql, versiones, parametros)
+            if resultado is not None:
+                return resultado
+        
+        resultado = None
+        if self.motor_columnar is not None:
+            resultado = self.motor_columnar.ejecutar(sql, parametros, versiones, medicion)
+        if resultado is None:
+            inicio = time.perf_counter()
+            resultado = self.bd.ejecutar_consulta(sql, parametros, medicion=medicion,
+                                                  presupuesto=presupuesto or self.presupuesto)
+            if resultado is not None:
+                self.asesor_indices.registrar(sql, time.perf_counter() - inicio, parametros)
+        if resultado is not None:
+            self.cache_resultados.guardar(sql, tablas_de_consulta(sql, TABLAS, TABLAS_BUSQUEDA), versiones, resultado, parametros)
+        return resultado
+    
+    def _registrar_muestra(self, resultados, nombres_columnas):
+        """Muestra unas pocas filas en DEBUG para una fracción de las consultas, nunca el resultado completo"""
+        if registro.isEnabledFor(logging.DEBUG) and muestra(self.muestreo_log):
+            registro.debug("Muestra de resultados (%d filas, columnas %s): %r",
+                           len(resultados), nombres_columnas, resultados[:self.filas_muestra_log])
+    
+    def _presupuesto_excedido(self, error, sql, medicion):
+        """Cuenta la consulta cortada por su presupuesto y retorna el mensaje de error"""
+        medicion.resultado = 'presupuesto'
+        self.metricas.incrementar('agente_presupuesto_excedido_total',
+                                  endpoint=error.presupuesto.nombre, limite=error.limite)
+        registro.warning("Presupuesto excedido (%s) en %r: %s", error.limite, sql, error)
+        return f"<div class='mensaje-error'>{error}</div>"
+    
+    def _error(self, html, formato):
+        """El mensaje de error en el formato de la respuesta: el HTML tal cual, o {'error': html} por columnas"""
+        return html if formato == 'html' else {'error': html}
+    
+    def _ejecutar_sql(self, sql, medicion=None, presupuesto=None, parametros=(), formato='html'):
+        """Ejecuta SQL y retorna SQL formateado + resultados, en HTML o por columnas según `formato`"""
+        medicion = medicion or MedicionPregunta()
         try:
-            print(f"Ejecutando SQL: {sql}")
-            resultado_completo = self.bd.ejecutar_consulta(sql)
+            registro.debug("Ejecutando SQL: %s %r", sql, parametros)
+            resultado_completo = self._consultar(sql, medicion, presupuesto, parametros)
             
             if not resultado_completo:
-                return "<div class='mensaje-error'>Error al ejecutar la consulta</div>"
-            
-            resultados = resultado_completo['datos']
-            nombres_columnas = resultado_completo['columnas']
-            
-            print(f"Resultados obtenidos: {resultados}")
-            print(f"Nombres de columnas: {nombres_columnas}")
-            
-            # Formatear SQL para mostrar
-            sql_html = self._formatear_sql_para_html(sql)
+                medicion.resultado = 'error'
+                return self._error("<div class='mensaje-error'>Error al ejecutar la consulta</div>", formato)
             
-            # Formatear resultados de tabla
-            tabla_html = self._formatear_resultados(resultados, nombres_columnas)
-            
-            # Combinar SQL + Tabla
-            return sql_html + tabla_html
+            # SQL formateado + tabla de resultados
+            return self._renderizar(sql, resultado_completo, medicion, parametros, formato)
             
+        except PresupuestoExcedido as e:
+            return self._error(self._presupuesto_excedido(e, sql, medicion), formato)
         except Exception as e:
-            print(f"Error ejecutando SQL: {e}")
-            return f"<div class='mensaje-error'>Error en la consulta: {str(e)}</div>"
+            medicion.resultado = 'error'
+            registro.warning("Error ejecutando SQL %r: %s", sql, e)
+            return self._error(f"<div class='mensaje-error'>Error en la consulta: {str(e)}</div>", formato)
+    
+    def _validar_respuesta_llm(self, pregunta, respuesta, medicion=None):
+        """Extrae y valida el SQL de una RespuestaLLM; retorna (sql, html_error)"""
+        medicion = medicion or MedicionPregunta()
+        with medicion.etapa('validacion'):
+            # Solo la primera sentencia: lo que el LLM escriba después del ';' o del ``` se descarta
+            sql_generado, _ = extraer_sentencia(respuesta.texto, final=True)
+            validacion = self.validador.validar(sql_generado)
+
+        registro.info("SQL generado por %s: %s", respuesta.proveedor, sql_generado)
+
+        # Validar seguridad y costo
+        if not validacion.valido:
+            medicion.resultado = 'rechazada'
+            self.metricas.incrementar('agente_sql_rechazado_total')
+            registro.warning("SQL de %s rechazado (%s): %s", respuesta.proveedor, validacion.motivo, sql_generado)
+            return None, f"<div class='mensaje-error'>Consulta no permitida: {validacion.motivo}</div>"
+        
+        # Solo se cachea SQL que pasó la validación, ya con su LIMIT
+        medicion.resultado = 'ok'
+        self.cache_preguntas.guardar(pregunta, validacion.sql, self.esquema_bd)
+        return validacion.sql, None
+    
+    def _prompt_medido(self, pregunta, medicion):
+        with medicion.etapa('prompt'):
+            return self._generar_prompt(pregunta)
+    
+    def _especulador(self):
+        """Callback `especular` para el stream del LLM: valida (con su EXPLAIN) el SQL parcial en segundo plano.
+
+        Mientras el modelo termina la sentencia se valida lo que ya llegó, si podría ser la sentencia
+        entera y de a una validación a la vez; si el texto final coincide con la última, su validación
+        es un acierto de la cache del validador.
+        """
+        pendiente = None
+        
+        def especular(sql):
+            nonlocal pendiente
+            if (pendiente is None or pendiente.done()) and puede_terminar(sql):
+                pendiente = self.executor_bd.submit(self.validador.validar, sql, 0, True)
+        return especular
+    
+    def _sql_de_proveedores(self, pregunta, medicion):
+        """Pide el SQL a los proveedores del router hasta que uno pase la validación; retorna (sql, html_error)"""
+        error = "<div class='mensaje-error'>No hay un proveedor de LLM disponible</div>"
+        for respuesta in self.router.respuestas(pregunta, lambda: self._prompt_medido(pregunta, medicion), medicion,
+                                                self._especulador()):
+            sql_generado, error = self._validar_respuesta_llm(pregunta, respuesta, medicion)
+            if error is None:
+                return sql_generado, None
+        return None, error
+    
+    async def _sql_de_proveedores_async(self, pregunta, medicion):
+        """Versión asyncio de _sql_de_proveedores: el prompt y la validación leen SQLite, así que van al executor"""
+        loop = asyncio.get_running_loop()
+        error = "<div class='mensaje-error'>No hay un proveedor de LLM disponible</div>"
+        respuestas = self.router.respuestas_async(
+            pregunta, lambda: loop.run_in_executor(self.executor_bd, self._prompt_medido, pregunta, medicion),
+            medicion, self._especulador())
+        async for respuesta in respuestas:
+            sql_generado, error = await loop.run_in_executor(self.executor_bd, self._validar_respuesta_llm, pregunta,
+                                                             respuesta, medicion)
+            if error is None:
+                await respuestas.aclose()
+                return sql_generado, None
+        return None, error
+    
+    def _sql_ruta_rapida(self, pregunta, medicion):
+        """SQL de una plantilla de la ruta rápida; retorna (sql, parametros) o None si la pregunta no encaja"""
+        with medicion.etapa('plantilla'):
+            consulta = self.ruta_rapida.resolver(pregunta)
+            # El SQL de cada plantilla es fijo, así que después de la primera vez esto es un acierto de cache
+            validacion = consulta and self.validador.validar(consulta.sql, marcadores=len(consulta.parametros))
+        self.metricas.incrementar('agente_ruta_rapida_total', intencion=consulta.intencion if consulta else 'ninguna')
+        if consulta is None:
+            return None
+        if not validacion.valido:
+            registro.warning("Plantilla %s rechazada por el validador (%s)", consulta.intencion, validacion.motivo)
+            return None
+        registro.debug("SQL desde la plantilla %s: %s %r", consulta.intencion, validacion.sql, consulta.parametros)
+        return validacion.sql, consulta.parametros
+    
+    def _sql_cacheado(self, pregunta):
+        """SQL ya validado para la pregunta, o None"""
+        sql_generado = self.cache_preguntas.obtener(pregunta, self.esquema_bd)
+        if sql_generado is not None:
+            registro.debug("SQL desde cache: %s", sql_generado)
+        return sql_generado
+    
+    def _generar_sql(self, pregunta, medicion=None):
+        """Obtiene el SQL de una plantilla, la cache o los proveedores de LLM; retorna (sql, parametros, html_error)"""
+        medicion = medicion or MedicionPregunta()
+        # Las plantillas van antes que la cache: reconocen el nombre exacto, la similitud no
+        rapida = self._sql_ruta_rapida(pregunta, medicion)
+        if rapida is not None:
+            return rapida[0], rapida[1], None
+        
+        # Buscar en la cache de preguntas ya resueltas
+        sql_generado = self._sql_cacheado(pregunta)
+        if sql_generado is not None:
+            return sql_generado, (), None
+        
+        sql_generado, error = self._sql_de_proveedores(pregunta, medicion)
+        return sql_generado, (), error
+    
+    def procesar_preguntas(self, preguntas, presupuesto=None):
+        """Procesa varias preguntas juntas y retorna el HTML de cada una en el orden de entrada.
+        
+        Las preguntas repetidas se resuelven una vez, las llamadas al LLM van en paralelo
+        (hasta max_paralelo_lote; los proveedores respetan sus límites de tasa) y todos los SELECT corren en
+        una sola transacción de lectura. Una pregunta que tarda más de timeout_lote en el LLM
+        se responde con error sin frenar a las demás.
+        """
+        # Una entrada por pregunta distinta, con su medición y las posiciones donde aparece
+        unicas = {}
+        for posicion, pregunta in enumerate(preguntas):
+            pregunta = (pregunta or '').strip()
+            if not pregunta:
+                continue
+            clave = normalizar_pregunta(pregunta)
+            if clave not in unicas:
+                unicas[clave] = {'pregunta': pregunta, 'medicion': MedicionPregunta(), 'posiciones': [],
+                                 'sql': None, 'parametros': (), 'html': None}
+            unicas[clave]['posiciones'].append(posicion)
+        
+        pendientes = {}
+        for item in unicas.values():
+            rapida = self._sql_ruta_rapida(item['pregunta'], item['medicion'])
+            if rapida is not None:
+                item['sql'], item['parametros'] = rapida
+                continue
+            item['sql'] = self._sql_cacheado(item['pregunta'])
+            if item['sql'] is None:
+                pendientes[self.executor_llm.submit(self._sql_de_proveedores, item['pregunta'], item['medicion'])] = item
+        
+        terminadas, vencidas = wait(pendientes, timeout=self.timeout_lote)
+        for futuro in vencidas:
+            item = pendientes[futuro]
+            item['medicion'].resultado = 'timeout'
+            item['html'] = "<div class='mensaje-error'>La pregunta tardó demasiado; intenta de nuevo</div>"
+        for futuro in terminadas:
+            item = pendientes[futuro]
+            try:
+                item['sql'], item['html'] = futuro.result()
+            except Exception as e:
+                item['medicion'].resultado = 'error'
+                registro.warning("Error generando SQL para %r: %s", item['pregunta'], e)
+                item['html'] = f"<div class='mensaje-error'>Error al procesar: {str(e)}</div>"
+        
+        self._ejecutar_lote([item for item in unicas.values() if item['html'] is None and item['sql']], presupuesto)
+        
+        respuestas = ["<div class='mensaje-error'>Por favor escribe una pregunta</div>"] * len(preguntas)
+        for item in unicas.values():
+            self.metricas.registrar_pregunta(item['medicion'])
+            for posicion in item['posiciones']:
+                respuestas[posicion] = item['html']
+        return respuestas
     
-    def procesar_pregunta(self, pregunta):
-        """Procesa preguntas usando Groq IA"""
+    def _ejecutar_lote(self, items, presupuesto=None):
+        """Resuelve los SQL del lote con la cache de resultados y una sola transacción para el resto"""
+        versiones = self.bd.versiones_tablas()
+        por_ejecutar = []
+        for item in items:
+            resultado = None
+            if self.cache_resultados.es_cacheable(item['sql']):
+                resultado = self.cache_resultados.obtener(item['sql'], versiones, item['parametros'])
+            if resultado is None and self.motor_columnar is not None:
+                resultado = self.motor_columnar.ejecutar(item['sql'], item['parametros'], versiones, item['medicion'])
+                if resultado is not None:
+                    self.cache_resultados.guardar(item['sql'], tablas_de_consulta(item['sql'], TABLAS, TABLAS_BUSQUEDA),
+                                                  versiones, resultado, item['parametros'])
+            if resultado is None:
+                por_ejecutar.append(item)
+            else:
+                item['html'] = self._renderizar(item['sql'], resultado, item['medicion'], item['parametros'])
+        
+        resultados = self.bd.ejecutar_en_transaccion(
+            [(item['sql'], item['parametros'], item['medicion']) for item in por_ejecutar],
+            presupuesto or self.presupuesto)
+        for item, resultado in zip(por_ejecutar, resultados):
+            if isinstance(resultado, PresupuestoExcedido):
+                item['html'] = self._presupuesto_excedido(resultado, item['sql'], item['medicion'])
+                continue
+            if isinstance(resultado, Exception):
+                item['medicion'].resultado = 'error'
+                registro.warning("Error ejecutando SQL %r: %s", item['sql'], resultado)
+                item['html'] = f"<div class='mensaje-error'>Error en la consulta: {str(resultado)}</div>"
+                continue
+            etapas = item['medicion'].etapas
+            self.asesor_indices.registrar(item['sql'], etapas.get('ejecucion', 0.0) + etapas.get('lectura', 0.0),
+                                          item['parametros'])
+            self.cache_resultados.guardar(item['sql'], tablas_de_consulta(item['sql'], TABLAS, TABLAS_BUSQUEDA), versiones, resultado,
+                                          item['parametros'])
+            item['html'] = self._renderizar(item['sql'], resultado, item['medicion'], item['parametros'])
+    
+    def _renderizar(self, sql, resultado, medicion, parametros=(), formato='html'):
+        """HTML del SQL más la tabla de resultados, o el resultado por columnas si `formato` es 'columnas'"""
+        self._registrar_muestra(resultado['datos'], resultado['columnas'])
+        if self.grabador is not None:
+            medicion.consulta = (sql, parametros, resultado)
+        with medicion.etapa('render'):
+            if formato == 'columnas':
+                return self._formatear_columnas(sql, parametros, resultado['datos'], resultado['columnas'])
+            return (self._formatear_sql_para_html(sql, parametros)
+                    + self._formatear_resultados(resultado['datos'], resultado['columnas']))
+    
+    def procesar_pregunta(self, pregunta, medicion=None, presupuesto=None, formato='html'):
+        """Procesa preguntas con los proveedores de LLM; `medicion` recibe los tiempos por etapa.
+        
+        Retorna el HTML de la respuesta o, con formato='columnas', el dict de _formatear_columnas
+        ({'error': html} si falla) para que el navegador arme la tabla.
+        """
+        medicion = medicion or MedicionPregunta()
         pregunta = pregunta.strip()
         
         if not pregunta:
-            return "<div class='mensaje-error'>Por favor escribe una pregunta</div>"
+            return self._error("<div class='mensaje-error'>Por favor escribe una pregunta</div>", formato)
         
         try:
-            # Generar SQL usando Groq
-            prompt = self._generar_prompt(pregunta)
-            
-            respuesta = self.cliente_groq.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.1-8b-instant",
-                temperature=0.1,
-                max_tokens=200
-            )
-            
-            sql_generado = respuesta.choices[0].message.content.strip()
-            sql_generado = sql_generado.replace('```sql', '').replace('```', '').strip()
-
-            print(f"SQL generado: {sql_generado}")
-            print(f"¿Es seguro?: {self._es_sql_seguro(sql_generado)}")
-
-            # Validar seguridad
-            if not self._es_sql_seguro(sql_generado):
-                print(f"SQL rechazado: {sql_generado}")
-                return "<div class='mensaje-error'>Consulta no permitida por seguridad</div>"
+            sql_generado, parametros, error = self._generar_sql(pregunta, medicion)
+            if error:
+                return self._error(error, formato)
             
             # Ejecutar el SQL y retornar resultados
-            return self._ejecutar_sql(sql_generado)
+            return self._ejecutar_sql(sql_generado, medicion, presupuesto, parametros, formato)
             
         except Exception as e:
-            return f"<div class='mensaje-error'>Error al procesar: {str(e)}</div>"
+            medicion.resultado = 'error'
+            registro.exception("Error al procesar %r", pregunta)
+            return self._error(f"<div class='mensaje-error'>Error al procesar: {str(e)}</div>", formato)
+        finally:
+            self.metricas.registrar_pregunta(medicion)
+            if self.grabador is not None:
+                self.grabador.grabar(pregunta, medicion)
     
-    def _formatear_resultados(self, resultados, nombres_columnas):
-        """Formatea los resultados en una tabla HTML con nombres reales de columnas"""
-        if not resultados:
-            return "<p>No se encontraron resultados</p>"
+    async def procesar_pregunta_async(self, pregunta, medicion=None, presupuesto=None, formato='html'):
+        """Versión asyncio de procesar_pregunta: el LLM no bloquea hilos y SQLite corre en un executor acotado"""
+        medicion = medicion or MedicionPregunta()
+        pregunta = pregunta.strip()
         
-        # Si no hay nombres de columnas, usar nombres genéricos
-        if not nombres_columnas:
-            nombres_columnas = [f"Columna {i+1}" for i in range(len(resultados[0]))]
+        if not pregunta:
+            return self._error("<div class='mensaje-error'>Por favor escribe una pregunta</div>", formato)
         
-        # Crear tabla HTML
-        tabla_html = """
+        loop = asyncio.get_running_loop()
+        try:
+            # La ruta rápida recarga el índice de entidades y la cache lee el esquema: ambas consultan SQLite
+            sql_generado, parametros = await loop.run_in_executor(
+                self.executor_bd, lambda: self._sql_ruta_rapida(pregunta, medicion) or (self._sql_cacheado(pregunta), ()))
+            if sql_generado is not None:
+                return await loop.run_in_executor(self.executor_bd, self._ejecutar_sql, sql_generado, medicion,
+                                                  presupuesto, parametros, formato)
+            
+            sql_generado, error = await self._sql_de_proveedores_async(pregunta, medicion)
+            if error:
+                return self._error(error, formato)
+            
+            return await loop.run_in_executor(self.executor_bd, self._ejecutar_sql, sql_generado, medicion,
+                                              presupuesto, (), formato)
+            
+        except Exception as e:
+            medicion.resultado = 'error'
+            registro.exception("Error al procesar %r", pregunta)
+            return self._error(f"<div class='mensaje-error'>Error al procesar: {str(e)}</div>", formato)
+        finally:
+            self.metricas.registrar_pregunta(medicion)
+            if self.grabador is not None:
+                self.grabador.grabar(pregunta, medicion)
+    
+    def exportar_metricas(self):
+        """Métricas en formato Prometheus, con el estado de caches y pool como gauges"""
+        pool = self.bd.estadisticas_pool()
+        preguntas = self.cache_preguntas.estadisticas()
+        resultados = self.cache_resultados.estadisticas()
+        validador = self.validador.estadisticas()
+        return self.metricas.exportar({
+            'agente_pool_conexiones': [({'estado': 'en_uso'}, pool['en_uso']), ({'estado': 'libres'}, pool['libres'])],
+            'agente_pool_esperas': [({}, pool['esperas'])],
+            'agente_cache_tasa_aciertos': [({'cache': 'preguntas'}, preguntas['tasa_aciertos']),
+                                           ({'cache': 'resultados'}, resultados['tasa_aciertos']),
+                                           ({'cache': 'validador'}, validador['tasa_aciertos'])],
+            'agente_cache_entradas': [({'cache': 'preguntas'}, preguntas['entradas']),
+                                      ({'cache': 'resultados'}, resultados['entradas']),
+                                      ({'cache': 'validador'}, validador['entradas'])],
+            'agente_ruta_rapida_entidades': [({'tipo': tipo}, cantidad)
+                                             for tipo, cantidad in self.ruta_rapida.indice.tamanos().items()],
+            'agente_llm_latencia_estimada_segundos': [({'proveedor': nombre}, segundos)
+                                                      for nombre, segundos in self.router.latencias.items()],
+        })
+    
+    def _inicio_tabla_html(self, nombres_columnas):
+        """Abre la tabla de resultados con sus encabezados"""
+        # Formatear nombres de columnas (remplazar _ por espacios, capitalizar)
+        encabezados = ''.join(
+            f"<th>{escape(nombre_columna.replace('_', ' ').title(), quote=False)}</th>"
+            for nombre_columna in nombres_columnas
+        )
+        return """
         <div class='resultados-container'>
             <div class='resultados-header'>
                 <span class='tabla-icon'></span>
@@ -245,45 +591,169 @@ class AgenteIA:
             <table class='tabla-bonita'>
                 <thead>
                     <tr>
-        """
-        
-        # Agregar encabezados REALES
-        for nombre_columna in nombres_columnas:
-            # Formatear nombres de columnas (remplazar _ por espacios, capitalizar)
-            nombre_bonito = nombre_columna.replace('_', ' ').title()
-            tabla_html += f"<th>{nombre_bonito}</th>"
-        
-        tabla_html += """
+        """ + encabezados + """
                     </tr>
                 </thead>
                 <tbody>
         """
-        
-        # Agregar filas de datos
-        for fila in resultados:
-            tabla_html += "<tr>"
-            for valor in fila:
-                # Formatear números y valores None
-                if valor is None:
-                    valor_str = "-"
-                elif isinstance(valor, float):
-                    valor_str = f"${valor:.2f}"
-                elif isinstance(valor, int):
-                    # Si es un ID, mostrarlo normal, si es stock/precio, formatear
-                    if any(palabra in str(valor).lower() for palabra in ['id', 'codigo']):
-                        valor_str = str(valor)
-                    else:
-                        valor_str = f"{valor:,}"  # Formato con separadores de miles
-                else:
-                    valor_str = str(valor)
-                tabla_html += f"<td>{valor_str}</td>"
-            tabla_html += "</tr>"
-        
-        tabla_html += """
+    
+    def _fin_tabla_html(self, pie):
+        """Cierra la tabla con el contenido HTML del pie"""
+        return f"""
                 </tbody>
             </table>
-            <p class='contador-resultados'>Se encontraron {cantidad} resultados</p>
+            {pie}
         </div>
-        """.format(cantidad=len(resultados))
+        """
+    
+    def _formatear_resultados(self, resultados, nombres_columnas):
+        """Formatea los resultados en una tabla HTML con nombres reales de columnas"""
+        if not resultados:
+            return "<p>No se encontraron resultados</p>"
         
-        return tabla_html
\ No newline at end of file
+        # Si no hay nombres de columnas, usar nombres genéricos
+        if not nombres_columnas:
+            nombres_columnas = [f"Columna {i+1}" for i in range(len(resultados[0]))]
+        
+        return (self._inicio_tabla_html(nombres_columnas) + filas_html(resultados) + self._fin_tabla_html(
+            f"<p class='contador-resultados'>Se encontraron {len(resultados)} resultados</p>"
+        ))
+    
+    def _formatear_columnas(self, sql, parametros, resultados, nombres_columnas):
+        """Resultado por columnas para que lo formatee el navegador: {sql, parametros, columnas, tipos, valores, filas}.
+        
+        Cada columna viaja una sola vez, como arreglo de valores crudos con su tipo ('entero', 'real',
+        'texto' o 'nulo'); el formato de formatear_valor lo aplica la página según el tipo. Una columna
+        que mezcla tipos (un SUM que a veces da entero) se manda ya formateada, como 'texto'.
+        """
+        if not nombres_columnas and resultados:
+            nombres_columnas = [f"Columna {i+1}" for i in range(len(resultados[0]))]
+        valores = list(zip(*resultados)) if resultados else [()] * len(nombres_columnas)
+        tipos = []
+        for i, columna in enumerate(valores):
+            tipo, _ = tipo_columna(columna)
+            if tipo is None:
+                valores[i] = [formatear_valor(valor) for valor in columna]
+                tipo = 'texto'
+            tipos.append(tipo)
+        return {'sql': sql.strip(), 'parametros': list(parametros), 'columnas': list(nombres_columnas),
+                'tipos': tipos, 'valores': valores, 'filas': len(resultados)}
+    
+    def _sql_de_continuacion(self, token):
+        """Decodifica un token de continuación en (sql, parametros, desde)"""
+        datos = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return datos['sql'], tuple(datos.get('parametros', ())), int(datos['desde'])
+    
+    def _token_continuacion(self, sql, parametros, desde):
+        """Token opaco para pedir las filas siguientes de una consulta"""
+        datos = json.dumps({'sql': sql, 'parametros': list(parametros), 'desde': desde}).encode('utf-8')
+        return base64.urlsafe_b64encode(datos).decode('ascii')
+    
+    def procesar_pregunta_paginada(self, pregunta='', tamano=None, pagina=None, presupuesto=None):
+        """Una página del resultado, para la API JSON: {sql, columnas, filas, desde, siguiente, modo} o {error}.
+
+        `pagina` es el token `siguiente` de la página anterior (None al final); lleva el SQL, que se
+        vuelve a validar como si viniera del LLM. Lanza ValueError si el token no es de página.
+        """
+        medicion = MedicionPregunta()
+        sql = None
+        try:
+            if pagina:
+                sql, parametros, posicion = self.paginador.leer_token(pagina)
+                validacion = self.validador.validar(sql, marcadores=len(parametros))
+                if not validacion.valido:
+                    return {'error': f"<div class='mensaje-error'>Consulta no permitida: {validacion.motivo}</div>"}
+                sql = validacion.sql
+            else:
+                pregunta = pregunta.strip()
+                if not pregunta:
+                    return {'error': "<div class='mensaje-error'>Por favor escribe una pregunta</div>"}
+                sql, parametros, error = self._generar_sql(pregunta, medicion)
+                if error:
+                    return {'error': error}
+                posicion = None
+            
+            resultado = self.paginador.pagina(sql, parametros, tamano, posicion,
+                                              presupuesto or self.presupuesto, medicion)
+            if resultado is None:
+                medicion.resultado = 'error'
+                return {'error': "<div class='mensaje-error'>Error al ejecutar la consulta</div>"}
+            return {'sql': sql, 'columnas': resultado.columnas, 'filas': [list(fila) for fila in resultado.filas],
+                    'desde': resultado.desde, 'siguiente': resultado.siguiente, 'modo': resultado.modo}
+        except PresupuestoExcedido as e:
+            return {'error': self._presupuesto_excedido(e, sql, medicion)}
+        finally:
+            self.metricas.registrar_pregunta(medicion)
+    
+    def procesar_pregunta_streaming(self, pregunta='', max_filas=None, continuar=None, presupuesto=None):
+        """Generador de fragmentos HTML: recorre el cursor por lotes sin cargar todo el resultado"""
+        max_filas = max_filas or self.max_filas_streaming
+        medicion = MedicionPregunta()
+        try:
+            if continuar:
+                # El SQL viaja en el token, así que se vuelve a validar como si viniera del LLM
+                sql, parametros, desde = self._sql_de_continuacion(continuar)
+                validacion = self.validador.validar(sql, marcadores=len(parametros))
+                if not validacion.valido:
+                    yield f"<div class='mensaje-error'>Consulta no permitida: {validacion.motivo}</div>"
+                    return
+                sql = validacion.sql
+            else:
+                pregunta = pregunta.strip()
+                if not pregunta:
+                    yield "<div class='mensaje-error'>Por favor escribe una pregunta</div>"
+                    return
+                sql, parametros, error = self._generar_sql(pregunta, medicion)
+                if error:
+                    yield error
+                    return
+                desde = 0
+            
+            # El stream entrega todas las filas por lotes y lo acota su presupuesto: el LIMIT que agregó
+            # el validador cortaría el resultado (un LIMIT menor de la pregunta se respeta)
+            sql = quitar_tope(sql, self.validador.limite_filas)
+            if not continuar:
+                yield self._formatear_sql_para_html(sql, parametros)
+            
+            consulta = sql.strip().rstrip(';')
+            if desde:
+                consulta = f"SELECT * FROM ({consulta}) LIMIT -1 OFFSET {desde}"
+            
+            with medicion.etapa('ejecucion'):
+                cursor_lotes = self.bd.abrir_cursor(consulta, parametros, tamano_lote=self.tamano_lote_streaming,
+                                                    presupuesto=presupuesto or self.presupuesto)
+            with cursor_lotes:
+                emitidas = 0
+                lotes = cursor_lotes.lotes(max_filas)
+                while True:
+                    # El tiempo esperando al cliente entre yields no cuenta en ninguna etapa
+                    with medicion.etapa('lectura'):
+                        lote = next(lotes, None)
+                    if lote is None:
+                        break
+                    with medicion.etapa('render'):
+                        fragmento = filas_html(lote)
+                        if not emitidas:
+                            fragmento = self._inicio_tabla_html(cursor_lotes.columnas) + fragmento
+                    emitidas += len(lote)
+                    yield fragmento
+                
+                if not emitidas:
+                    yield "<p>No se encontraron resultados</p>" if not desde else "<p>No hay más resultados</p>"
+                    return
+                
+                if emitidas >= max_filas and cursor_lotes.hay_mas():
+                    token = self._token_continuacion(sql, parametros, desde + emitidas)
+                    pie = (f"<p class='contador-resultados'>Mostrando filas {desde + 1} a {desde + emitidas}</p>"
+                           f"<button class='mas-filas' data-token='{token}' onclick='cargarMas(this)'>Ver más filas</button>")
+                else:
+                    pie = f"<p class='contador-resultados'>Se encontraron {desde + emitidas} resultados</p>"
+                yield self._fin_tabla_html(pie)
+        except PresupuestoExcedido as e:
+            yield self._presupuesto_excedido(e, sql, medicion)
+        except Exception as e:
+            medicion.resultado = 'error'
+            registro.warning("Error en streaming: %s", e)
+            yield f"<div class='mensaje-error'>Error al procesar: {str(e)}</div>"
+        finally:
+            self.metricas.registrar_pregunta(medicion)
@@ -0,0 +1,106 @@
+# app_asincrona.py
+# Variante ASGI de app_principal: cada pregunta espera al LLM sin ocupar un hilo.
+# Ejecutar con: hypercorn app_asincrona:app --bind 0.0.0.0:5000
+import asyncio
+from quart import Quart, Response, render_template_string, request, jsonify
+from agente_ia import FORMATOS
+from app_principal import HTML_BASE, MAX_PREGUNTAS_LOTE, PRESUPUESTOS, agente, max_filas_stream
+from metricas import MedicionPregunta
+
+app = Quart(__name__)
+
+@app.route('/')
+async def index():
+    return await render_template_string(HTML_BASE)
+
+@app.route('/preguntar', methods=['POST'])
+async def preguntar():
+    datos = await request.get_json()
+    pregunta = datos.get('pregunta', '')
+    formato = datos.get('formato', 'html')
+    if formato not in FORMATOS:
+        return jsonify({'error': f"formato debe ser uno de {', '.join(FORMATOS)}"}), 400
+    
+    if not pregunta:
+        error = '<div class="mensaje-error">Por favor escribe una pregunta</div>'
+        return jsonify({'respuesta': error} if formato == 'html' else {'error': error})
+    
+    medicion = MedicionPregunta()
+    # En formato 'columnas' el resultado ya es el dict de la respuesta ({'error': html} si falló)
+    resultado = await agente.procesar_pregunta_async(pregunta, medicion, PRESUPUESTOS['preguntar'], formato)
+    respuesta = jsonify({'respuesta': resultado} if formato == 'html' else resultado)
+    respuesta.headers['Server-Timing'] = medicion.server_timing()
+    return respuesta
+
+@app.route('/preguntar_lote', methods=['POST'])
+async def preguntar_lote():
+    datos = await request.get_json()
+    preguntas = datos.get('preguntas')
+    
+    if not isinstance(preguntas, list) or not all(isinstance(p, str) for p in preguntas):
+        return jsonify({'error': 'preguntas debe ser una lista de textos'}), 400
+    if len(preguntas) > MAX_PREGUNTAS_LOTE:
+        return jsonify({'error': f'máximo {MAX_PREGUNTAS_LOTE} preguntas por lote'}), 400
+    
+    # procesar_preguntas ya reparte el LLM en su propio pool de hilos; aquí solo no bloquea el loop
+    respuestas = await asyncio.get_running_loop().run_in_executor(None, agente.procesar_preguntas, preguntas,
+                                                                  PRESUPUESTOS['preguntar_lote'])
+    return jsonify({'respuestas': respuestas})
+
+async def _en_hilos(fragmentos):
+    """Recorre un generador bloqueante en el pool de hilos, un fragmento por vez, sin bloquear el loop"""
+    loop = asyncio.get_running_loop()
+    fin = object()
+    while (fragmento := await loop.run_in_executor(None, next, fragmentos, fin)) is not fin:
+        yield fragmento
+
+@app.route('/preguntar_stream', methods=['POST'])
+async def preguntar_stream():
+    datos = await request.get_json()
+    max_filas = max_filas_stream(datos.get('max_filas'))
+    if max_filas is None:
+        return jsonify({'error': 'max_filas debe ser un entero positivo'}), 400
+    
+    fragmentos = agente.procesar_pregunta_streaming(
+        datos.get('pregunta', ''),
+        max_filas=max_filas,
+        continuar=datos.get('continuar'),
+        presupuesto=PRESUPUESTOS['preguntar_stream']
+    )
+    return Response(_en_hilos(fragmentos), mimetype='text/html')
+
+@app.route('/preguntar_paginado', methods=['POST'])
+async def preguntar_paginado():
+    datos = await request.get_json()
+    tamano = datos.get('tamano')
+    if tamano is not None and (not isinstance(tamano, int) or tamano < 1):
+        return jsonify({'error': 'tamano debe ser un entero positivo'}), 400
+    
+    try:
+        resultado = await asyncio.get_running_loop().run_in_executor(
+            None, agente.procesar_pregunta_paginada, datos.get('pregunta', ''), tamano, datos.get('pagina'),
+            PRESUPUESTOS['preguntar_paginado'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(resultado)
+
+@app.route('/metrics')
+async def metrics():
+    return Response(agente.exportar_metricas(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/listo')
+async def listo():
+    return jsonify({'listo': agente.listo}), 200 if agente.listo else 503
+
+_precalentamiento = None
+
+@app.before_serving
+async def precalentar():
+    # Sin await: el servidor acepta conexiones y /listo responde 503 hasta que termine
+    global _precalentamiento
+    if not agente.listo:
+        _precalentamiento = asyncio.get_running_loop().run_in_executor(None, agente.precalentar)
+
+if __name__ == '__main__':
+    print("Iniciando agente de ventas (ASGI) en http://localhost:5000")
+    app.run()
@@ -1,9 +1,25 @@
 # app_principal.py
-from flask import Flask, render_template_string, request, jsonify
-from agente_ia import AgenteIA
+import logging
+import os
+from flask import Flask, Response, render_template_string, request, jsonify
+from agente_ia import FORMATOS, AgenteIA
+from base_datos import PresupuestoConsulta
+from metricas import MedicionPregunta
+
+# Nivel con NIVEL_LOG (DEBUG muestra una muestra de las filas de algunas consultas)
+logging.basicConfig(level=os.getenv('NIVEL_LOG', 'INFO'), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 
 app = Flask(__name__)
-agente = AgenteIA()
+agente = AgenteIA(archivo_bd=os.getenv('ARCHIVO_BD', 'ventas.db'))
+
+# Presupuesto de cada endpoint: segundos dentro de SQLite, pasos de la VM (~80 millones por segundo) y filas.
+# El lote lo aplica a cada consulta; el streaming pagina, así que no limita filas
+PRESUPUESTOS = {
+    'preguntar': PresupuestoConsulta('preguntar', segundos=5.0, pasos_vm=400_000_000, max_filas=10_000),
+    'preguntar_lote': PresupuestoConsulta('preguntar_lote', segundos=2.0, pasos_vm=150_000_000, max_filas=2_000),
+    'preguntar_stream': PresupuestoConsulta('preguntar_stream', segundos=30.0, pasos_vm=2_400_000_000),
+    'preguntar_paginado': PresupuestoConsulta('preguntar_paginado', segundos=5.0, pasos_vm=400_000_000, max_filas=2_000),
+}
 
 # HTML mejorado con CSS profesional + estilos para SQL
 HTML_BASE = """
@@ -246,6 +262,11 @@ HTML_BASE = """
             margin: 10px 0;
         }
         
+        .mas-filas {
+            display: block;
+            margin: 10px auto;
+        }
+        
         .loading {
             text-align: center;
             padding: 20px;
@@ -303,6 +324,24 @@ HTML_BASE = """
     </div>
 
     <script>
+        // Pinta la respuesta a medida que llegan los fragmentos del servidor
+        function leerStream(response, destino) {
+            const lector = response.body.getReader();
+            const decodificador = new TextDecoder();
+            let html = '';
+            function leer() {
+                return lector.read().then(({ done, value }) => {
+                    if (done) {
+                        return;
+                    }
+                    html += decodificador.decode(value, { stream: true });
+                    destino.innerHTML = html;
+                    return leer();
+                });
+            }
+            return leer();
+        }
+        
         function hacerPregunta() {
             const pregunta = document.getElementById('preguntaInput').value.trim();
             const resultadoDiv = document.getElementById('resultado');
@@ -314,20 +353,35 @@ HTML_BASE = """
             
             resultadoDiv.innerHTML = '<div class="loading">Procesando tu consulta...</div>';
             
-            fetch('/preguntar', {
+            fetch('/preguntar_stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ pregunta: pregunta })
             })
-            .then(response => response.json())
-            .then(data => {
-                resultadoDiv.innerHTML = data.respuesta;
-            })
+            .then(response => leerStream(response, resultadoDiv))
             .catch(error => {
                 resultadoDiv.innerHTML = '<div class="mensaje-error">Error al procesar la consulta: ' + error + '</div>';
             });
         }
         
+        // Pide el siguiente bloque de filas con el token de continuación
+        function cargarMas(boton) {
+            const destino = document.createElement('div');
+            boton.parentNode.after(destino);
+            boton.remove();
+            destino.innerHTML = '<div class="loading">Cargando más filas...</div>';
+            
+            fetch('/preguntar_stream', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ continuar: boton.dataset.token })
+            })
+            .then(response => leerStream(response, destino))
+            .catch(error => {
+                destino.innerHTML = '<div class="mensaje-error">Error al cargar más filas: ' + error + '</div>';
+            });
+        }
+        
         // Permitir Enter para enviar
         document.getElementById('preguntaInput').addEventListener('keypress', function(e) {
             if (e.key === 'Enter') {
@@ -350,13 +404,84 @@ def index():
 def preguntar():
     datos = request.get_json()
     pregunta = datos.get('pregunta', '')
+    formato = datos.get('formato', 'html')
+    if formato not in FORMATOS:
+        return jsonify({'error': f"formato debe ser uno de {', '.join(FORMATOS)}"}), 400
     
     if not pregunta:
-        return jsonify({'respuesta': '<div class="mensaje-error">Por favor escribe una pregunta</div>'})
+        error = '<div class="mensaje-error">Por favor escribe una pregunta</div>'
+        return jsonify({'respuesta': error} if formato == 'html' else {'error': error})
+    
+    medicion = MedicionPregunta()
+    # En formato 'columnas' el resultado ya es el dict de la respuesta ({'error': html} si falló)
+    resultado = agente.procesar_pregunta(pregunta, medicion, PRESUPUESTOS['preguntar'], formato)
+    respuesta = jsonify({'respuesta': resultado} if formato == 'html' else resultado)
+    respuesta.headers['Server-Timing'] = medicion.server_timing()
+    return respuesta
+
+# Tope de preguntas por lote para que un solo request no acapare el LLM
+MAX_PREGUNTAS_LOTE = 100
+
+@app.route('/preguntar_lote', methods=['POST'])
+def preguntar_lote():
+    datos = request.get_json()
+    preguntas = datos.get('preguntas')
+    
+    if not isinstance(preguntas, list) or not all(isinstance(p, str) for p in preguntas):
+        return jsonify({'error': 'preguntas debe ser una lista de textos'}), 400
+    if len(preguntas) > MAX_PREGUNTAS_LOTE:
+        return jsonify({'error': f'máximo {MAX_PREGUNTAS_LOTE} preguntas por lote'}), 400
     
-    respuesta = agente.procesar_pregunta(pregunta)
-    return jsonify({'respuesta': respuesta})
+    return jsonify({'respuestas': agente.procesar_preguntas(preguntas, PRESUPUESTOS['preguntar_lote'])})
+
+def max_filas_stream(max_filas):
+    """max_filas pedido para /preguntar_stream, acotado a agente.max_filas_streaming; None si no es válido"""
+    if max_filas is None:
+        return agente.max_filas_streaming
+    if not isinstance(max_filas, int) or max_filas < 1:
+        return None
+    return min(max_filas, agente.max_filas_streaming)
+
+@app.route('/preguntar_stream', methods=['POST'])
+def preguntar_stream():
+    datos = request.get_json()
+    max_filas = max_filas_stream(datos.get('max_filas'))
+    if max_filas is None:
+        return jsonify({'error': 'max_filas debe ser un entero positivo'}), 400
+    
+    fragmentos = agente.procesar_pregunta_streaming(
+        datos.get('pregunta', ''),
+        max_filas=max_filas,
+        continuar=datos.get('continuar'),
+        presupuesto=PRESUPUESTOS['preguntar_stream']
+    )
+    return Response(fragmentos, mimetype='text/html')
+
+@app.route('/preguntar_paginado', methods=['POST'])
+def preguntar_paginado():
+    datos = request.get_json()
+    tamano = datos.get('tamano')
+    if tamano is not None and (not isinstance(tamano, int) or tamano < 1):
+        return jsonify({'error': 'tamano debe ser un entero positivo'}), 400
+    
+    try:
+        resultado = agente.procesar_pregunta_paginada(datos.get('pregunta', ''), tamano, datos.get('pagina'),
+                                                      PRESUPUESTOS['preguntar_paginado'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(resultado)
+
+@app.route('/metrics')
+def metrics():
+    return Response(agente.exportar_metricas(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/listo')
+def listo():
+    # Readiness: 503 hasta que el esquema, los prompts y los ejemplos estén precalentados
+    return jsonify({'listo': agente.listo}), 200 if agente.listo else 503
 
 if __name__ == '__main__':
+    # Servidor de desarrollo; en producción: python servidor_prefork.py
     print("Iniciando agente de ventas en http://localhost:5000")
+    agente.precalentar()
     app.run(debug=True)
\ No newline at end of file
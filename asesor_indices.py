@@ -0,0 +1,305 @@
+# asesor_indices.py
+# Registra el SQL ejecutado, revisa su EXPLAIN QUERY PLAN y sugiere (o crea) índices
+# para las consultas frecuentes que recorren tablas completas.
+import re
+import statistics
+import threading
+import time
+from collections import OrderedDict
+
+from cache_consultas import canonizar_sql
+
+# Palabras que pueden seguir al nombre de una tabla y no son alias
+_NO_ALIAS = {
+    'on', 'where', 'join', 'left', 'right', 'inner', 'outer', 'cross', 'natural', 'group',
+    'order', 'limit', 'having', 'union', 'using', 'as', 'full'
+}
+
+# Máximo de columnas para proponer un índice que cubra la consulta
+_MAX_COLUMNAS_CUBRIENTE = 4
+
+
+def _sin_literales(sql):
+    return re.sub(r"'(?:[^']|'')*'", "''", sql)
+
+
+def _alias_de_tablas(sql, tablas_conocidas):
+    """Retorna {alias_o_nombre: tabla} para las tablas de FROM/JOIN"""
+    alias = {}
+    for tabla, nombre_alias in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.IGNORECASE):
+        tabla = tabla.lower()
+        if tabla not in tablas_conocidas:
+            continue
+        alias[tabla] = tabla
+        if nombre_alias and nombre_alias.lower() not in _NO_ALIAS:
+            alias[nombre_alias.lower()] = tabla
+    return alias
+
+
+def _resolver_columna(referencia, alias, columnas_por_tabla):
+    """Convierte 'v.fecha' o 'fecha' en (tabla, columna), o None si es ambigua"""
+    referencia = referencia.lower()
+    if '.' in referencia:
+        prefijo, columna = referencia.split('.', 1)
+        tabla = alias.get(prefijo)
+        if tabla and columna in columnas_por_tabla[tabla]:
+            return tabla, columna
+        return None
+    candidatas = {t for t in set(alias.values()) if referencia in columnas_por_tabla[t]}
+    if len(candidatas) == 1:
+        return candidatas.pop(), referencia
+    return None
+
+
+def _clausula(sql, inicio, fines):
+    """Texto entre la palabra clave inicio y la primera de fines (o el final)"""
+    coincidencia = re.search(rf'\b{inicio}\b', sql, re.IGNORECASE)
+    if not coincidencia:
+        return ''
+    resto = sql[coincidencia.end():]
+    corte = re.search(r'\b(?:' + '|'.join(fines) + r')\b', resto, re.IGNORECASE)
+    return resto[:corte.start()] if corte else resto
+
+
+def analizar_columnas(sql, alias, columnas_por_tabla):
+    """Clasifica por tabla las columnas usadas: igualdad, rango, agrupación y resto"""
+    limpio = _sin_literales(sql)
+    uso = {tabla: {'igualdad': [], 'rango': [], 'agrupacion': [], 'usadas': set()} for tabla in set(alias.values())}
+
+    def agregar(tipo, referencia):
+        resuelta = _resolver_columna(referencia, alias, columnas_por_tabla)
+        # id es el rowid: ya está en todo índice y no hace falta indexarlo
+        if resuelta and resuelta[1] != 'id':
+            tabla, columna = resuelta
+            uso[tabla]['usadas'].add(columna)
+            if tipo and columna not in uso[tabla][tipo]:
+                uso[tabla][tipo].append(columna)
+
+    referencia = r'(\w+(?:\.\w+)?)'
+    where = _clausula(limpio, 'WHERE', ['GROUP', 'ORDER', 'LIMIT', 'HAVING'])
+    for columna in re.findall(referencia + r'\s*(?:=|\bIN\b)', where, re.IGNORECASE):
+        agregar('igualdad', columna)
+    for columna in re.findall(r'=\s*' + referencia, where):
+        agregar('igualdad', columna)
+    for columna in re.findall(referencia + r'\s*(?:<=|>=|<|>|\bBETWEEN\b)', where, re.IGNORECASE):
+        agregar('rango', columna)
+
+    group_by = _clausula(limpio, r'GROUP\s+BY', ['ORDER', 'LIMIT', 'HAVING'])
+    for columna in re.findall(referencia, group_by):
+        agregar('agrupacion', columna)
+
+    for columna in re.findall(r'\b\w+\.\w+\b', limpio):
+        agregar(None, columna)
+    seleccion = _clausula(limpio, 'SELECT', ['FROM'])
+    for columna in re.findall(r'\b\w+\b', seleccion):
+        if '.' not in columna:
+            agregar(None, columna)
+    return uso
+
+
+class AsesorIndices:
+    """Acumula estadísticas por consulta y propone índices para los full scans frecuentes"""
+
+    def __init__(self, bd, tablas, min_llamadas=5, min_tiempo_total=0.05, max_consultas=1024):
+        self.bd = bd
+        self.tablas = set(tablas)
+        self.min_llamadas = min_llamadas
+        self.min_tiempo_total = min_tiempo_total
+        self.max_consultas = max_consultas
+        # sql canónico -> estadísticas, plan y parámetros de una ejecución; LRU, el SQL del LLM es libre
+        self._consultas = OrderedDict()
+        self._columnas_por_tabla = None
+        self._bloqueo = threading.Lock()
+
+    def _columnas(self):
+        if self._columnas_por_tabla is None:
+            self._columnas_por_tabla = {
+                tabla: {fila[1].lower() for fila in self.bd.ejecutar_consulta(f"PRAGMA table_info({tabla})")['datos']}
+                for tabla in self.tablas
+            }
+        return self._columnas_por_tabla
+
+    def registrar(self, sql, duracion, parametros=()):
+        """Registra una ejecución, dentro de la petición y sin consultar la base: el plan lo pide sugerencias()"""
+        clave = canonizar_sql(sql)
+        with self._bloqueo:
+            registro = self._consultas.get(clave)
+            if registro is None:
+                registro = self._consultas[clave] = {'sql': clave, 'llamadas': 0, 'tiempo_total': 0.0, 'plan': None,
+                                                     'parametros': tuple(parametros)}
+                while len(self._consultas) > self.max_consultas:
+                    self._consultas.popitem(last=False)
+            else:
+                self._consultas.move_to_end(clave)
+            registro['llamadas'] += 1
+            registro['tiempo_total'] += duracion
+
+    def _plan(self, registro):
+        """EXPLAIN QUERY PLAN de la consulta, calculado una sola vez por SQL (no por valores de sus ?)"""
+        if registro['plan'] is None:
+            plan = self.bd.explicar(registro['sql'], registro['parametros']) or []
+            with self._bloqueo:
+                if registro['sql'] in self._consultas:
+                    self._consultas[registro['sql']]['plan'] = plan
+            registro['plan'] = plan
+        return registro['plan']
+
+    def _tablas_recorridas(self, plan, alias):
+        """Tablas con 'SCAN x' sin índice en el plan"""
+        recorridas = []
+        for detalle in plan:
+            coincidencia = re.match(r'SCAN (\w+)(.*)', detalle)
+            if coincidencia and 'INDEX' not in coincidencia.group(2):
+                tabla = alias.get(coincidencia.group(1).lower())
+                if tabla and tabla not in recorridas:
+                    recorridas.append(tabla)
+        return recorridas
+
+    def _proponer(self, tabla, uso):
+        """Retorna (tipo, columnas) del índice propuesto para la tabla, o None si no hay uno útil"""
+        if uso['igualdad']:
+            tipo = 'igualdad'
+        elif uso['rango']:
+            tipo = 'rango'
+        else:
+            tipo = 'cubriente'
+        # Igualdades primero y a lo sumo una columna de rango al final
+        columnas = uso['igualdad'] + [c for c in uso['rango'][:1] if c not in uso['igualdad']]
+        if not columnas:
+            columnas = list(uso['agrupacion'])
+        resto = sorted(uso['usadas'] - set(columnas))
+        if len(columnas) + len(resto) <= _MAX_COLUMNAS_CUBRIENTE:
+            columnas += resto
+        elif tipo == 'cubriente':
+            return None
+        if not columnas or set(columnas) >= self._columnas()[tabla] - {'id'}:
+            return None
+        return tipo, columnas
+
+    def _es_caliente(self, registro):
+        return registro['llamadas'] >= self.min_llamadas or registro['tiempo_total'] >= self.min_tiempo_total
+
+    def sugerencias(self):
+        """Lista de índices sugeridos para las consultas calientes con full scan"""
+        with self._bloqueo:
+            registros = [dict(r) for r in self._consultas.values()]
+
+        propuestas = {}
+        for registro in registros:
+            if not self._es_caliente(registro):
+                continue
+            alias = _alias_de_tablas(registro['sql'], self.tablas)
+            recorridas = self._tablas_recorridas(self._plan(registro), alias)
+            if not recorridas:
+                continue
+            uso = analizar_columnas(registro['sql'], alias, self._columnas())
+            for tabla in recorridas:
+                propuesta_tabla = self._proponer(tabla, uso[tabla])
+                if not propuesta_tabla:
+                    continue
+                tipo, columnas = propuesta_tabla
+                nombre = f"idx_auto_{tabla}_" + '_'.join(columnas)
+                propuesta = propuestas.setdefault(nombre, {
+                    'nombre': nombre,
+                    'tabla': tabla,
+                    'tipo': tipo,
+                    'columnas': columnas,
+                    'ddl': f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} ({', '.join(columnas)})",
+                    'consultas': [],
+                    'llamadas': 0,
+                    'tiempo_total': 0.0,
+                })
+                propuesta['consultas'].append(registro['sql'])
+                propuesta['llamadas'] += registro['llamadas']
+                propuesta['tiempo_total'] += registro['tiempo_total']
+        return sorted(propuestas.values(), key=lambda p: p['tiempo_total'], reverse=True)
+
+    def _estimar_mejora(self, propuesta):
+        """Mejora estimada en filas leídas, con las mismas heurísticas del planificador de SQLite"""
+        tabla, columnas = propuesta['tabla'], propuesta['columnas']
+        if propuesta['tipo'] == 'igualdad':
+            # Una búsqueda por igualdad lee total / distintos filas en lugar de total
+            distintos = self.bd.ejecutar_consulta(f"SELECT COUNT(DISTINCT {columnas[0]}) FROM {tabla}")['datos'][0][0]
+            return max(1.0, float(distintos or 1))
+        if propuesta['tipo'] == 'rango':
+            # SQLite supone que un rango sin estadísticas conserva 1/4 de las filas
+            return 4.0
+        # Índice cubriente: se recorre igual, pero solo las columnas del índice
+        return max(1.0, len(self._columnas()[tabla]) / len(columnas))
+
+    def _parametros(self, sql):
+        """Los valores con que se registró la consulta, para volver a ejecutarla"""
+        with self._bloqueo:
+            return self._consultas.get(sql, {}).get('parametros', ())
+
+    def _medir(self, consultas, repeticiones):
+        """Mediana del tiempo total de ejecutar todas las consultas"""
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            for sql in consultas:
+                self.bd.ejecutar_consulta(sql, self._parametros(sql))
+            tiempos.append(time.perf_counter() - inicio)
+        return statistics.median(tiempos)
+
+    def aplicar(self, propuestas=None, repeticiones=5):
+        """Crea los índices propuestos y mide cada consulta afectada antes y después"""
+        informe = []
+        for propuesta in propuestas if propuestas is not None else self.sugerencias():
+            estimada = self._estimar_mejora(propuesta)
+            antes = self._medir(propuesta['consultas'], repeticiones)
+            self.bd.crear_indice(propuesta['ddl'], propuesta['tabla'])
+            despues = self._medir(propuesta['consultas'], repeticiones)
+            informe.append({
+                **propuesta,
+                'mejora_estimada': estimada,
+                'antes_ms': antes * 1000,
+                'despues_ms': despues * 1000,
+                'mejora_medida': antes / despues if despues else float('inf'),
+            })
+            # Refrescar el plan de las consultas afectadas con el índice nuevo
+            for sql in propuesta['consultas']:
+                plan = self.bd.explicar(sql, self._parametros(sql)) or []
+                with self._bloqueo:
+                    if sql in self._consultas:
+                        self._consultas[sql]['plan'] = plan
+        return informe
+
+
+def formatear_informe(informe):
+    """Tabla de texto con la mejora estimada vs. medida de cada índice creado"""
+    lineas = [f"{'índice':<50}{'estimada':>10}{'antes ms':>10}{'después ms':>12}{'medida':>8}"]
+    for fila in informe:
+        lineas.append(
+            f"{fila['nombre']:<50}{fila['mejora_estimada']:>9.1f}x{fila['antes_ms']:>10.2f}"
+            f"{fila['despues_ms']:>12.2f}{fila['mejora_medida']:>7.1f}x"
+        )
+    return '\n'.join(lineas)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from base_datos import BaseDatos, TABLAS
+
+    parser = argparse.ArgumentParser(description="Asesor de índices: analiza un archivo de consultas SQL (una por línea)")
+    parser.add_argument('consultas', help="archivo con una consulta SELECT por línea")
+    parser.add_argument('--bd', default="ventas.db")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--crear', action='store_true', help="crear los índices sugeridos y medir la mejora")
+    args = parser.parse_args()
+
+    bd = BaseDatos(args.bd)
+    asesor = AsesorIndices(bd, TABLAS, min_llamadas=1)
+    with open(args.consultas, encoding='utf-8') as archivo:
+        for sql in (linea.strip() for linea in archivo):
+            if sql:
+                inicio = time.perf_counter()
+                bd.ejecutar_consulta(sql)
+                asesor.registrar(sql, time.perf_counter() - inicio)
+
+    propuestas = asesor.sugerencias()
+    for propuesta in propuestas:
+        print(f"{propuesta['ddl']};  -- {propuesta['llamadas']} llamadas, {propuesta['tiempo_total'] * 1000:.1f} ms")
+    if args.crear and propuestas:
+        print(formatear_informe(asesor.aplicar(propuestas, args.repeticiones)))
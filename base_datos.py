@@ -1,245 +1,1076 @@
 # base_datos.py
 import sqlite3
 import os
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
+# Tablas del negocio, en orden de dependencias
+TABLAS = ['categorias', 'proveedores', 'productos', 'clientes', 'empleados', 'ventas', 'detalles_venta']
+
+# Tablas de soporte que no se muestran al LLM
+TABLAS_INTERNAS = {'versiones_tablas', 'reescrituras_tablas'}
+
+# Índices de texto completo (FTS5) sobre las columnas que se buscan por nombre, sin tildes ni mayúsculas.
+# Cada tabla tiene su fts_<tabla> con rowid = <tabla>.id, mantenida con triggers
+BUSQUEDAS = {
+    'productos': ['nombre', 'descripcion'],
+    'clientes': ['nombre', 'ciudad'],
+    'empleados': ['nombre', 'rol'],
+}
+TABLAS_BUSQUEDA = {f'fts_{tabla}': tabla for tabla in BUSQUEDAS}
+
+# PRAGMA por conexión. Lectores: mmap evita copiar páginas al cache de cada conexión.
+# Escritor: WAL deja leer mientras se escribe y con WAL synchronous=NORMAL no arriesga la base, solo
+# la última transacción ante un corte de luz
+PRAGMAS_LECTURA = {'mmap_size': 256 * 2**20, 'cache_size': -16000, 'temp_store': 'MEMORY'}
+PRAGMAS_ESCRITURA = {'synchronous': 'NORMAL', 'mmap_size': 256 * 2**20, 'cache_size': -64000}
+
+# Instrucciones de la VM de SQLite entre dos llamadas al progress handler
+PASOS_POR_VERIFICACION = 1000
+
+
+class PresupuestoExcedido(sqlite3.OperationalError):
+    """Una consulta superó su presupuesto; `limite` es 'tiempo', 'pasos' o 'filas'"""
+
+    def __init__(self, mensaje, limite, presupuesto):
+        super().__init__(mensaje)
+        self.limite = limite
+        self.presupuesto = presupuesto
+
+
+class PresupuestoConsulta:
+    """Límites de una consulta: segundos dentro de SQLite, pasos de la VM y filas leídas (None = sin límite)"""
+
+    def __init__(self, nombre='consulta', segundos=None, pasos_vm=None, max_filas=None):
+        self.nombre = nombre
+        self.segundos = segundos
+        self.pasos_vm = pasos_vm
+        self.max_filas = max_filas
+
+    def vigilancia(self):
+        """Contador de pasos y tiempo para una consulta; se puede usar en varios tramos (lotes de un cursor)"""
+        return VigilanciaConsulta(self)
+
+    def leer(self, cursor):
+        """fetchall que corta apenas se pasa de max_filas, sin leer el resto"""
+        if self.max_filas is None:
+            return cursor.fetchall()
+        filas = cursor.fetchmany(self.max_filas + 1)
+        if len(filas) > self.max_filas:
+            raise PresupuestoExcedido(f"La consulta devuelve más de {self.max_filas:,} filas; "
+                                      f"agrega filtros o un LIMIT menor", 'filas', self)
+        return filas
+
+
+class VigilanciaConsulta:
+    """Aplica un PresupuestoConsulta con set_progress_handler: al excederlo SQLite interrumpe la consulta"""
+
+    def __init__(self, presupuesto):
+        self.presupuesto = presupuesto
+        self.pasos = 0
+        self.segundos = 0.0
+        self.excedido = None
+
+    @contextmanager
+    def tramo(self, conexion):
+        """Vigila la conexión mientras dura el bloque; convierte la interrupción en PresupuestoExcedido"""
+        presupuesto = self.presupuesto
+        if presupuesto.segundos is None and presupuesto.pasos_vm is None:
+            yield
+            return
+        inicio = time.monotonic()
+        limite_tiempo = inicio + presupuesto.segundos - self.segundos if presupuesto.segundos is not None else None
+
+        def progreso():
+            self.pasos += PASOS_POR_VERIFICACION
+            if presupuesto.pasos_vm is not None and self.pasos > presupuesto.pasos_vm:
+                self.excedido = 'pasos'
+            elif limite_tiempo is not None and time.monotonic() > limite_tiempo:
+                self.excedido = 'tiempo'
+            # Un valor distinto de cero hace que SQLite aborte con "interrupted"
+            return self.excedido is not None
+
+        conexion.set_progress_handler(progreso, PASOS_POR_VERIFICACION)
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if self.excedido is None:
+                raise
+            if self.excedido == 'pasos':
+                mensaje = f"La consulta superó el máximo de {presupuesto.pasos_vm:,} pasos de ejecución"
+            else:
+                mensaje = f"La consulta superó el tiempo máximo de {presupuesto.segundos:g} s"
+            raise PresupuestoExcedido(mensaje, self.excedido, presupuesto) from e
+        finally:
+            conexion.set_progress_handler(None, 0)
+            self.segundos += time.monotonic() - inicio
+
+
+class PoolConexiones:
+    """Pool de conexiones SQLite reutilizables, seguro entre hilos"""
+
+    def __init__(self, archivo, tamano=5, solo_lectura=True, intervalo_verificacion=30.0, pragmas=None):
+        self.archivo = archivo
+        self.tamano = tamano
+        self.solo_lectura = solo_lectura
+        self.pragmas = pragmas or {}
+        self.intervalo_verificacion = intervalo_verificacion
+        self._condicion = threading.Condition()
+        self._libres = []  # pares (conexion, ultimo_uso)
+        self._creadas = 0
+        self._cerrado = False
+        self._estadisticas = {
+            'checkouts': 0,
+            'esperas': 0,
+            'tiempo_espera_total': 0.0,
+            'descartadas': 0,
+        }
+
+    def _nueva_conexion(self):
+        """Abre una conexión y le aplica los PRAGMA una sola vez"""
+        if self.solo_lectura:
+            ruta = os.path.abspath(self.archivo)
+            conexion = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True, check_same_thread=False)
+            conexion.execute("PRAGMA query_only = ON")
+        else:
+            conexion = sqlite3.connect(self.archivo, check_same_thread=False)
+        conexion.execute("PRAGMA foreign_keys = ON")
+        for pragma, valor in self.pragmas.items():
+            conexion.execute(f"PRAGMA {pragma} = {valor}")
+        return conexion
+
+    def _esta_sana(self, conexion):
+        """Verifica que la conexión siga respondiendo"""
+        try:
+            conexion.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _descartar(self, conexion):
+        """Cierra una conexión dañada y libera su cupo en el pool"""
+        try:
+            conexion.close()
+        except sqlite3.Error:
+            pass
+        with self._condicion:
+            self._creadas -= 1
+            self._estadisticas['descartadas'] += 1
+            self._condicion.notify()
+
+    def obtener(self, timeout=None):
+        """Toma una conexión del pool, esperando si todas están en uso"""
+        while True:
+            with self._condicion:
+                if self._cerrado:
+                    raise RuntimeError("El pool de conexiones está cerrado")
+                self._estadisticas['checkouts'] += 1
+                if not self._libres and self._creadas >= self.tamano:
+                    self._estadisticas['esperas'] += 1
+                    inicio = time.perf_counter()
+                    disponible = self._condicion.wait_for(
+                        lambda: self._libres or self._creadas < self.tamano or self._cerrado,
+                        timeout=timeout
+                    )
+                    self._estadisticas['tiempo_espera_total'] += time.perf_counter() - inicio
+                    if not disponible:
+                        raise TimeoutError("No hay conexiones libres en el pool")
+                    if self._cerrado:
+                        raise RuntimeError("El pool de conexiones está cerrado")
+                if self._libres:
+                    conexion, ultimo_uso = self._libres.pop()
+                else:
+                    conexion, ultimo_uso = None, None
+                    self._creadas += 1
+
+            if conexion is None:
+                try:
+                    return self._nueva_conexion()
+                except Exception:
+                    with self._condicion:
+                        self._creadas -= 1
+                        self._condicion.notify()
+                    raise
+
+            # Health-check solo si la conexión lleva un rato sin usarse
+            if time.monotonic() - ultimo_uso < self.intervalo_verificacion or self._esta_sana(conexion):
+                return conexion
+            self._descartar(conexion)
+
+    def devolver(self, conexion, descartar=False):
+        """Devuelve una conexión al pool, o la descarta si quedó inservible"""
+        if descartar or self._cerrado:
+            self._descartar(conexion)
+            return
+        if conexion.in_transaction:
+            conexion.rollback()
+        with self._condicion:
+            self._libres.append((conexion, time.monotonic()))
+            self._condicion.notify()
+
+    @contextmanager
+    def conexion(self, timeout=None):
+        """Context manager que presta una conexión del pool"""
+        conexion = self.obtener(timeout)
+        descartar = False
+        try:
+            yield conexion
+        except (sqlite3.InterfaceError, sqlite3.ProgrammingError):
+            descartar = True
+            raise
+        finally:
+            self.devolver(conexion, descartar=descartar)
+
+    def estadisticas(self):
+        """Retorna las métricas del pool para poder dimensionarlo"""
+        with self._condicion:
+            return {
+                'tamano': self.tamano,
+                'creadas': self._creadas,
+                'en_uso': self._creadas - len(self._libres),
+                'libres': len(self._libres),
+                **self._estadisticas,
+            }
+
+    def cerrar(self):
+        """Cierra las conexiones libres; las prestadas se cierran al devolverse"""
+        with self._condicion:
+            self._cerrado = True
+            libres, self._libres = self._libres, []
+            self._creadas -= len(libres)
+            self._condicion.notify_all()
+        for conexion, _ in libres:
+            conexion.close()
+
+
+class CursorEnLotes:
+    """Cursor abierto sobre una conexión prestada del pool, leído con fetchmany"""
+
+    def __init__(self, pool, conexion, cursor, tamano_lote, vigilancia=None):
+        self._pool = pool
+        self._conexion = conexion
+        self._cursor = cursor
+        self.tamano_lote = tamano_lote
+        # Solo cuenta el tiempo dentro de fetchmany, no el que se espera al cliente entre lotes
+        self._vigilancia = vigilancia or PresupuestoConsulta().vigilancia()
+        self.columnas = [descripcion[0] for descripcion in cursor.description] if cursor.description else []
+
+    def lotes(self, max_filas=None):
+        """Generador de listas de filas; nunca tiene más de un lote en memoria"""
+        leidas = 0
+        while max_filas is None or leidas < max_filas:
+            cantidad = self.tamano_lote if max_filas is None else min(self.tamano_lote, max_filas - leidas)
+            with self._vigilancia.tramo(self._conexion):
+                lote = self._cursor.fetchmany(cantidad)
+            if not lote:
+                return
+            leidas += len(lote)
+            yield lote
+
+    def hay_mas(self):
+        """Indica si quedan filas sin leer (consume una fila)"""
+        with self._vigilancia.tramo(self._conexion):
+            return self._cursor.fetchone() is not None
+
+    def cerrar(self):
+        """Cierra el cursor y devuelve la conexión al pool"""
+        if self._conexion is not None:
+            self._cursor.close()
+            self._pool.devolver(self._conexion)
+            self._conexion = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
 class BaseDatos:
-    def __init__(self):
-        self.archivo = "ventas.db"
+    def __init__(self, archivo="ventas.db", tamano_pool=5, wal=True):
+        self.archivo = archivo
+        self.wal = wal
+        self._bloqueo_escritura = threading.Lock()
+        self._conexion_escritor = None
+        self._esquema = None  # (schema_version, esquema introspectado)
+        self._filas_estimadas = {}  # tabla -> (momento, filas)
+        # El pool abre en mode=ro, así que el archivo (y en WAL su -shm) debe existir antes de usarlo:
+        # _inicializar_base_datos abre primero la conexión de escritura
+        self.pool = PoolConexiones(self.archivo, tamano=tamano_pool, pragmas=PRAGMAS_LECTURA)
         self._inicializar_base_datos()
-    
+
+    @contextmanager
+    def _conexion_escritura(self):
+        """Conexión de escritura persistente, serializada con un lock"""
+        with self._bloqueo_escritura:
+            if self._conexion_escritor is None:
+                self._conexion_escritor = self._abrir_escritor()
+            try:
+                yield self._conexion_escritor
+                self._conexion_escritor.commit()
+            except Exception:
+                self._conexion_escritor.rollback()
+                raise
+
+    def _abrir_escritor(self):
+        """Única conexión que escribe; fija el journal_mode del archivo (persistente) y sus PRAGMA"""
+        conexion = sqlite3.connect(self.archivo, check_same_thread=False)
+        conexion.execute("PRAGMA foreign_keys = ON")
+        modo = 'wal' if self.wal else 'delete'
+        # Cambiar de modo requiere que nadie más tenga el archivo abierto; si ya está en ese modo no se toca
+        if conexion.execute("PRAGMA journal_mode").fetchone()[0] != modo:
+            conexion.execute(f"PRAGMA journal_mode = {modo}")
+        pragmas = PRAGMAS_ESCRITURA if self.wal else {'synchronous': 'FULL'}
+        for pragma, valor in pragmas.items():
+            conexion.execute(f"PRAGMA {pragma} = {valor}")
+        return conexion
+
+    def insertar(self, inserciones):
+        """Inserta en una sola transacción por el escritor; `inserciones` es una lista de (tabla, columnas, filas)"""
+        with self._conexion_escritura() as conexion:
+            for tabla, columnas, filas in inserciones:
+                marcadores = ', '.join('?' * len(columnas))
+                conexion.executemany(f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({marcadores})", filas)
+
+    def estadisticas_pool(self):
+        """Retorna checkouts, esperas y conexiones en uso del pool"""
+        return self.pool.estadisticas()
+
+    def cerrar(self):
+        """Cierra el pool de lectura y la conexión de escritura"""
+        self.pool.cerrar()
+        with self._bloqueo_escritura:
+            if self._conexion_escritor is not None:
+                self._conexion_escritor.close()
+                self._conexion_escritor = None
+
+    def reabrir_conexiones(self):
+        """Cierra todas las conexiones y deja un pool nuevo que las abre al primer uso.
+
+        Una conexión SQLite no puede cruzar un fork: se llama en el padre justo antes de hacer fork.
+        """
+        self.cerrar()
+        self.pool = PoolConexiones(self.archivo, tamano=self.pool.tamano, pragmas=PRAGMAS_LECTURA)
+
     def _inicializar_base_datos(self):
         """Crea la base de datos y tablas si no existen"""
         self._crear_tablas()
         # Solo insertar datos si las tablas están vacías
         if self._tablas_vacias():
             self._insertar_datos_ejemplo()
+            return
+        if self._resumenes_desactualizados():
+            self.reconstruir_resumenes()
+        desactualizadas = self._busquedas_desactualizadas()
+        if desactualizadas:
+            self.reconstruir_busqueda(desactualizadas)
     
     def _tablas_vacias(self):
         """Verifica si las tablas principales están vacías"""
         try:
-            conexion = sqlite3.connect(self.archivo)
-            cursor = conexion.cursor()
-            
-            tablas = ['clientes', 'productos', 'empleados']
-            for tabla in tablas:
-                cursor.execute(f"SELECT COUNT(*) FROM {tabla}")
-                if cursor.fetchone()[0] > 0:
-                    conexion.close()
-                    return False
-            conexion.close()
-            return True
+            with self.pool.conexion() as conexion:
+                cursor = conexion.cursor()
+
+                tablas = ['clientes', 'productos', 'empleados']
+                for tabla in tablas:
+                    cursor.execute(f"SELECT COUNT(*) FROM {tabla}")
+                    if cursor.fetchone()[0] > 0:
+                        return False
+                return True
         except:
             return True
     
     def _crear_tablas(self):
         """Crea todas las tablas con estructura profesional"""
-        conexion = sqlite3.connect(self.archivo)
-        cursor = conexion.cursor()
+        with self._conexion_escritura() as conexion:
+            cursor = conexion.cursor()
         
-        # Activar FOREIGN KEYS
-        cursor.execute("PRAGMA foreign_keys = ON")
+            # Tabla de categorías
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS categorias (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nombre TEXT UNIQUE NOT NULL
+                )
+            ''')
         
-        # Tabla de categorías
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS categorias (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT UNIQUE NOT NULL
-            )
-        ''')
+            # Tabla de proveedores
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS proveedores (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nombre TEXT NOT NULL,
+                    contacto TEXT,
+                    telefono TEXT
+                )
+            ''')
         
-        # Tabla de proveedores
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS proveedores (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                contacto TEXT,
-                telefono TEXT
-            )
-        ''')
+            # Tabla de productos (mejorada)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS productos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nombre TEXT NOT NULL,
+                    descripcion TEXT,
+                    precio REAL NOT NULL,
+                    stock INTEGER DEFAULT 0,
+                    categoria_id INTEGER,
+                    proveedor_id INTEGER,
+                    FOREIGN KEY (categoria_id) REFERENCES categorias (id),
+                    FOREIGN KEY (proveedor_id) REFERENCES proveedores (id)
+                )
+            ''')
         
-        # Tabla de productos (mejorada)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS productos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                descripcion TEXT,
-                precio REAL NOT NULL,
-                stock INTEGER DEFAULT 0,
-                categoria_id INTEGER,
-                proveedor_id INTEGER,
-                FOREIGN KEY (categoria_id) REFERENCES categorias (id),
-                FOREIGN KEY (proveedor_id) REFERENCES proveedores (id)
-            )
-        ''')
+            # Tabla de clientes (mejorada)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS clientes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nombre TEXT NOT NULL,
+                    email TEXT UNIQUE,
+                    telefono TEXT,
+                    ciudad TEXT,
+                    fecha_registro DATE DEFAULT CURRENT_DATE
+                )
+            ''')
         
-        # Tabla de clientes (mejorada)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS clientes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                email TEXT UNIQUE,
-                telefono TEXT,
-                ciudad TEXT,
-                fecha_registro DATE DEFAULT CURRENT_DATE
-            )
-        ''')
+            # Tabla de empleados (mejorada)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS empleados (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nombre TEXT NOT NULL,
+                    email TEXT UNIQUE,
+                    rol TEXT,
+                    fecha_contratacion DATE DEFAULT CURRENT_DATE
+                )
+            ''')
         
-        # Tabla de empleados (mejorada)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS empleados (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                email TEXT UNIQUE,
-                rol TEXT,
-                fecha_contratacion DATE DEFAULT CURRENT_DATE
-            )
-        ''')
+            # Tabla de ventas (mejorada)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS ventas (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    cliente_id INTEGER NOT NULL,
+                    empleado_id INTEGER,
+                    fecha DATE NOT NULL,
+                    total REAL NOT NULL,
+                    estado TEXT DEFAULT 'completada',
+                    FOREIGN KEY (cliente_id) REFERENCES clientes (id),
+                    FOREIGN KEY (empleado_id) REFERENCES empleados (id)
+                )
+            ''')
+        
+            # Tabla de detalles_venta (nueva)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS detalles_venta (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    venta_id INTEGER NOT NULL,
+                    producto_id INTEGER NOT NULL,
+                    cantidad INTEGER NOT NULL,
+                    precio_unitario REAL NOT NULL,
+                    FOREIGN KEY (venta_id) REFERENCES ventas (id) ON DELETE CASCADE,
+                    FOREIGN KEY (producto_id) REFERENCES productos (id)
+                )
+            ''')
         
-        # Tabla de ventas (mejorada)
+            self._crear_versiones_tablas(cursor)
+            self._crear_indices(cursor)
+            self._crear_resumenes(cursor)
+            self._crear_busqueda(cursor)
+    
+    def _crear_indices(self, cursor):
+        """Índices base para los JOIN y filtros que sugiere el prompt"""
+        indices = [
+            # ventas de un cliente / empleado y filtros por fecha; cubren la consulta "ventas de este mes"
+            'CREATE INDEX IF NOT EXISTS idx_ventas_cliente ON ventas (cliente_id, fecha)',
+            'CREATE INDEX IF NOT EXISTS idx_ventas_empleado ON ventas (empleado_id, fecha)',
+            'CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas (fecha, cliente_id, empleado_id, total)',
+            # detalles de una venta y agregados por producto sin tocar la tabla
+            'CREATE INDEX IF NOT EXISTS idx_detalles_venta_venta ON detalles_venta (venta_id, producto_id, cantidad, precio_unitario)',
+            'CREATE INDEX IF NOT EXISTS idx_detalles_venta_producto ON detalles_venta (producto_id, cantidad, precio_unitario)',
+            'CREATE INDEX IF NOT EXISTS idx_productos_categoria ON productos (categoria_id)',
+            'CREATE INDEX IF NOT EXISTS idx_productos_proveedor ON productos (proveedor_id)',
+            # clientes por nombre y por ciudad, los filtros de las plantillas de ruta_rapida
+            'CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON clientes (nombre)',
+            'CREATE INDEX IF NOT EXISTS idx_clientes_ciudad ON clientes (ciudad)',
+        ]
+        for indice in indices:
+            cursor.execute(indice)
+    
+    def _crear_versiones_tablas(self, cursor):
+        """Crea un contador de escrituras por tabla mantenido con triggers"""
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ventas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cliente_id INTEGER NOT NULL,
-                empleado_id INTEGER,
-                fecha DATE NOT NULL,
-                total REAL NOT NULL,
-                estado TEXT DEFAULT 'completada',
-                FOREIGN KEY (cliente_id) REFERENCES clientes (id),
-                FOREIGN KEY (empleado_id) REFERENCES empleados (id)
+            CREATE TABLE IF NOT EXISTS versiones_tablas (
+                tabla TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
             )
         ''')
-        
-        # Tabla de detalles_venta (nueva)
+        cursor.executemany(
+            'INSERT OR IGNORE INTO versiones_tablas (tabla, version) VALUES (?, 0)',
+            [(tabla,) for tabla in TABLAS]
+        )
+        for tabla in TABLAS:
+            for operacion in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_version_{tabla}_{operacion.lower()}
+                    AFTER {operacion} ON {tabla}
+                    BEGIN
+                        UPDATE versiones_tablas SET version = version + 1 WHERE tabla = '{tabla}';
+                    END
+                ''')
+        # Aparte, solo UPDATE/DELETE: quien copia una tabla (motor_columnar) sabe si le basta agregar las filas nuevas
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS detalles_venta (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                venta_id INTEGER NOT NULL,
-                producto_id INTEGER NOT NULL,
-                cantidad INTEGER NOT NULL,
-                precio_unitario REAL NOT NULL,
-                FOREIGN KEY (venta_id) REFERENCES ventas (id) ON DELETE CASCADE,
-                FOREIGN KEY (producto_id) REFERENCES productos (id)
+            CREATE TABLE IF NOT EXISTS reescrituras_tablas (
+                tabla TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
             )
         ''')
+        cursor.executemany(
+            'INSERT OR IGNORE INTO reescrituras_tablas (tabla, version) VALUES (?, 0)',
+            [(tabla,) for tabla in TABLAS]
+        )
+        for tabla in TABLAS:
+            for operacion in ('UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_reescritura_{tabla}_{operacion.lower()}
+                    AFTER {operacion} ON {tabla}
+                    BEGIN
+                        UPDATE reescrituras_tablas SET version = version + 1 WHERE tabla = '{tabla}';
+                    END
+                ''')
+    
+    def _crear_resumenes(self, cursor):
+        """Tablas de resumen diario mantenidas de forma incremental con triggers"""
+        # categoria_id y empleado_id usan 0 cuando vienen NULL: las PK no admiten NULL
+        for tabla, clave, medidas in [
+            ('resumen_ventas_producto_dia', 'producto_id', 'cantidad INTEGER NOT NULL, ingresos REAL NOT NULL, lineas INTEGER NOT NULL'),
+            ('resumen_ventas_categoria_dia', 'categoria_id', 'cantidad INTEGER NOT NULL, ingresos REAL NOT NULL, lineas INTEGER NOT NULL'),
+            ('resumen_ventas_cliente_dia', 'cliente_id', 'ventas INTEGER NOT NULL, total REAL NOT NULL'),
+            ('resumen_ventas_empleado_dia', 'empleado_id', 'ventas INTEGER NOT NULL, total REAL NOT NULL'),
+        ]:
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {tabla} (
+                    fecha DATE NOT NULL,
+                    {clave} INTEGER NOT NULL,
+                    {medidas},
+                    PRIMARY KEY (fecha, {clave})
+                ) WITHOUT ROWID
+            """)
+            # Para preguntas por entidad ("ventas de un cliente") además de por fecha
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_{clave} ON {tabla} ({clave}, fecha)")
+        
+        def detalle(ref, signo):
+            """Suma (o resta) una línea de detalle a los resúmenes de producto y categoría"""
+            return f"""
+                INSERT INTO resumen_ventas_producto_dia (fecha, producto_id, cantidad, ingresos, lineas)
+                SELECT v.fecha, {ref}.producto_id, {signo}{ref}.cantidad, {signo}{ref}.cantidad * {ref}.precio_unitario, {signo}1
+                FROM ventas v WHERE v.id = {ref}.venta_id
+                ON CONFLICT (fecha, producto_id) DO UPDATE SET
+                    cantidad = cantidad + excluded.cantidad, ingresos = ingresos + excluded.ingresos, lineas = lineas + excluded.lineas;
+                INSERT INTO resumen_ventas_categoria_dia (fecha, categoria_id, cantidad, ingresos, lineas)
+                SELECT v.fecha, COALESCE(p.categoria_id, 0), {signo}{ref}.cantidad, {signo}{ref}.cantidad * {ref}.precio_unitario, {signo}1
+                FROM ventas v JOIN productos p ON p.id = {ref}.producto_id WHERE v.id = {ref}.venta_id
+                ON CONFLICT (fecha, categoria_id) DO UPDATE SET
+                    cantidad = cantidad + excluded.cantidad, ingresos = ingresos + excluded.ingresos, lineas = lineas + excluded.lineas;
+            """
+        
+        def detalles_de_venta(ref, fecha, signo):
+            """Suma (o resta) de una vez todas las líneas de una venta, en la fecha indicada"""
+            return f"""
+                INSERT INTO resumen_ventas_producto_dia (fecha, producto_id, cantidad, ingresos, lineas)
+                SELECT {fecha}, d.producto_id, {signo}SUM(d.cantidad), {signo}SUM(d.cantidad * d.precio_unitario), {signo}COUNT(*)
+                FROM detalles_venta d WHERE d.venta_id = {ref}.id GROUP BY d.producto_id
+                ON CONFLICT (fecha, producto_id) DO UPDATE SET
+                    cantidad = cantidad + excluded.cantidad, ingresos = ingresos + excluded.ingresos, lineas = lineas + excluded.lineas;
+                INSERT INTO resumen_ventas_categoria_dia (fecha, categoria_id, cantidad, ingresos, lineas)
+                SELECT {fecha}, COALESCE(p.categoria_id, 0), {signo}SUM(d.cantidad), {signo}SUM(d.cantidad * d.precio_unitario), {signo}COUNT(*)
+                FROM detalles_venta d JOIN productos p ON p.id = d.producto_id WHERE d.venta_id = {ref}.id
+                GROUP BY COALESCE(p.categoria_id, 0)
+                ON CONFLICT (fecha, categoria_id) DO UPDATE SET
+                    cantidad = cantidad + excluded.cantidad, ingresos = ingresos + excluded.ingresos, lineas = lineas + excluded.lineas;
+            """
         
-        conexion.commit()
-        conexion.close()
+        def venta(ref, signo):
+            """Suma (o resta) una venta a los resúmenes de cliente y empleado"""
+            return f"""
+                INSERT INTO resumen_ventas_cliente_dia (fecha, cliente_id, ventas, total)
+                VALUES ({ref}.fecha, {ref}.cliente_id, {signo}1, {signo}{ref}.total)
+                ON CONFLICT (fecha, cliente_id) DO UPDATE SET
+                    ventas = ventas + excluded.ventas, total = total + excluded.total;
+                INSERT INTO resumen_ventas_empleado_dia (fecha, empleado_id, ventas, total)
+                VALUES ({ref}.fecha, COALESCE({ref}.empleado_id, 0), {signo}1, {signo}{ref}.total)
+                ON CONFLICT (fecha, empleado_id) DO UPDATE SET
+                    ventas = ventas + excluded.ventas, total = total + excluded.total;
+            """
+        
+        def limpiar(fecha):
+            """Borra las filas que quedaron en cero (usa el prefijo fecha de la PK)"""
+            return f"""
+                DELETE FROM resumen_ventas_producto_dia WHERE fecha = {fecha} AND lineas <= 0;
+                DELETE FROM resumen_ventas_categoria_dia WHERE fecha = {fecha} AND lineas <= 0;
+                DELETE FROM resumen_ventas_cliente_dia WHERE fecha = {fecha} AND ventas <= 0;
+                DELETE FROM resumen_ventas_empleado_dia WHERE fecha = {fecha} AND ventas <= 0;
+            """
+        
+        fecha_detalle = "(SELECT fecha FROM ventas WHERE id = OLD.venta_id)"
+        triggers = {
+            'trg_resumen_detalle_insert': ("AFTER INSERT ON detalles_venta", detalle('NEW', '')),
+            # Si la venta ya no existe (borrado en cascada) la subconsulta no encuentra fecha y no resta nada:
+            # esas líneas ya las descontó trg_resumen_venta_delete
+            'trg_resumen_detalle_delete': ("AFTER DELETE ON detalles_venta", detalle('OLD', '-') + limpiar(fecha_detalle)),
+            'trg_resumen_detalle_update': ("AFTER UPDATE ON detalles_venta",
+                                           detalle('OLD', '-') + detalle('NEW', '') + limpiar(fecha_detalle)),
+            'trg_resumen_venta_insert': ("AFTER INSERT ON ventas", venta('NEW', '')),
+            'trg_resumen_venta_delete': ("BEFORE DELETE ON ventas",
+                                         venta('OLD', '-') + detalles_de_venta('OLD', 'OLD.fecha', '-') + limpiar('OLD.fecha')),
+            'trg_resumen_venta_update': ("AFTER UPDATE OF cliente_id, empleado_id, fecha, total ON ventas",
+                                         venta('OLD', '-') + venta('NEW', '') + limpiar('OLD.fecha')),
+            'trg_resumen_venta_fecha': ("AFTER UPDATE OF fecha ON ventas WHEN OLD.fecha IS NOT NEW.fecha",
+                                        detalles_de_venta('NEW', 'OLD.fecha', '-') + detalles_de_venta('NEW', 'NEW.fecha', '')
+                                        + limpiar('OLD.fecha')),
+            'trg_resumen_producto_categoria': ("AFTER UPDATE OF categoria_id ON productos "
+                                               "WHEN OLD.categoria_id IS NOT NEW.categoria_id", """
+                INSERT INTO resumen_ventas_categoria_dia (fecha, categoria_id, cantidad, ingresos, lineas)
+                SELECT fecha, COALESCE(OLD.categoria_id, 0), -cantidad, -ingresos, -lineas
+                FROM resumen_ventas_producto_dia WHERE producto_id = NEW.id
+                ON CONFLICT (fecha, categoria_id) DO UPDATE SET
+                    cantidad = cantidad + excluded.cantidad, ingresos = ingresos + excluded.ingresos, lineas = lineas + excluded.lineas;
+                INSERT INTO resumen_ventas_categoria_dia (fecha, categoria_id, cantidad, ingresos, lineas)
+                SELECT fecha, COALESCE(NEW.categoria_id, 0), cantidad, ingresos, lineas
+                FROM resumen_ventas_producto_dia WHERE producto_id = NEW.id
+                ON CONFLICT (fecha, categoria_id) DO UPDATE SET
+                    cantidad = cantidad + excluded.cantidad, ingresos = ingresos + excluded.ingresos, lineas = lineas + excluded.lineas;
+                DELETE FROM resumen_ventas_categoria_dia WHERE lineas <= 0;
+            """),
+        }
+        for nombre, (evento, cuerpo) in triggers.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {nombre} {evento} BEGIN {cuerpo} END")
+    
+    def _crear_busqueda(self, cursor):
+        """Tablas FTS5 de contenido externo (guardan solo el índice, el texto sigue en la tabla) y sus triggers"""
+        for tabla, columnas in BUSQUEDAS.items():
+            fts = f'fts_{tabla}'
+            lista = ', '.join(columnas)
+            # remove_diacritics 2: "Bogota" encuentra "Bogotá" y "Peréz" encuentra "Pérez"
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                    {lista}, content='{tabla}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+            insertar = f"INSERT INTO {fts} (rowid, {lista}) VALUES (NEW.id, {', '.join(f'NEW.{c}' for c in columnas)});"
+            # Con contenido externo, borrar del índice exige los valores viejos
+            borrar = (f"INSERT INTO {fts} ({fts}, rowid, {lista}) "
+                      f"VALUES ('delete', OLD.id, {', '.join(f'OLD.{c}' for c in columnas)});")
+            for nombre, evento, cuerpo in [
+                (f'trg_{fts}_insert', f'AFTER INSERT ON {tabla}', insertar),
+                (f'trg_{fts}_delete', f'AFTER DELETE ON {tabla}', borrar),
+                (f'trg_{fts}_update', f'AFTER UPDATE OF {lista} ON {tabla}', borrar + insertar),
+            ]:
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {nombre} {evento} BEGIN {cuerpo} END")
+    
+    def _indexar_busqueda(self, conexion, tabla, desde=0):
+        """Agrega, en bloque, al índice fts_<tabla> las filas con id mayor a `desde`"""
+        columnas = ', '.join(BUSQUEDAS[tabla])
+        conexion.execute(f"INSERT INTO fts_{tabla} (rowid, {columnas}) SELECT id, {columnas} FROM {tabla} WHERE id > ?",
+                         (desde,))
+    
+    def reconstruir_busqueda(self, tablas=None):
+        """Reconstruye desde cero los índices fts_* de las tablas dadas (todas por defecto)"""
+        with self._conexion_escritura() as conexion:
+            for tabla in tablas or BUSQUEDAS:
+                conexion.execute(f"INSERT INTO fts_{tabla} (fts_{tabla}) VALUES ('rebuild')")
+    
+    def _busquedas_desactualizadas(self):
+        """Tablas cuyo índice FTS no tiene tantas filas como la tabla (base creada antes de la búsqueda)"""
+        with self.pool.conexion() as conexion:
+            return [tabla for tabla in BUSQUEDAS if conexion.execute(
+                f"SELECT (SELECT COUNT(*) FROM fts_{tabla}_docsize) != (SELECT COUNT(*) FROM {tabla})"
+            ).fetchone()[0]]
+    
+    def _acumular_resumenes(self, conexion, desde_venta=0, desde_detalle=0):
+        """Suma a los resúmenes, en bloque, las ventas y detalles con id mayor a los indicados"""
+        acumular_lineas = """
+            DO UPDATE SET cantidad = cantidad + excluded.cantidad, ingresos = ingresos + excluded.ingresos,
+                          lineas = lineas + excluded.lineas
+        """
+        acumular_ventas = "DO UPDATE SET ventas = ventas + excluded.ventas, total = total + excluded.total"
+        conexion.execute(f"""
+            INSERT INTO resumen_ventas_producto_dia (fecha, producto_id, cantidad, ingresos, lineas)
+            SELECT v.fecha, d.producto_id, SUM(d.cantidad), SUM(d.cantidad * d.precio_unitario), COUNT(*)
+            FROM detalles_venta d JOIN ventas v ON v.id = d.venta_id WHERE d.id > ?
+            GROUP BY v.fecha, d.producto_id
+            ON CONFLICT (fecha, producto_id) {acumular_lineas}
+        """, (desde_detalle,))
+        conexion.execute(f"""
+            INSERT INTO resumen_ventas_categoria_dia (fecha, categoria_id, cantidad, ingresos, lineas)
+            SELECT v.fecha, COALESCE(p.categoria_id, 0), SUM(d.cantidad), SUM(d.cantidad * d.precio_unitario), COUNT(*)
+            FROM detalles_venta d JOIN ventas v ON v.id = d.venta_id JOIN productos p ON p.id = d.producto_id
+            WHERE d.id > ?
+            GROUP BY v.fecha, COALESCE(p.categoria_id, 0)
+            ON CONFLICT (fecha, categoria_id) {acumular_lineas}
+        """, (desde_detalle,))
+        conexion.execute(f"""
+            INSERT INTO resumen_ventas_cliente_dia (fecha, cliente_id, ventas, total)
+            SELECT fecha, cliente_id, COUNT(*), SUM(total) FROM ventas WHERE id > ? GROUP BY fecha, cliente_id
+            ON CONFLICT (fecha, cliente_id) {acumular_ventas}
+        """, (desde_venta,))
+        conexion.execute(f"""
+            INSERT INTO resumen_ventas_empleado_dia (fecha, empleado_id, ventas, total)
+            SELECT fecha, COALESCE(empleado_id, 0), COUNT(*), SUM(total) FROM ventas WHERE id > ?
+            GROUP BY fecha, COALESCE(empleado_id, 0)
+            ON CONFLICT (fecha, empleado_id) {acumular_ventas}
+        """, (desde_venta,))
+    
+    def reconstruir_resumenes(self):
+        """Recalcula desde cero las tablas resumen_* a partir de ventas y detalles_venta"""
+        with self._conexion_escritura() as conexion:
+            for tabla in ('resumen_ventas_producto_dia', 'resumen_ventas_categoria_dia',
+                          'resumen_ventas_cliente_dia', 'resumen_ventas_empleado_dia'):
+                conexion.execute(f"DELETE FROM {tabla}")
+            self._acumular_resumenes(conexion)
+    
+    def _resumenes_desactualizados(self):
+        """True si hay ventas pero los resúmenes están vacíos (base creada antes de los resúmenes)"""
+        with self.pool.conexion() as conexion:
+            return conexion.execute("""
+                SELECT EXISTS (SELECT 1 FROM ventas) AND NOT EXISTS (SELECT 1 FROM resumen_ventas_cliente_dia)
+            """).fetchone()[0] == 1
+    
+    def versiones_tablas(self):
+        """Retorna el contador de escrituras de cada tabla"""
+        with self.pool.conexion() as conexion:
+            return dict(conexion.execute('SELECT tabla, version FROM versiones_tablas').fetchall())
+    
+    def reescrituras_tablas(self):
+        """Retorna el contador de UPDATE/DELETE de cada tabla (los INSERT no lo mueven)"""
+        with self.pool.conexion() as conexion:
+            return dict(conexion.execute('SELECT tabla, version FROM reescrituras_tablas').fetchall())
+    
+    def introspeccionar_esquema(self):
+        """Tablas, columnas y FOREIGN KEY leídas de sqlite_master y PRAGMA; cacheado por schema_version.
+        
+        Retorna {tabla: {'columnas': [(nombre, tipo, es_pk)], 'fks': {columna: (tabla, columna)}}}
+        en orden de creación. Mientras el esquema no cambie se retorna el mismo objeto.
+        """
+        with self.pool.conexion() as conexion:
+            version = conexion.execute("PRAGMA schema_version").fetchone()[0]
+            if self._esquema is not None and self._esquema[0] == version:
+                return self._esquema[1]
+            
+            esquema = {}
+            tablas = conexion.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+            ).fetchall()
+            # Las tablas internas de FTS5 (fts_x_data, fts_x_idx, ...) no son parte del esquema
+            sombras = {nombre for nombre, tipo in conexion.execute("SELECT name, type FROM pragma_table_list")
+                       if tipo == 'shadow'}
+            for (tabla,) in tablas:
+                if tabla in TABLAS_INTERNAS or tabla in sombras:
+                    continue
+                info = conexion.execute(f"PRAGMA table_info({tabla})").fetchall()
+                # En PK compuestas (tablas resumen) ninguna columna es "la" PK
+                pk_simple = sum(1 for columna in info if columna[5]) == 1
+                esquema[tabla] = {
+                    'columnas': [(columna[1], columna[2], pk_simple and columna[5] > 0) for columna in info],
+                    'fks': {fk[3]: (fk[2], fk[4] or 'id') for fk in conexion.execute(f"PRAGMA foreign_key_list({tabla})")},
+                }
+            self._esquema = (version, esquema)
+            return esquema
+    
+    def explicar(self, consulta, parametros=(), avisar=True):
+        """Retorna las líneas de EXPLAIN QUERY PLAN de la consulta (con NULL basta para sus ?)"""
+        try:
+            with self.pool.conexion() as conexion:
+                # sqlite3 cachea el EXPLAIN ya preparado y no lo re-prepara si cambia el esquema,
+                # así que la versión del esquema va en el texto para que un índice nuevo se note
+                version = conexion.execute("PRAGMA schema_version").fetchone()[0]
+                filas = conexion.execute(f"EXPLAIN QUERY PLAN {consulta}\n-- esquema {version}", parametros).fetchall()
+                return [fila[-1] for fila in filas]
+        except Exception as e:
+            if avisar:
+                print(f"Error en EXPLAIN: {e}")
+            return None
+    
+    def filas_estimadas(self, tabla, vigencia=60.0):
+        """Filas aproximadas de una tabla (MAX(rowid), sin recorrerla); None si no se puede estimar"""
+        cacheado = self._filas_estimadas.get(tabla)
+        if cacheado is not None and time.monotonic() - cacheado[0] < vigencia:
+            return cacheado[1]
+        try:
+            with self.pool.conexion() as conexion:
+                filas = conexion.execute(f'SELECT MAX(rowid) FROM "{tabla}"').fetchone()[0] or 0
+        except sqlite3.Error:
+            # Tablas WITHOUT ROWID (resúmenes) o nombres que no son tablas (subconsultas del plan)
+            filas = None
+        self._filas_estimadas[tabla] = (time.monotonic(), filas)
+        return filas
+    
+    def crear_indice(self, ddl, tabla):
+        """Ejecuta un CREATE INDEX sobre `tabla` por la conexión de escritura y actualiza sus estadísticas"""
+        with self._conexion_escritura() as conexion:
+            conexion.execute(ddl)
+            # Solo la tabla del índice: un ANALYZE de toda la base recorre todas las tablas
+            conexion.execute(f'ANALYZE "{tabla}"')
     
     def _insertar_datos_ejemplo(self):
         """Inserta datos de ejemplo coherentes y realistas"""
-        conexion = sqlite3.connect(self.archivo)
-        cursor = conexion.cursor()
+        with self._conexion_escritura() as conexion:
+            cursor = conexion.cursor()
         
-        print("Insertando datos de ejemplo profesionales...")
+            print("Insertando datos de ejemplo profesionales...")
         
-        # 1. Insertar categorías
-        categorias = [
-            ('Electrónicos',),
-            ('Ropa',),
-            ('Hogar',),
-            ('Deportes',)
-        ]
-        cursor.executemany('INSERT INTO categorias (nombre) VALUES (?)', categorias)
-        
-        # 2. Insertar proveedores
-        proveedores = [
-            ('TechCorp', 'Carlos Méndez', '3001234567'),
-            ('ModaTotal', 'Ana López', '3109876543'),
-            ('HogarExpress', 'Pedro Sánchez', '3205558899'),
-            ('DeportesMax', 'Laura García', '3157773322')
-        ]
-        cursor.executemany('INSERT INTO proveedores (nombre, contacto, telefono) VALUES (?, ?, ?)', proveedores)
-        
-        # 3. Insertar productos con categorías y proveedores
-        productos = [
-            ('iPhone 15 Pro', '256GB, Titanio, Cámara 48MP', 1299.99, 25, 1, 1),
-            ('Samsung Galaxy S24', '512GB, Pantalla Dynamic AMOLED', 1099.99, 18, 1, 1),
-            ('MacBook Air M3', '13.6", 8GB RAM, 256GB SSD', 1499.99, 12, 1, 1),
-            ('Camisa Polo Classic', 'Algodón 100%, Tallas S-XXL', 45.99, 50, 2, 2),
-            ('Jeans Slim Fit', 'Denim elastizado, Color azul', 79.99, 30, 2, 2),
-            ('Sofá 3 Plazas', 'Tela resistente, Color gris', 899.99, 8, 3, 3),
-            ('Lámpara LED', 'RGB, Control remoto, 15W', 89.99, 40, 3, 3),
-            ('Balón Fútbol', 'Tamaño 5, Oficial FIFA', 29.99, 60, 4, 4),
-            ('Raqueta Tenis', 'Graphite, Peso 300g', 199.99, 15, 4, 4)
-        ]
-        cursor.executemany('''
-            INSERT INTO productos (nombre, descripcion, precio, stock, categoria_id, proveedor_id) 
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', productos)
-        
-        # 4. Insertar clientes
-        clientes = [
-            ('María González', 'maria@email.com', '3001112233', 'Bogotá'),
-            ('Carlos Rodríguez', 'carlos@email.com', '3104445566', 'Medellín'),
-            ('Ana Martínez', 'ana@email.com', '3207778899', 'Cali'),
-            ('Juan Pérez', 'juan@email.com', '3159990011', 'Bogotá'),
-            ('Laura Díaz', 'laura@email.com', '3002223344', 'Medellín')
-        ]
-        cursor.executemany('INSERT INTO clientes (nombre, email, telefono, ciudad) VALUES (?, ?, ?, ?)', clientes)
-        
-        # 5. Insertar empleados
-        empleados = [
-            ('Sofia Castro', 'sofia@tienda.com', 'Vendedor', '2023-01-15'),
-            ('Miguel Torres', 'miguel@tienda.com', 'Gerente', '2022-03-10'),
-            ('Catalina Rojas', 'catalina@tienda.com', 'Cajero', '2023-06-20'),
-            ('Andrés López', 'andres@tienda.com', 'Vendedor', '2023-02-28')
-        ]
-        cursor.executemany('INSERT INTO empleados (nombre, email, rol, fecha_contratacion) VALUES (?, ?, ?, ?)', empleados)
-        
-        # 6. Insertar ventas realistas
-        # Fechas de los últimos 30 días
-        fecha_base = datetime.now()
-        ventas = [
-            (1, 1, (fecha_base - timedelta(days=5)).strftime('%Y-%m-%d'), 1349.98, 'completada'),
-            (2, 4, (fecha_base - timedelta(days=3)).strftime('%Y-%m-%d'), 1099.99, 'completada'),
-            (3, 1, (fecha_base - timedelta(days=10)).strftime('%Y-%m-%d'), 1549.98, 'completada'),
-            (4, 4, (fecha_base - timedelta(days=1)).strftime('%Y-%m-%d'), 125.98, 'completada'),
-            (5, 1, (fecha_base - timedelta(days=15)).strftime('%Y-%m-%d'), 229.97, 'completada')
-        ]
-        cursor.executemany('INSERT INTO ventas (cliente_id, empleado_id, fecha, total, estado) VALUES (?, ?, ?, ?, ?)', ventas)
-        
-        # 7. Insertar detalles de venta
-        detalles_venta = [
-            (1, 1, 1, 1299.99),  # Venta 1: 1 iPhone
-            (1, 4, 1, 49.99),    # Venta 1: 1 Camisa Polo
-            (2, 2, 1, 1099.99),  # Venta 2: 1 Samsung Galaxy
-            (3, 3, 1, 1499.99),  # Venta 3: 1 MacBook Air
-            (3, 9, 1, 49.99),    # Venta 3: 1 Raqueta Tenis
-            (4, 4, 2, 45.99),    # Venta 4: 2 Camisas Polo
-            (4, 5, 1, 79.99),    # Venta 4: 1 Jeans
-            (5, 8, 2, 29.99),    # Venta 5: 2 Balones
-            (5, 9, 1, 199.99)    # Venta 5: 1 Raqueta Tenis
-        ]
-        cursor.executemany('''
-            INSERT INTO detalles_venta (venta_id, producto_id, cantidad, precio_unitario) 
-            VALUES (?, ?, ?, ?)
-        ''', detalles_venta)
+            # 1. Insertar categorías
+            categorias = [
+                ('Electrónicos',),
+                ('Ropa',),
+                ('Hogar',),
+                ('Deportes',)
+            ]
+            cursor.executemany('INSERT INTO categorias (nombre) VALUES (?)', categorias)
+        
+            # 2. Insertar proveedores
+            proveedores = [
+                ('TechCorp', 'Carlos Méndez', '3001234567'),
+                ('ModaTotal', 'Ana López', '3109876543'),
+                ('HogarExpress', 'Pedro Sánchez', '3205558899'),
+                ('DeportesMax', 'Laura García', '3157773322')
+            ]
+            cursor.executemany('INSERT INTO proveedores (nombre, contacto, telefono) VALUES (?, ?, ?)', proveedores)
+        
+            # 3. Insertar productos con categorías y proveedores
+            productos = [
+                ('iPhone 15 Pro', '256GB, Titanio, Cámara 48MP', 1299.99, 25, 1, 1),
+                ('Samsung Galaxy S24', '512GB, Pantalla Dynamic AMOLED', 1099.99, 18, 1, 1),
+                ('MacBook Air M3', '13.6", 8GB RAM, 256GB SSD', 1499.99, 12, 1, 1),
+                ('Camisa Polo Classic', 'Algodón 100%, Tallas S-XXL', 45.99, 50, 2, 2),
+                ('Jeans Slim Fit', 'Denim elastizado, Color azul', 79.99, 30, 2, 2),
+                ('Sofá 3 Plazas', 'Tela resistente, Color gris', 899.99, 8, 3, 3),
+                ('Lámpara LED', 'RGB, Control remoto, 15W', 89.99, 40, 3, 3),
+                ('Balón Fútbol', 'Tamaño 5, Oficial FIFA', 29.99, 60, 4, 4),
+                ('Raqueta Tenis', 'Graphite, Peso 300g', 199.99, 15, 4, 4)
+            ]
+            cursor.executemany('''
+                INSERT INTO productos (nombre, descripcion, precio, stock, categoria_id, proveedor_id) 
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', productos)
+        
+            # 4. Insertar clientes
+            clientes = [
+                ('María González', 'maria@email.com', '3001112233', 'Bogotá'),
+                ('Carlos Rodríguez', 'carlos@email.com', '3104445566', 'Medellín'),
+                ('Ana Martínez', 'ana@email.com', '3207778899', 'Cali'),
+                ('Juan Pérez', 'juan@email.com', '3159990011', 'Bogotá'),
+                ('Laura Díaz', 'laura@email.com', '3002223344', 'Medellín')
+            ]
+            cursor.executemany('INSERT INTO clientes (nombre, email, telefono, ciudad) VALUES (?, ?, ?, ?)', clientes)
         
-        conexion.commit()
-        conexion.close()
+            # 5. Insertar empleados
+            empleados = [
+                ('Sofia Castro', 'sofia@tienda.com', 'Vendedor', '2023-01-15'),
+                ('Miguel Torres', 'miguel@tienda.com', 'Gerente', '2022-03-10'),
+                ('Catalina Rojas', 'catalina@tienda.com', 'Cajero', '2023-06-20'),
+                ('Andrés López', 'andres@tienda.com', 'Vendedor', '2023-02-28')
+            ]
+            cursor.executemany('INSERT INTO empleados (nombre, email, rol, fecha_contratacion) VALUES (?, ?, ?, ?)', empleados)
+        
+            # 6. Insertar ventas realistas
+            # Fechas de los últimos 30 días
+            fecha_base = datetime.now()
+            ventas = [
+                (1, 1, (fecha_base - timedelta(days=5)).strftime('%Y-%m-%d'), 1349.98, 'completada'),
+                (2, 4, (fecha_base - timedelta(days=3)).strftime('%Y-%m-%d'), 1099.99, 'completada'),
+                (3, 1, (fecha_base - timedelta(days=10)).strftime('%Y-%m-%d'), 1549.98, 'completada'),
+                (4, 4, (fecha_base - timedelta(days=1)).strftime('%Y-%m-%d'), 125.98, 'completada'),
+                (5, 1, (fecha_base - timedelta(days=15)).strftime('%Y-%m-%d'), 229.97, 'completada')
+            ]
+            cursor.executemany('INSERT INTO ventas (cliente_id, empleado_id, fecha, total, estado) VALUES (?, ?, ?, ?, ?)', ventas)
+        
+            # 7. Insertar detalles de venta
+            detalles_venta = [
+                (1, 1, 1, 1299.99),  # Venta 1: 1 iPhone
+                (1, 4, 1, 49.99),    # Venta 1: 1 Camisa Polo
+                (2, 2, 1, 1099.99),  # Venta 2: 1 Samsung Galaxy
+                (3, 3, 1, 1499.99),  # Venta 3: 1 MacBook Air
+                (3, 9, 1, 49.99),    # Venta 3: 1 Raqueta Tenis
+                (4, 4, 2, 45.99),    # Venta 4: 2 Camisas Polo
+                (4, 5, 1, 79.99),    # Venta 4: 1 Jeans
+                (5, 8, 2, 29.99),    # Venta 5: 2 Balones
+                (5, 9, 1, 199.99)    # Venta 5: 1 Raqueta Tenis
+            ]
+            cursor.executemany('''
+                INSERT INTO detalles_venta (venta_id, producto_id, cantidad, precio_unitario) 
+                VALUES (?, ?, ?, ?)
+            ''', detalles_venta)
         print("Datos de ejemplo insertados correctamente!")
     
-    def ejecutar_consulta(self, consulta, parametros=()):
-        """Ejecuta una consulta SQL y retorna los resultados Y nombres de columnas"""
-        conexion = sqlite3.connect(self.archivo)
-        cursor = conexion.cursor()
+    def ejecutar_consulta(self, consulta, parametros=(), medicion=None, presupuesto=None):
+        """Ejecuta una consulta SQL y retorna los resultados Y nombres de columnas.
         
+        Si se pasa `medicion` (con agregar(etapa, segundos)), se le suman las etapas
+        'ejecucion' (execute, hasta la primera fila) y 'lectura' (fetchall).
+        Con un PresupuestoConsulta, superarlo lanza PresupuestoExcedido en vez de retornar None.
+        """
+        presupuesto = presupuesto or PresupuestoConsulta()
         try:
-            cursor.execute("PRAGMA foreign_keys = ON")
-            cursor.execute(consulta, parametros)
-            resultados = cursor.fetchall()
+            with self.pool.conexion() as conexion, presupuesto.vigilancia().tramo(conexion):
+                cursor = conexion.cursor()
+                inicio = time.perf_counter()
+                cursor.execute(consulta, parametros)
+                ejecutado = time.perf_counter()
+                resultados = presupuesto.leer(cursor)
+                if medicion is not None:
+                    medicion.agregar('ejecucion', ejecutado - inicio)
+                    medicion.agregar('lectura', time.perf_counter() - ejecutado)
+
+                # OBTENER NOMBRES DE COLUMNAS
+                nombres_columnas = [descripcion[0] for descripcion in cursor.description] if cursor.description else []
+
+                # Un SELECT no abre transacción: no hay nada que confirmar
+                return {
+                    'datos': resultados,
+                    'columnas': nombres_columnas
+                }
+        except PresupuestoExcedido:
+            raise
+        except Exception as e:
+            print(f"Error en consulta SQL: {e}")
+            return None
+    
+    def ejecutar_en_transaccion(self, consultas, presupuesto=None):
+        """Ejecuta varias consultas de lectura en una sola transacción (misma instantánea de datos).
+        
+        `consultas` es una lista de (sql, parametros, medicion); retorna, en el mismo orden, el resultado de
+        cada una ({'datos', 'columnas'}) o la excepción que produjo, sin cortar las demás.
+        El `presupuesto` se aplica a cada consulta por separado.
+        """
+        presupuesto = presupuesto or PresupuestoConsulta()
+        resultados = []
+        with self.pool.conexion() as conexion:
+            conexion.execute("BEGIN")
+            try:
+                for consulta, parametros, medicion in consultas:
+                    try:
+                        with presupuesto.vigilancia().tramo(conexion):
+                            inicio = time.perf_counter()
+                            cursor = conexion.execute(consulta, parametros)
+                            ejecutado = time.perf_counter()
+                            datos = presupuesto.leer(cursor)
+                        if medicion is not None:
+                            medicion.agregar('ejecucion', ejecutado - inicio)
+                            medicion.agregar('lectura', time.perf_counter() - ejecutado)
+                        columnas = [descripcion[0] for descripcion in cursor.description] if cursor.description else []
+                        resultados.append({'datos': datos, 'columnas': columnas})
+                    except sqlite3.Error as e:
+                        resultados.append(e)
+            finally:
+                # Solo hubo lecturas: terminar la transacción libera el snapshot
+                conexion.rollback()
+        return resultados
+    
+    def abrir_cursor(self, consulta, parametros=(), tamano_lote=500, presupuesto=None):
+        """Ejecuta la consulta y retorna un CursorEnLotes para leerla sin fetchall.
+        
+        Los segundos y pasos del `presupuesto` se suman entre la ejecución y todos los lotes;
+        max_filas no aplica, el que lee decide cuántas filas pide.
+        """
+        vigilancia = (presupuesto or PresupuestoConsulta()).vigilancia()
+        conexion = self.pool.obtener()
+        try:
+            with vigilancia.tramo(conexion):
+                cursor = conexion.execute(consulta, parametros)
+        except Exception:
+            self.pool.devolver(conexion)
+            raise
+        return CursorEnLotes(self.pool, conexion, cursor, tamano_lote, vigilancia)
+    
+    def cargar_masivo(self, tabla, columnas, filas, tamano_lote=100000):
+        """Carga masiva de filas (tuplas en el orden de columnas) con índices, triggers y FK diferidos.
+        
+        Relaja synchronous/journal_mode, inserta por lotes grandes, valida las FOREIGN KEY en bloque
+        al final (borrando las filas nuevas que no cumplen) y reconstruye índices, resúmenes y
+        versiones (y el índice FTS de la tabla) una sola vez. Retorna un informe con filas/s.
+        """
+        if tabla not in TABLAS:
+            raise ValueError(f"Tabla desconocida: {tabla}")
+        with self._conexion_escritura() as conexion:
+            existentes = {fila[1] for fila in conexion.execute(f"PRAGMA table_info({tabla})")}
+            desconocidas = [c for c in columnas if c not in existentes]
+            if desconocidas:
+                raise ValueError(f"Columnas desconocidas en {tabla}: {', '.join(desconocidas)}")
             
-            # OBTENER NOMBRES DE COLUMNAS
-            nombres_columnas = [descripcion[0] for descripcion in cursor.description] if cursor.description else []
+            inicio = time.perf_counter()
+            desde_venta = conexion.execute("SELECT COALESCE(MAX(id), 0) FROM ventas").fetchone()[0]
+            desde_detalle = conexion.execute("SELECT COALESCE(MAX(id), 0) FROM detalles_venta").fetchone()[0]
+            desde = conexion.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {tabla}").fetchone()[0]
             
+            # Índices y triggers de la tabla se sacan durante la carga y se recrean al final
+            diferidos = conexion.execute(
+                "SELECT type, name, sql FROM sqlite_master "
+                "WHERE type IN ('index', 'trigger') AND tbl_name = ? AND sql IS NOT NULL",
+                (tabla,)
+            ).fetchall()
             conexion.commit()
+            synchronous = conexion.execute("PRAGMA synchronous").fetchone()[0]
+            journal_mode = conexion.execute("PRAGMA journal_mode").fetchone()[0]
+            conexion.execute("PRAGMA foreign_keys = OFF")
+            conexion.execute("PRAGMA synchronous = OFF")
+            if journal_mode != 'wal':
+                conexion.execute("PRAGMA journal_mode = MEMORY")
+            
+            cargadas = 0
+            rechazadas = 0
+            try:
+                for tipo, nombre, _ in diferidos:
+                    conexion.execute(f"DROP {tipo.upper()} IF EXISTS {nombre}")
+                conexion.commit()
+                
+                insertar = f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})"
+                lote = []
+                for fila in filas:
+                    lote.append(fila)
+                    if len(lote) >= tamano_lote:
+                        conexion.executemany(insertar, lote)
+                        conexion.commit()
+                        cargadas += len(lote)
+                        lote = []
+                if lote:
+                    conexion.executemany(insertar, lote)
+                    conexion.commit()
+                    cargadas += len(lote)
+                tiempo_carga = time.perf_counter() - inicio
+                
+                # FOREIGN KEY validadas en bloque: solo se descartan filas de esta carga. foreign_key_check
+                # da una fila por restricción violada, así que una fila con dos FK rotas aparece dos veces
+                rechazadas = conexion.execute(
+                    f"DELETE FROM {tabla} WHERE rowid IN "
+                    f"(SELECT DISTINCT rowid FROM pragma_foreign_key_check(?) WHERE rowid > ?)", (tabla, desde)
+                ).rowcount
+                conexion.commit()
+            finally:
+                # Aunque la carga falle a mitad, lo ya confirmado queda con índices, triggers y resúmenes
+                conexion.rollback()
+                actuales = {nombre for (nombre,) in conexion.execute("SELECT name FROM sqlite_master")}
+                for _, nombre, sql in diferidos:
+                    if nombre not in actuales:
+                        conexion.execute(sql)
+                if tabla in ('ventas', 'detalles_venta'):
+                    self._acumular_resumenes(conexion, desde_venta, desde_detalle)
+                if tabla in BUSQUEDAS:
+                    self._indexar_busqueda(conexion, tabla, desde)
+                conexion.execute("UPDATE versiones_tablas SET version = version + 1 WHERE tabla = ?", (tabla,))
+                if rechazadas:
+                    # Filas ya confirmadas que se borraron sin triggers: alguien pudo haberlas copiado
+                    conexion.execute("UPDATE reescrituras_tablas SET version = version + 1 WHERE tabla = ?", (tabla,))
+                conexion.commit()
+                conexion.execute("PRAGMA foreign_keys = ON")
+                conexion.execute(f"PRAGMA synchronous = {synchronous}")
+                if journal_mode != 'wal':
+                    conexion.execute(f"PRAGMA journal_mode = {journal_mode}")
+            
+            total = time.perf_counter() - inicio
             return {
-                'datos': resultados,
-                'columnas': nombres_columnas
-            }
-        except Exception as e:
-            print(f"Error en consulta SQL: {e}")
-            return None
-        finally:
-            conexion.close()
\ No newline at end of file
+                'tabla': tabla,
+                'filas': cargadas - rechazadas,
+                'rechazadas': rechazadas,
+                'segundos_carga': tiempo_carga,
+                'segundos_total': total,
+                'filas_por_segundo': cargadas / tiempo_carga if tiempo_carga else 0.0,
+                'filas_por_segundo_total': (cargadas - rechazadas) / total if total else 0.0,
+            }
\ No newline at end of file
@@ -0,0 +1,76 @@
+# benchmark_busqueda.py
+# LIKE contra MATCH de FTS5 en las búsquedas de texto que genera el agente (nombres, ciudades, productos),
+# sobre una base generada con generador_datos. Reporta la latencia p50 y cuántas filas encuentra cada una:
+# LIKE no encuentra "Bogota" sin tilde, MATCH sí (tokenizador unicode61 con remove_diacritics).
+# Ejemplo: python benchmark_busqueda.py --bd bench_1m.db --repeticiones 20
+import argparse
+import time
+
+from base_datos import BaseDatos
+from metricas import percentil
+
+# (búsqueda, SQL con LIKE, SQL con MATCH); las dos forman parte de lo que el LLM escribiría con y sin la regla FTS
+CASOS = [
+    ("cliente por nombre",
+     "SELECT id, nombre, ciudad FROM clientes WHERE nombre LIKE '%María González%'",
+     "SELECT id, nombre, ciudad FROM clientes WHERE id IN "
+     "(SELECT rowid FROM fts_clientes WHERE fts_clientes MATCH 'nombre: \"María González\"')"),
+    ("clientes de Bogotá",
+     "SELECT id, nombre FROM clientes WHERE ciudad LIKE '%Bogotá%'",
+     "SELECT id, nombre FROM clientes WHERE id IN "
+     "(SELECT rowid FROM fts_clientes WHERE fts_clientes MATCH 'ciudad: bogotá')"),
+    ("clientes de Bogota (sin tilde)",
+     "SELECT id, nombre FROM clientes WHERE ciudad LIKE '%Bogota%'",
+     "SELECT id, nombre FROM clientes WHERE id IN "
+     "(SELECT rowid FROM fts_clientes WHERE fts_clientes MATCH 'ciudad: bogota')"),
+    ("ventas de un cliente",
+     "SELECT v.id, v.total, v.fecha FROM ventas v JOIN clientes c ON v.cliente_id = c.id "
+     "WHERE c.nombre LIKE '%Carlos Rodríguez%'",
+     "SELECT v.id, v.total, v.fecha FROM ventas v WHERE v.cliente_id IN "
+     "(SELECT rowid FROM fts_clientes WHERE fts_clientes MATCH 'nombre: \"Carlos Rodríguez\"')"),
+    ("productos por palabra",
+     "SELECT id, nombre, precio FROM productos WHERE nombre LIKE '%Portátil%'",
+     "SELECT id, nombre, precio FROM productos WHERE id IN "
+     "(SELECT rowid FROM fts_productos WHERE fts_productos MATCH 'nombre: portátil')"),
+    ("producto por descripción",
+     "SELECT id, nombre FROM productos WHERE descripcion LIKE '%Referencia sintética 1234%'",
+     "SELECT id, nombre FROM productos WHERE id IN "
+     "(SELECT rowid FROM fts_productos WHERE fts_productos MATCH 'descripcion: \"referencia sintetica 1234\"')"),
+]
+
+
+def medir(bd, sql, repeticiones):
+    """(p50 en segundos, filas) de `repeticiones` ejecuciones de sql"""
+    tiempos = []
+    filas = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = bd.ejecutar_consulta(sql)
+        tiempos.append(time.perf_counter() - inicio)
+        filas = len(resultado['datos'])
+    return percentil(tiempos, 50), filas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Búsqueda de texto: LIKE contra FTS5")
+    parser.add_argument('--bd', default='ventas.db', help="base generada con generador_datos.py")
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    # Abrir la base crea y llena los índices fts_* si la base es anterior a ellos
+    inicio = time.perf_counter()
+    bd = BaseDatos(args.bd)
+    print(f"Base abierta en {time.perf_counter() - inicio:.2f}s")
+    inicio = time.perf_counter()
+    bd.reconstruir_busqueda()
+    conteos = {tabla: bd.ejecutar_consulta(f"SELECT COUNT(*) FROM {tabla}")['datos'][0][0]
+               for tabla in ('clientes', 'productos', 'empleados')}
+    print(f"Índices FTS reconstruidos en {time.perf_counter() - inicio:.2f}s "
+          f"({', '.join(f'{cantidad:,} {tabla}' for tabla, cantidad in conteos.items())})")
+
+    print(f"\n{'búsqueda':<32} {'LIKE p50 ms':>11} {'filas':>7} {'MATCH p50 ms':>12} {'filas':>7} {'aceleración':>11}")
+    for nombre, sql_like, sql_match in CASOS:
+        like, filas_like = medir(bd, sql_like, args.repeticiones)
+        match, filas_match = medir(bd, sql_match, args.repeticiones)
+        print(f"{nombre:<32} {like * 1000:>11.2f} {filas_like:>7,} {match * 1000:>12.2f} {filas_match:>7,} "
+              f"{like / match:>10.1f}x")
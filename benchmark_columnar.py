@@ -0,0 +1,99 @@
+# benchmark_columnar.py
+# SQLite contra el motor columnar (motor_columnar.py) en las agregaciones que pide el dashboard,
+# sobre una base generada con generador_datos. Verifica que los dos den el mismo resultado y reporta
+# la latencia p50 de cada uno; requiere numpy.
+# Ejemplo: python benchmark_columnar.py --bd bench_1m.db --repeticiones 10
+import argparse
+import math
+import time
+
+from base_datos import BaseDatos
+from metricas import percentil
+from motor_columnar import MotorColumnar
+
+# (agregación, SQL) como los escribe el LLM, con el LIMIT que agrega el validador
+CASOS = [
+    ("ingresos por mes",
+     "SELECT strftime('%Y-%m', fecha) AS mes, COUNT(*) AS ventas, ROUND(SUM(total), 2) AS ingresos "
+     "FROM ventas GROUP BY mes ORDER BY mes LIMIT 10000"),
+    ("ingresos por ciudad",
+     "SELECT c.ciudad, COUNT(*) AS ventas, SUM(v.total) AS ingresos FROM ventas v "
+     "JOIN clientes c ON v.cliente_id = c.id GROUP BY c.ciudad ORDER BY ingresos DESC LIMIT 10000"),
+    ("ingresos por categoría",
+     "SELECT cat.nombre AS categoria, SUM(dv.cantidad) AS unidades, SUM(dv.cantidad * dv.precio_unitario) AS ingresos "
+     "FROM detalles_venta dv JOIN productos p ON dv.producto_id = p.id JOIN categorias cat ON p.categoria_id = cat.id "
+     "GROUP BY cat.nombre ORDER BY ingresos DESC LIMIT 10000"),
+    ("ventas por empleado",
+     "SELECT e.nombre, SUM(v.total) AS vendido, ROUND(AVG(v.total), 2) AS ticket FROM ventas v "
+     "JOIN empleados e ON v.empleado_id = e.id GROUP BY e.id ORDER BY vendido DESC LIMIT 10000"),
+    ("top 10 productos",
+     "SELECT p.nombre, SUM(dv.cantidad * dv.precio_unitario) AS ingresos FROM detalles_venta dv "
+     "JOIN productos p ON dv.producto_id = p.id GROUP BY p.id ORDER BY ingresos DESC LIMIT 10"),
+    ("top 10 clientes",
+     "SELECT c.nombre, SUM(v.total) AS comprado FROM ventas v JOIN clientes c ON v.cliente_id = c.id "
+     "GROUP BY c.id ORDER BY comprado DESC LIMIT 10"),
+    ("ticket por estado",
+     "SELECT estado, COUNT(*), AVG(total), MAX(total) FROM ventas GROUP BY estado LIMIT 10000"),
+    ("total de un trimestre",
+     "SELECT COUNT(*), SUM(total) FROM ventas WHERE fecha BETWEEN '2025-01-01' AND '2025-03-31' LIMIT 10000"),
+    ("total del mes actual",
+     "SELECT COUNT(*), SUM(total) FROM ventas WHERE fecha >= date('now', 'start of month') LIMIT 10000"),
+    # fecha es DATE (afinidad NUMERIC): SQLite compara contra el entero 2025, así que el motor lo deja a SQLite
+    ("fecha contra un año",
+     "SELECT COUNT(*) FROM ventas WHERE fecha > '2025' LIMIT 10000"),
+]
+
+
+def iguales(a, b):
+    """Mismas filas en el mismo orden; los REAL con tolerancia relativa (el orden de las sumas cambia el último bit)"""
+    if len(a) != len(b):
+        return False
+    for fila_a, fila_b in zip(a, b):
+        for valor_a, valor_b in zip(fila_a, fila_b):
+            if isinstance(valor_a, float) and isinstance(valor_b, float):
+                if not math.isclose(valor_a, valor_b, rel_tol=1e-9):
+                    return False
+            elif valor_a != valor_b or type(valor_a) is not type(valor_b):
+                return False
+    return True
+
+
+def medir(funcion, repeticiones):
+    """(p50 en segundos, último resultado) de `repeticiones` llamadas"""
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return percentil(tiempos, 50), resultado
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Agregaciones: SQLite contra el motor columnar")
+    parser.add_argument('--bd', default='ventas.db', help="base generada con generador_datos.py")
+    parser.add_argument('--repeticiones', type=int, default=10)
+    args = parser.parse_args()
+    if not MotorColumnar.disponible():
+        parser.error("el motor columnar necesita numpy")
+
+    bd = BaseDatos(args.bd)
+    motor = MotorColumnar(bd)
+    inicio = time.perf_counter()
+    filas = motor.preparar()
+    print(f"Copia columnar al día en {time.perf_counter() - inicio:.2f}s "
+          f"({', '.join(f'{cantidad:,} {tabla}' for tabla, cantidad in filas.items())})")
+    inicio = time.perf_counter()
+    motor.instantanea.actualizar(reconstruir=True)
+    print(f"Reconstrucción completa en {time.perf_counter() - inicio:.2f}s")
+
+    versiones = bd.versiones_tablas()
+    print(f"\n{'agregación':<26} {'SQLite p50 ms':>13} {'columnar p50 ms':>15} {'aceleración':>11}  resultado")
+    for nombre, sql in CASOS:
+        sqlite, esperado = medir(lambda: bd.ejecutar_consulta(sql), args.repeticiones)
+        columnar, obtenido = medir(lambda: motor.ejecutar(sql, versiones=versiones), args.repeticiones)
+        if obtenido is None:
+            print(f"{nombre:<26} {sqlite * 1000:>13.2f} {'-':>15} {'-':>11}  fue a SQLite")
+            continue
+        estado = 'igual' if iguales(esperado['datos'], obtenido['datos']) else 'DISTINTO'
+        print(f"{nombre:<26} {sqlite * 1000:>13.2f} {columnar * 1000:>15.2f} {sqlite / columnar:>10.1f}x  {estado}")
@@ -0,0 +1,144 @@
+# benchmark_concurrencia.py
+# Throughput de lectores mientras otro hilo ingiere ventas, con WAL y con el journal clásico (delete).
+# La primera mitad de cada corrida solo lee; en la segunda el escritor inserta ventas en transacciones cortas.
+# Ejemplo: python benchmark_concurrencia.py --tamano 1m --lectores 4 --segundos 20
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import threading
+import time
+from datetime import date
+
+from agente_ia import EJEMPLOS_PROMPT
+from base_datos import BaseDatos
+from generador_datos import TAMANOS, generar
+from metricas import percentil
+
+
+def lector(bd, consultas, fin, medidas, semilla):
+    """Ejecuta consultas al azar hasta `fin`; anota (momento, latencia, ok)"""
+    rng = random.Random(semilla)
+    while time.monotonic() < fin:
+        inicio = time.monotonic()
+        resultado = bd.ejecutar_consulta(rng.choice(consultas))
+        medidas.append((inicio, time.monotonic() - inicio, resultado is not None))
+
+
+def escritor(archivo, wal, desde, fin, ventas_por_transaccion, ventas_por_segundo, cola):
+    """Proceso ingestor: inserta ventas con sus detalles por su conexión de escritura hasta `fin`.
+
+    Va en otro proceso, como carga_masiva, para que el GIL del escritor no frene a los lectores.
+    Con `ventas_por_segundo` mantiene ese ritmo (un flujo de ventas real); con None escribe sin pausa.
+    """
+    bd = BaseDatos(archivo, tamano_pool=1, wal=wal)
+    informe = {'transacciones': 0, 'ventas': 0, 'segundos': 0.0}
+    clientes = bd.ejecutar_consulta("SELECT MAX(id) FROM clientes")['datos'][0][0]
+    empleados = bd.ejecutar_consulta("SELECT MAX(id) FROM empleados")['datos'][0][0]
+    productos = bd.ejecutar_consulta("SELECT id, precio FROM productos")['datos']
+    venta_id = bd.ejecutar_consulta("SELECT MAX(id) FROM ventas")['datos'][0][0] + 1
+    rng = random.Random(7)
+    hoy = date.today().isoformat()
+    while time.monotonic() < desde:
+        time.sleep(0.01)
+    while time.monotonic() < fin:
+        if ventas_por_segundo:
+            # Espera hasta el momento que le toca a la siguiente transacción según el ritmo pedido
+            pausa = desde + informe['ventas'] / ventas_por_segundo - time.monotonic()
+            if pausa > 0:
+                time.sleep(pausa)
+        ventas = []
+        detalles = []
+        for _ in range(ventas_por_transaccion):
+            total = 0.0
+            for producto_id, precio in rng.sample(productos, rng.randint(1, 4)):
+                cantidad = rng.randint(1, 3)
+                total += precio * cantidad
+                detalles.append((venta_id, producto_id, cantidad, precio))
+            ventas.append((venta_id, rng.randint(1, clientes), rng.randint(1, empleados), hoy, round(total, 2), 'completada'))
+            venta_id += 1
+        inicio = time.monotonic()
+        bd.insertar([
+            ('ventas', ['id', 'cliente_id', 'empleado_id', 'fecha', 'total', 'estado'], ventas),
+            ('detalles_venta', ['venta_id', 'producto_id', 'cantidad', 'precio_unitario'], detalles),
+        ])
+        informe['transacciones'] += 1
+        informe['ventas'] += len(ventas)
+        informe['segundos'] += time.monotonic() - inicio
+    bd.cerrar()
+    cola.put(informe)
+
+
+def resumir(medidas):
+    latencias = [latencia for _, latencia, _ in medidas]
+    return {
+        'consultas': len(medidas),
+        'errores': sum(1 for _, _, ok in medidas if not ok),
+        'p50_ms': percentil(latencias, 50) * 1000 if latencias else 0.0,
+        'p99_ms': percentil(latencias, 99) * 1000 if latencias else 0.0,
+        'max_ms': max(latencias) * 1000 if latencias else 0.0,
+    }
+
+
+def medir(archivo, wal, lectores, segundos, ventas_por_transaccion, ventas_por_segundo):
+    """Una corrida: retorna el resumen de lecturas sin escritor, con escritor y el informe de ingesta"""
+    bd = BaseDatos(archivo, tamano_pool=lectores, wal=wal)
+    try:
+        consultas = [sql for _, sql in EJEMPLOS_PROMPT]
+        inicio = time.monotonic()
+        mitad = inicio + segundos / 2
+        fin = inicio + segundos
+        medidas = []
+        contexto = multiprocessing.get_context('fork')
+        cola = contexto.Queue()
+        proceso = contexto.Process(target=escritor, args=(archivo, wal, mitad, fin, ventas_por_transaccion,
+                                                                 ventas_por_segundo, cola))
+        proceso.start()
+        hilos = [threading.Thread(target=lector, args=(bd, consultas, fin, medidas, i)) for i in range(lectores)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        ingesta = cola.get()
+        proceso.join()
+        solo_lectura = resumir([medida for medida in medidas if medida[0] < mitad])
+        con_escritor = resumir([medida for medida in medidas if medida[0] >= mitad])
+        return solo_lectura, con_escritor, ingesta
+    finally:
+        bd.cerrar()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Lecturas por segundo durante una ingesta concurrente")
+    parser.add_argument('--tamano', default='10k', help=f"{', '.join(TAMANOS)} o número de ventas")
+    parser.add_argument('--directorio', default='.', help="dónde crear/reutilizar bench_<tamaño>.db")
+    parser.add_argument('--lectores', type=int, default=4)
+    parser.add_argument('--segundos', type=float, default=20.0)
+    parser.add_argument('--ventas-por-transaccion', type=int, default=50)
+    parser.add_argument('--ventas-por-segundo', type=int, default=1000, help="ritmo de ingesta; 0 = sin pausa")
+    parser.add_argument('--modos', nargs='+', default=['wal', 'delete'], choices=['wal', 'delete'])
+    args = parser.parse_args()
+
+    base = os.path.join(args.directorio, f"bench_{args.tamano.lower()}.db")
+    if not os.path.exists(base):
+        ventas = TAMANOS.get(args.tamano.lower()) or int(args.tamano)
+        print(f"Generando {base} ({ventas:,} ventas)...")
+        generar(base, ventas)
+
+    print(f"{os.cpu_count()} CPU, {args.lectores} lectores, ingesta de {args.ventas_por_segundo or 'máximas'} ventas/s")
+    print(f"{'modo':<7} {'fase':<13} {'consultas/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'máx ms':>8} {'errores':>8}")
+    for modo in args.modos:
+        # Cada modo trabaja sobre una copia para que ambos partan de los mismos datos
+        archivo = os.path.join(args.directorio, f"bench_concurrencia_{modo}.db")
+        for sufijo in ('', '-wal', '-shm'):
+            if os.path.exists(archivo + sufijo):
+                os.remove(archivo + sufijo)
+        shutil.copyfile(base, archivo)
+        solo_lectura, con_escritor, ingesta = medir(archivo, modo == 'wal', args.lectores, args.segundos,
+                                                    args.ventas_por_transaccion, args.ventas_por_segundo)
+        for fase, resumen in (('solo lectura', solo_lectura), ('con ingesta', con_escritor)):
+            print(f"{modo:<7} {fase:<13} {resumen['consultas'] / (args.segundos / 2):>11,.0f} {resumen['p50_ms']:>8.1f} "
+                  f"{resumen['p99_ms']:>8.1f} {resumen['max_ms']:>8.1f} {resumen['errores']:>8}")
+        print(f"{modo:<7} ingesta: {ingesta['ventas'] / (args.segundos / 2):,.0f} ventas/s en "
+              f"{ingesta['transacciones']:,} transacciones ({ingesta['segundos'] / max(ingesta['transacciones'], 1) * 1000:.1f} ms c/u)")
@@ -0,0 +1,116 @@
+# benchmark_escala.py
+# Reproduce las consultas few-shot del prompt sobre datasets sintéticos de distinto tamaño
+# y registra percentiles de latencia, tamaño de la base y memoria.
+# Ejemplo: python benchmark_escala.py --tamanos 10k 1m --directorio /tmp/bench
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+import tracemalloc
+
+from agente_ia import EJEMPLOS_PROMPT
+from base_datos import BaseDatos
+from generador_datos import TAMANOS, generar
+from metricas import percentil
+
+
+def tamano_base(archivo):
+    """Bytes en disco de la base, incluyendo WAL si existe"""
+    return sum(os.path.getsize(ruta) for ruta in (archivo, archivo + '-wal') if os.path.exists(ruta))
+
+
+def medir_consulta(bd, sql, repeticiones):
+    """Latencias de `repeticiones` ejecuciones y el pico de memoria Python de una ejecución extra"""
+    latencias = []
+    filas = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = bd.ejecutar_consulta(sql)
+        latencias.append(time.perf_counter() - inicio)
+        filas = len(resultado['datos']) if resultado else 0
+        del resultado
+
+    tracemalloc.start()
+    bd.ejecutar_consulta(sql)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'filas': filas,
+        'primera_ms': latencias[0] * 1000,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p95_ms': percentil(latencias, 95) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+        'pico_memoria_mb': pico / 2**20,
+    }
+
+
+def medir_dataset(archivo, repeticiones):
+    """Corre todas las consultas de ejemplo sobre un archivo ya generado"""
+    bd = BaseDatos(archivo)
+    try:
+        consultas = {}
+        for pregunta, sql in EJEMPLOS_PROMPT:
+            consultas[pregunta] = medir_consulta(bd, sql, repeticiones)
+        return {
+            'archivo': archivo,
+            'ventas': bd.ejecutar_consulta("SELECT COUNT(*) FROM ventas")['datos'][0][0],
+            'tamano_mb': tamano_base(archivo) / 2**20,
+            'consultas': consultas,
+            # ru_maxrss viene en KB en Linux; se mide en un proceso hijo por dataset para que no se acumule
+            'rss_max_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    finally:
+        bd.cerrar()
+
+
+def _medir_en_hijo(archivo, repeticiones, cola):
+    cola.put(medir_dataset(archivo, repeticiones))
+
+
+def medir_aislado(archivo, repeticiones):
+    """Ejecuta medir_dataset en un proceso nuevo para aislar la memoria de cada tamaño"""
+    contexto = multiprocessing.get_context('fork')
+    cola = contexto.Queue()
+    proceso = contexto.Process(target=_medir_en_hijo, args=(archivo, repeticiones, cola))
+    proceso.start()
+    resultado = cola.get()
+    proceso.join()
+    return resultado
+
+
+def imprimir_informe(resultado):
+    print(f"\n{resultado['archivo']}: {resultado['ventas']:,} ventas, "
+          f"{resultado['tamano_mb']:,.1f} MB en disco, RSS máximo {resultado['rss_max_mb']:,.0f} MB")
+    print(f"{'consulta':<42} {'filas':>10} {'1ra ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mem MB':>8}")
+    for pregunta, medida in resultado['consultas'].items():
+        print(f"{pregunta[:42]:<42} {medida['filas']:>10,} {medida['primera_ms']:>9.1f} {medida['p50_ms']:>9.1f} "
+              f"{medida['p95_ms']:>9.1f} {medida['p99_ms']:>9.1f} {medida['pico_memoria_mb']:>8.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de las consultas few-shot por tamaño de dataset")
+    parser.add_argument('--tamanos', nargs='+', default=['10k', '1m'], help=f"{', '.join(TAMANOS)} o número de ventas")
+    parser.add_argument('--directorio', default='.', help="dónde crear/reutilizar las bases bench_<tamaño>.db")
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--json', help="archivo donde guardar los resultados")
+    args = parser.parse_args()
+
+    resultados = []
+    for tamano in args.tamanos:
+        archivo = os.path.join(args.directorio, f"bench_{tamano.lower()}.db")
+        if not os.path.exists(archivo):
+            ventas = TAMANOS.get(tamano.lower()) or int(tamano)
+            print(f"Generando {archivo} ({ventas:,} ventas)...")
+            informe = generar(archivo, ventas, args.semilla)
+            print(f"Generado en {informe['segundos']:.1f}s")
+        resultado = medir_aislado(archivo, args.repeticiones)
+        resultado['tamano'] = tamano
+        imprimir_informe(resultado)
+        resultados.append(resultado)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo_json:
+            json.dump(resultados, archivo_json, ensure_ascii=False, indent=2)
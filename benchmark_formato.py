@@ -0,0 +1,68 @@
+# benchmark_formato.py
+# Respuesta de /preguntar en HTML contra el formato por columnas: bytes enviados (crudos y con gzip) y CPU del
+# servidor por petición. Las preguntas se siembran en la cache de preguntas y la primera petición llena la de
+# resultados, así que se mide solo lo que cambia entre formatos: armar la respuesta y serializarla.
+# Ejemplo: python benchmark_formato.py --bd bench_1m.db --repeticiones 20
+import argparse
+import gzip
+import os
+import time
+
+from metricas import percentil
+
+# (pregunta, SQL), con resultados de distintos tamaños y tipos de columna
+CASOS = [
+    ("formato: 10 ventas", "SELECT v.id, v.fecha, v.total, v.estado FROM ventas v LIMIT 10"),
+    ("formato: 1000 ventas", "SELECT v.id, v.fecha, v.total, v.estado FROM ventas v LIMIT 1000"),
+    ("formato: 1000 clientes", "SELECT c.nombre, c.email, c.ciudad, c.fecha_registro FROM clientes c LIMIT 1000"),
+    ("formato: 10000 detalles",
+     "SELECT dv.id, dv.venta_id, dv.producto_id, dv.cantidad, dv.precio_unitario FROM detalles_venta dv"),
+]
+
+
+def render_ms(respuesta):
+    """Duración de la etapa 'render' según el Server-Timing de la respuesta"""
+    for parte in respuesta.headers.get('Server-Timing', '').split(','):
+        nombre, _, duracion = parte.strip().partition(';dur=')
+        if nombre == 'render':
+            return float(duracion)
+    return 0.0
+
+
+def medir(cliente, pregunta, formato, repeticiones):
+    """(bytes, bytes con gzip, CPU ms por petición, render ms) de /preguntar en `formato`"""
+    cpu, render = [], []
+    for _ in range(repeticiones):
+        inicio = time.process_time()
+        respuesta = cliente.post('/preguntar', json={'pregunta': pregunta, 'formato': formato})
+        cpu.append(time.process_time() - inicio)
+        render.append(render_ms(respuesta))
+    cuerpo = respuesta.get_data()
+    return len(cuerpo), len(gzip.compress(cuerpo)), percentil(cpu, 50) * 1000, percentil(render, 50)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bytes y CPU por petición: respuesta HTML vs por columnas")
+    parser.add_argument('--bd', default='ventas.db', help="base generada con generador_datos.py")
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ['ARCHIVO_BD'] = args.bd
+    os.environ.setdefault('NIVEL_LOG', 'WARNING')
+    from app_principal import agente, app
+
+    cliente = app.test_client()
+    print(f"{'pregunta':<26} {'formato':<9} {'filas':>6} {'bytes':>10} {'gzip':>9} {'CPU ms':>8} {'render ms':>9}")
+    for pregunta, sql in CASOS:
+        validacion = agente.validador.validar(sql)
+        if not validacion.valido:
+            print(f"{pregunta:<26} rechazada por el validador: {validacion.motivo}")
+            continue
+        agente.cache_preguntas.guardar(pregunta, validacion.sql, agente.esquema_bd)
+        filas = cliente.post('/preguntar', json={'pregunta': pregunta, 'formato': 'columnas'}).get_json().get('filas')
+        medidas = {formato: medir(cliente, pregunta, formato, args.repeticiones) for formato in ('html', 'columnas')}
+        for formato, (crudos, comprimidos, cpu, render) in medidas.items():
+            print(f"{pregunta:<26} {formato:<9} {filas:>6} {crudos:>10,} {comprimidos:>9,} {cpu:>8.2f} {render:>9.2f}")
+        html, columnas = medidas['html'], medidas['columnas']
+        print(f"{'':<26} por columnas: {columnas[0] / html[0]:.0%} de los bytes ({columnas[1] / html[1]:.0%} con gzip), "
+              f"{columnas[2] / html[2]:.0%} de la CPU")
@@ -0,0 +1,81 @@
+# benchmark_paginacion.py
+# Costo de una página según su profundidad: paginación por clave (paginacion.py) contra OFFSET, sobre una
+# base generada con generador_datos. Con OFFSET SQLite recorre y descarta todas las filas anteriores;
+# por clave cada página empieza donde terminó la anterior, así que cuesta lo mismo a cualquier profundidad.
+# Ejemplo: python benchmark_paginacion.py --bd bench_1m.db --tamano 100
+import argparse
+import time
+
+from base_datos import BaseDatos
+from metricas import percentil
+from paginacion import Paginador
+from validador_sql import ValidadorSQL
+
+# (nombre, SQL como lo escribiría el LLM)
+CASOS = [
+    ("detalles_venta completa",
+     "SELECT dv.id, dv.venta_id, dv.producto_id, dv.cantidad, dv.precio_unitario FROM detalles_venta dv"),
+    ("ventas por fecha",
+     "SELECT v.id, v.fecha, v.total FROM ventas v ORDER BY v.fecha DESC"),
+    ("detalles con producto",
+     "SELECT dv.id, p.nombre, dv.cantidad FROM detalles_venta dv JOIN productos p ON dv.producto_id = p.id"),
+]
+
+PROFUNDIDADES = [0, 10_000, 100_000, 900_000, 2_000_000]
+
+
+def posicion_en(paginador, plan, fila):
+    """(emitidas, clave) de la página que empieza en `fila`, leyendo la clave de la fila anterior"""
+    if not fila:
+        return None
+    consulta, _ = paginador._consulta(plan, None)
+    resultado = paginador.bd.ejecutar_consulta(f"SELECT * FROM ({consulta}) LIMIT 1 OFFSET ?", (fila, fila - 1))
+    if not resultado['datos']:
+        return False
+    return fila, list(resultado['datos'][0][-len(plan.claves):])
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return percentil(tiempos, 50)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Paginación por clave contra OFFSET según la profundidad")
+    parser.add_argument('--bd', default='ventas.db', help="base generada con generador_datos.py")
+    parser.add_argument('--tamano', type=int, default=100, help="filas por página")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    bd = BaseDatos(args.bd)
+    validador = ValidadorSQL(bd)
+    paginador = Paginador(bd, limite_filas=validador.limite_filas)
+
+    print(f"{'consulta':<26} {'fila':>10} {'clave ms':>9} {'OFFSET ms':>10} {'aceleración':>11}")
+    for nombre, sql in CASOS:
+        validacion = validador.validar(sql)
+        if not validacion.valido:
+            print(f"{nombre:<26} rechazada por el validador: {validacion.motivo}")
+            continue
+        inicio = time.perf_counter()
+        plan = paginador.planificar(validacion.sql)
+        planificacion = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        paginador.planificar(validacion.sql)
+        cacheado = time.perf_counter() - inicio
+        # OFFSET sobre el mismo SQL y el mismo orden total, para comparar las mismas filas
+        consulta, _ = paginador._consulta(plan, None)
+        con_offset = f"SELECT * FROM ({consulta}) LIMIT ? OFFSET ?"
+        for fila in PROFUNDIDADES:
+            posicion = posicion_en(paginador, plan, fila)
+            if posicion is False:
+                break
+            clave = medir(lambda: paginador.pagina(validacion.sql, (), args.tamano, posicion), args.repeticiones)
+            offset = medir(lambda: bd.ejecutar_consulta(con_offset, (10**9, args.tamano, fila)), args.repeticiones)
+            print(f"{nombre:<26} {fila:>10,} {clave * 1000:>9.2f} {offset * 1000:>10.2f} {offset / clave:>10.1f}x")
+        print(f"{'':<26} plan ({plan.modo}): {planificacion * 1000:.2f} ms la primera vez, "
+              f"{cacheado * 1e6:.0f} µs desde la cache")
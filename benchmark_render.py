@@ -0,0 +1,78 @@
+# benchmark_render.py
+# Microbenchmark de las filas de la tabla HTML: el formato por celda de antes (una cadena de isinstance por
+# valor) contra renderizador.filas_html, que decide el formato por columna y arma las filas con una plantilla.
+# Con numpy instalado mide también filas_html sobre columnas en arreglos NumPy.
+# Ejemplo: python benchmark_render.py --repeticiones 5
+import argparse
+import random
+import time
+
+from metricas import percentil
+from renderizador import filas_html
+
+COLUMNAS = 5
+CELDAS = [10_000, 100_000, 1_000_000]
+
+
+def valor_por_celda(valor):
+    """El formato de celda anterior a renderizador, con su chequeo de 'id' por entero"""
+    if valor is None:
+        return "-"
+    elif isinstance(valor, float):
+        return f"${valor:.2f}"
+    elif isinstance(valor, int):
+        if any(palabra in str(valor).lower() for palabra in ['id', 'codigo']):
+            return str(valor)
+        else:
+            return f"{valor:,}"
+    else:
+        return str(valor)
+
+
+def filas_por_celda(filas):
+    return ''.join("<tr>" + ''.join(f"<td>{valor_por_celda(valor)}</td>" for valor in fila) + "</tr>"
+                   for fila in filas)
+
+
+def generar_filas(cantidad):
+    """Filas como las de productos: id, nombre, precio, stock y un descuento con NULL"""
+    aleatorio = random.Random(cantidad)
+    return [(i, f"Producto {aleatorio.randrange(10_000)}", aleatorio.uniform(1, 5_000), aleatorio.randrange(100_000),
+             aleatorio.uniform(0, 50) if aleatorio.random() < 0.7 else None)
+            for i in range(1, cantidad + 1)]
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return percentil(tiempos, 50)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Filas HTML: formato por celda vs por columna")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    print(f"{'celdas':>10} {'por celda ms':>13} {'por columna ms':>15} {'NumPy ms':>9} {'aceleración':>11}")
+    for celdas in CELDAS:
+        filas = generar_filas(celdas // COLUMNAS)
+        if filas_html(filas) != filas_por_celda(filas):
+            print(f"{celdas:>10,} el HTML difiere entre los dos renderizadores")
+        por_celda = medir(lambda: filas_por_celda(filas), args.repeticiones)
+        por_columna = medir(lambda: filas_html(filas), args.repeticiones)
+        arreglos = None
+        if np is not None:
+            ids, nombres, precios, stock, descuentos = zip(*filas)
+            arreglos = [np.array(ids), np.array(nombres, dtype=object), np.array(precios), np.array(stock),
+                        np.array(descuentos, dtype=object)]
+        con_numpy = medir(lambda: filas_html(columnas=arreglos), args.repeticiones) if arreglos else None
+        print(f"{celdas:>10,} {por_celda * 1000:>13.1f} {por_columna * 1000:>15.1f} "
+              f"{con_numpy * 1000 if con_numpy else float('nan'):>9.1f} {por_celda / por_columna:>10.1f}x")
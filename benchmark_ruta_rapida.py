@@ -0,0 +1,94 @@
+# benchmark_ruta_rapida.py
+# Cobertura y latencia de la ruta rápida: preguntas armadas con nombres reales de la base, en las formas
+# que cubren las plantillas y en formas que no (esas siguen al LLM), sin llamar a ningún LLM.
+# Ejemplo: python benchmark_ruta_rapida.py --bd bench_1m.db --preguntas 500
+import argparse
+import os
+import random
+import time
+
+from metricas import percentil
+from ruta_rapida import ENTIDADES
+
+# (forma, si la ruta rápida debería cubrirla); {tipo} se reemplaza por un valor de ese tipo de entidad
+FORMAS = [
+    ('ventas de {cliente}', True),
+    ('¿Qué ha comprado {cliente}?', True),
+    ('muéstrame las ventas del vendedor {empleado}', True),
+    ('ventas en {ciudad}', True),
+    ('productos de la categoría {categoria}', True),
+    ('clientes de {ciudad}', True),
+    ('ventas de {cliente} este mes', False),
+    ('clientes de {ciudad} que más compran', False),
+    ('total vendido por {empleado} en el último trimestre', False),
+]
+
+
+def variantes(valor, rng):
+    """El valor tal cual o como lo escribiría un usuario: en minúsculas y sin tildes"""
+    if rng.random() < 0.5:
+        return valor
+    return valor.lower().replace('á', 'a').replace('é', 'e').replace('í', 'i').replace('ó', 'o').replace('ú', 'u')
+
+
+def armar_preguntas(bd, cantidad, semilla):
+    """`cantidad` preguntas por forma, con valores al azar de cada entidad"""
+    rng = random.Random(semilla)
+    valores = {tipo: [fila[0] for fila in bd.ejecutar_consulta(
+                   f"SELECT DISTINCT {columna} FROM {tabla} WHERE {columna} IS NOT NULL")['datos']]
+               for tipo, (tabla, columna) in ENTIDADES.items()}
+    preguntas = []
+    for forma, esperada in FORMAS:
+        for _ in range(cantidad):
+            tipo = forma[forma.index('{') + 1:forma.index('}')]
+            preguntas.append((forma, esperada, forma.format(**{tipo: variantes(rng.choice(valores[tipo]), rng)})))
+    rng.shuffle(preguntas)
+    return preguntas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cobertura y latencia de las plantillas de la ruta rápida")
+    parser.add_argument('--bd', default='ventas.db')
+    parser.add_argument('--preguntas', type=int, default=200, help="preguntas por forma")
+    parser.add_argument('--semilla', type=int, default=7)
+    args = parser.parse_args()
+
+    # Solo la ruta rápida y SQLite: ninguna pregunta de esta prueba llega a un LLM
+    os.environ['PROVEEDORES_LLM'] = 'plantillas'
+    from agente_ia import AgenteIA
+    from metricas import MedicionPregunta
+
+    agente = AgenteIA(archivo_bd=args.bd)
+    inicio = time.perf_counter()
+    agente.ruta_rapida.indice.actualizar(forzar=True)
+    carga = time.perf_counter() - inicio
+    tamanos = agente.ruta_rapida.indice.tamanos()
+    print(f"Índice de entidades: {', '.join(f'{cantidad:,} {tipo}' for tipo, cantidad in tamanos.items())} "
+          f"cargado en {carga * 1000:.1f} ms")
+
+    por_forma = {}
+    for forma, esperada, pregunta in armar_preguntas(agente.bd, args.preguntas, args.semilla):
+        medicion = MedicionPregunta()
+        inicio = time.perf_counter()
+        rapida = agente._sql_ruta_rapida(pregunta, medicion)
+        generacion = time.perf_counter() - inicio
+        datos = por_forma.setdefault(forma, {'cubiertas': 0, 'generacion': [], 'ejecucion': []})
+        datos['generacion'].append(generacion)
+        if rapida is not None:
+            datos['cubiertas'] += 1
+            inicio = time.perf_counter()
+            agente.bd.ejecutar_consulta(rapida[0], rapida[1], presupuesto=agente.presupuesto)
+            datos['ejecucion'].append(time.perf_counter() - inicio)
+
+    print(f"{'forma':<52} {'plantilla':>9} {'cubiertas':>9} {'SQL p50 µs':>10} {'SQL p99 µs':>10} {'ejecución p50 ms':>16}")
+    total = cubiertas = 0
+    for forma, esperada in FORMAS:
+        datos = por_forma[forma]
+        cantidad = len(datos['generacion'])
+        total += cantidad
+        cubiertas += datos['cubiertas']
+        ejecucion = f"{percentil(datos['ejecucion'], 50) * 1000:.2f}" if datos['ejecucion'] else '-'
+        print(f"{forma:<52} {'sí' if esperada else 'no':>9} {datos['cubiertas'] / cantidad:>9.0%} "
+              f"{percentil(datos['generacion'], 50) * 1e6:>10.0f} {percentil(datos['generacion'], 99) * 1e6:>10.0f} "
+              f"{ejecucion:>16}")
+    print(f"\nCobertura total: {cubiertas:,} de {total:,} preguntas ({cubiertas / total:.0%}) sin LLM")
@@ -0,0 +1,97 @@
+# benchmark_streaming.py
+# Respuesta completa contra stream cortado en el ';': tiempo hasta el SQL, hasta el SQL validado y tokens
+# generados por pregunta. Con --groq mide contra Groq (GROQ_API_KEY); si no, contra servidor_stub_llm con
+# un modelo que, como suele pasar, agrega una explicación después del SQL aunque el prompt lo prohíba.
+# Ejemplo: python benchmark_streaming.py --latencia-token 0.01 --repeticiones 5
+import argparse
+import time
+
+from comparar_prompt import PREGUNTAS_EXTRA
+from metricas import percentil
+
+EXPLICACION = ("Esta consulta obtiene la información solicitada uniendo las tablas necesarias. "
+               "Si necesitas filtrar por otro periodo o agregar más columnas, puedes ajustar la cláusula WHERE "
+               "o el ORDER BY según lo que quieras analizar.")
+
+
+def responder_con_explicacion(sql_por_pregunta, predeterminado):
+    """responder para el stub: el SQL de la pregunta del prompt, su ';' y después una explicación"""
+    def responder(prompt):
+        pregunta = prompt.rsplit('Entrada: "', 1)[-1].split('"', 1)[0]
+        return f"{sql_por_pregunta.get(pregunta, predeterminado)};\n\n{EXPLICACION}"
+    return responder
+
+
+def medir(agente, proveedor, pregunta, prompt):
+    """(segundos hasta el SQL, segundos hasta el SQL validado, tokens generados, html_error) de una llamada"""
+    from metricas import MedicionPregunta
+    from validador_sql import ValidadorSQL
+
+    # Validador sin cache: la validación (y su EXPLAIN) se paga en cada llamada, como con una pregunta nueva
+    agente.validador = ValidadorSQL(agente.bd)
+    inicio = time.perf_counter()
+    respuesta = proveedor.generar(pregunta, prompt, agente._especulador())
+    hasta_sql = time.perf_counter() - inicio
+    _, error = agente._validar_respuesta_llm(pregunta, respuesta, MedicionPregunta())
+    return hasta_sql, time.perf_counter() - inicio, respuesta.uso.completion_tokens, error
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tiempo hasta el SQL y tokens: respuesta completa vs stream cortado")
+    parser.add_argument('--bd', default='ventas.db')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--groq', action='store_true', help="medir contra Groq en lugar del stub")
+    parser.add_argument('--latencia', type=float, default=0.1, help="segundos hasta el primer token en el stub")
+    parser.add_argument('--latencia-token', type=float, default=0.01, help="segundos entre tokens en el stub")
+    args = parser.parse_args()
+
+    from agente_ia import EJEMPLOS_PROMPT, AgenteIA
+    from proveedores_llm import ProveedorGroq, ProveedorStub
+    from servidor_stub_llm import SQL_POR_DEFECTO, ServidorStubLLM
+
+    preguntas = [entrada for entrada, _ in EJEMPLOS_PROMPT] + PREGUNTAS_EXTRA
+    servidor = None
+    if args.groq:
+        completo, stream = ProveedorGroq(stream=False), ProveedorGroq(stream=True)
+    else:
+        servidor = ServidorStubLLM(latencia=args.latencia, latencia_token=args.latencia_token,
+                                   responder=responder_con_explicacion(dict(EJEMPLOS_PROMPT), SQL_POR_DEFECTO))
+        url = servidor.iniciar()
+        completo, stream = ProveedorStub(url=url, stream=False), ProveedorStub(url=url, stream=True)
+    agente = AgenteIA(archivo_bd=args.bd, proveedores=[stream])
+
+    print(f"{'pregunta':<40} {'completa ms':>11} {'SQL ms':>8} {'validado ms':>11} {'tokens':>6} "
+          f"{'en stream':>9} {'ahorrados':>9}")
+    totales = {'completa': 0.0, 'sql': 0.0, 'validado': 0.0, 'tokens': 0, 'stream': 0}
+    try:
+        for pregunta in preguntas:
+            prompt = agente._generar_prompt(pregunta)
+            medidas = {'completa': [], 'sql': [], 'validado': [], 'tokens': [], 'stream': []}
+            for _ in range(args.repeticiones):
+                _, validado, tokens, error = medir(agente, completo, pregunta, prompt)
+                medidas['completa'].append(validado)
+                medidas['tokens'].append(tokens)
+                hasta_sql, validado, tokens, error_stream = medir(agente, stream, pregunta, prompt)
+                medidas['sql'].append(hasta_sql)
+                medidas['validado'].append(validado)
+                medidas['stream'].append(tokens)
+                if (error is None) != (error_stream is None):
+                    print(f"  la validación difiere en {pregunta!r}: {error or error_stream}")
+            fila = {clave: percentil(valores, 50) for clave, valores in medidas.items()}
+            for clave in totales:
+                totales[clave] += fila[clave]
+            print(f"{pregunta[:40]:<40} {fila['completa'] * 1000:>11.0f} {fila['sql'] * 1000:>8.0f} "
+                  f"{fila['validado'] * 1000:>11.0f} {fila['tokens']:>6.0f} {fila['stream']:>9.0f} "
+                  f"{1 - fila['stream'] / fila['tokens'] if fila['tokens'] else 0:>9.0%}")
+    finally:
+        stream.cerrar()
+        completo.cerrar()
+        if servidor is not None:
+            servidor.detener()
+
+    cantidad = len(preguntas)
+    print(f"\nPromedio por pregunta: SQL validado en {totales['validado'] / cantidad * 1000:.0f} ms con stream "
+          f"contra {totales['completa'] / cantidad * 1000:.0f} ms esperando la respuesta completa "
+          f"(SQL disponible a los {totales['sql'] / cantidad * 1000:.0f} ms); "
+          f"{totales['tokens'] - totales['stream']:.0f} de {totales['tokens']:.0f} tokens generados ahorrados "
+          f"({1 - totales['stream'] / totales['tokens']:.0%})")
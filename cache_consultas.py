@@ -0,0 +1,291 @@
+# cache_consultas.py
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+from validador_sql import ErrorTokenizador, analizar_from, tokenizar
+
+
+def normalizar_pregunta(pregunta):
+    """Normaliza mayúsculas, tildes, signos y espacios de una pregunta"""
+    texto = unicodedata.normalize('NFKD', pregunta.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[¿?¡!.,;:\"']", ' ', texto)
+    return ' '.join(texto.split())
+
+
+def ngramas(texto, n=3):
+    """Retorna el conjunto de n-gramas de caracteres del texto"""
+    texto = f" {texto} "
+    if len(texto) <= n:
+        return {texto}
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+
+# Palabras que invierten el sentido de una pregunta sin cambiar casi sus n-gramas
+NEGACIONES = frozenset({'no', 'sin', 'excepto', 'nunca'})
+
+
+def firma_pregunta(clave):
+    """Números y negaciones de una pregunta normalizada: dos preguntas similares solo comparten SQL si coinciden"""
+    palabras = clave.split()
+    return (tuple(re.findall(r'\d+', clave)), tuple(palabra for palabra in palabras if palabra in NEGACIONES))
+
+
+class CachePreguntas:
+    """Cache de dos niveles pregunta → SQL validado (exacto + similitud por n-gramas)"""
+
+    def __init__(self, max_entradas=1000, ttl=3600, similitud=True, umbral_similitud=0.9):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.similitud = similitud
+        self.umbral_similitud = umbral_similitud
+        self._entradas = OrderedDict()  # clave normalizada -> (sql, creado, ngramas, firma)
+        self._indice_ngramas = {}  # n-grama -> claves que lo contienen
+        self._huella_esquema = None
+        self._bloqueo = threading.Lock()
+        self._estadisticas = {
+            'aciertos_exactos': 0,
+            'aciertos_similares': 0,
+            'fallos': 0,
+            'expiradas': 0,
+            'desalojadas': 0,
+            'invalidaciones': 0,
+        }
+
+    def _verificar_esquema(self, esquema):
+        """Vacía la cache si el esquema cambió desde la última consulta"""
+        huella = hashlib.sha1(esquema.encode('utf-8')).hexdigest()
+        if huella != self._huella_esquema:
+            if self._huella_esquema is not None:
+                self._estadisticas['invalidaciones'] += 1
+            self._vaciar()
+            self._huella_esquema = huella
+
+    def _vaciar(self):
+        self._entradas.clear()
+        self._indice_ngramas.clear()
+
+    def _eliminar(self, clave):
+        _, _, ngramas, _ = self._entradas.pop(clave)
+        for ngrama in ngramas:
+            claves = self._indice_ngramas.get(ngrama)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._indice_ngramas[ngrama]
+
+    def _vigente(self, clave, ahora):
+        """Indica si la entrada sigue viva; si expiró la elimina"""
+        _, creado, _, _ = self._entradas[clave]
+        if self.ttl is not None and ahora - creado > self.ttl:
+            self._eliminar(clave)
+            self._estadisticas['expiradas'] += 1
+            return False
+        return True
+
+    def _buscar_similar(self, ngramas, firma, ahora):
+        """Busca la entrada con mayor coeficiente de Dice sobre los n-gramas, entre las de la misma firma.
+
+        "stock menor a 10" y "menor a 15", o "compraron" y "no compraron", casi no difieren en n-gramas
+        pero piden otra cosa: los números y las negaciones tienen que ser los mismos.
+        """
+        comunes = Counter()
+        for ngrama in ngramas:
+            comunes.update(self._indice_ngramas.get(ngrama, ()))
+
+        mejor_clave, mejor_puntaje = None, 0.0
+        for clave, cantidad in comunes.items():
+            _, _, ngramas_clave, firma_clave = self._entradas[clave]
+            if firma_clave != firma:
+                continue
+            puntaje = 2 * cantidad / (len(ngramas) + len(ngramas_clave))
+            if puntaje > mejor_puntaje:
+                mejor_clave, mejor_puntaje = clave, puntaje
+
+        if mejor_clave is None or mejor_puntaje < self.umbral_similitud:
+            return None
+        if not self._vigente(mejor_clave, ahora):
+            return None
+        return mejor_clave
+
+    def obtener(self, pregunta, esquema):
+        """Retorna el SQL cacheado para la pregunta, o None si no hay acierto"""
+        clave = normalizar_pregunta(pregunta)
+        ahora = time.monotonic()
+        with self._bloqueo:
+            self._verificar_esquema(esquema)
+
+            if clave in self._entradas and self._vigente(clave, ahora):
+                self._entradas.move_to_end(clave)
+                self._estadisticas['aciertos_exactos'] += 1
+                return self._entradas[clave][0]
+
+            if self.similitud and self._entradas:
+                similar = self._buscar_similar(ngramas(clave), firma_pregunta(clave), ahora)
+                if similar is not None:
+                    self._entradas.move_to_end(similar)
+                    self._estadisticas['aciertos_similares'] += 1
+                    return self._entradas[similar][0]
+
+            self._estadisticas['fallos'] += 1
+            return None
+
+    def guardar(self, pregunta, sql, esquema):
+        """Guarda el SQL ya validado para la pregunta"""
+        clave = normalizar_pregunta(pregunta)
+        ngramas_clave = ngramas(clave)
+        with self._bloqueo:
+            self._verificar_esquema(esquema)
+            if clave in self._entradas:
+                self._eliminar(clave)
+            self._entradas[clave] = (sql, time.monotonic(), ngramas_clave, firma_pregunta(clave))
+            for ngrama in ngramas_clave:
+                self._indice_ngramas.setdefault(ngrama, set()).add(clave)
+
+            while len(self._entradas) > self.max_entradas:
+                self._eliminar(next(iter(self._entradas)))
+                self._estadisticas['desalojadas'] += 1
+
+    def invalidar(self):
+        """Vacía la cache manualmente"""
+        with self._bloqueo:
+            self._vaciar()
+            self._estadisticas['invalidaciones'] += 1
+
+    def estadisticas(self):
+        """Retorna contadores de aciertos y fallos de la cache"""
+        with self._bloqueo:
+            aciertos = self._estadisticas['aciertos_exactos'] + self._estadisticas['aciertos_similares']
+            total = aciertos + self._estadisticas['fallos']
+            return {
+                'entradas': len(self._entradas),
+                **self._estadisticas,
+                'tasa_aciertos': aciertos / total if total else 0.0,
+            }
+
+
+# Funciones cuyo resultado depende del momento de ejecución
+_SQL_NO_DETERMINISTA = re.compile(r"'now'|random\s*\(|current_(date|time|timestamp)", re.IGNORECASE)
+
+
+def canonizar_sql(sql):
+    """Normaliza espacios y el ';' final del SQL sin tocar los literales"""
+    partes = re.split(r"('(?:[^']|'')*')", sql.strip().rstrip(';').strip())
+    for i in range(0, len(partes), 2):
+        partes[i] = re.sub(r'\s+', ' ', partes[i])
+    return ''.join(partes).strip()
+
+
+def tablas_de_consulta(sql, tablas_conocidas, equivalentes=None):
+    """Retorna las tablas conocidas que la consulta lee: todas las de cada FROM, unidas con JOIN o con coma.
+
+    `equivalentes` traduce tablas derivadas a la tabla de la que dependen (fts_clientes -> clientes).
+    """
+    conocidas = set(tablas_conocidas)
+    try:
+        alias, _, _ = analizar_from(tokenizar(sql))
+    except ErrorTokenizador:
+        return frozenset(conocidas)
+    equivalentes = equivalentes or {}
+    leidas = {equivalentes.get(tabla, tabla) for tabla in alias.values()}
+    if not leidas or not leidas <= conocidas:
+        # Si no sabemos qué lee, dependemos de todas las tablas
+        return frozenset(conocidas)
+    return frozenset(leidas)
+
+
+def _tamano_resultado(resultado):
+    """Estimación en bytes de un resultado de ejecutar_consulta"""
+    tamano = sum(len(columna) for columna in resultado['columnas'])
+    for fila in resultado['datos']:
+        tamano += 56 + 8 * len(fila)
+        for valor in fila:
+            tamano += len(valor) if isinstance(valor, (str, bytes)) else 24
+    return tamano
+
+
+class CacheResultados:
+    """Cache de resultados SQL invalidada por versión de las tablas leídas"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entradas = OrderedDict()  # (sql canónico, parámetros) -> (resultado, versiones, creado, tamano)
+        self._bytes = 0
+        self._bloqueo = threading.Lock()
+        self._estadisticas = {
+            'aciertos': 0,
+            'fallos': 0,
+            'invalidadas': 0,
+            'desalojadas': 0,
+            'no_cacheables': 0,
+        }
+
+    def es_cacheable(self, sql):
+        """Las consultas con 'now', random() o CURRENT_* no se cachean"""
+        return not _SQL_NO_DETERMINISTA.search(sql)
+
+    def _eliminar(self, clave):
+        _, _, _, tamano = self._entradas.pop(clave)
+        self._bytes -= tamano
+
+    def obtener(self, sql, versiones_actuales, parametros=()):
+        """Retorna el resultado cacheado si ninguna de sus tablas cambió"""
+        clave = (canonizar_sql(sql), tuple(parametros))
+        with self._bloqueo:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self._estadisticas['fallos'] += 1
+                return None
+            resultado, versiones, creado, _ = entrada
+            vencida = self.ttl is not None and time.monotonic() - creado > self.ttl
+            if vencida or any(versiones_actuales.get(tabla) != version for tabla, version in versiones.items()):
+                self._eliminar(clave)
+                self._estadisticas['invalidadas'] += 1
+                self._estadisticas['fallos'] += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self._estadisticas['aciertos'] += 1
+            return resultado
+
+    def guardar(self, sql, tablas, versiones_actuales, resultado, parametros=()):
+        """Guarda el resultado junto con la versión de cada tabla leída"""
+        if not self.es_cacheable(sql):
+            with self._bloqueo:
+                self._estadisticas['no_cacheables'] += 1
+            return
+        tamano = _tamano_resultado(resultado)
+        if tamano > self.max_bytes:
+            return
+        clave = (canonizar_sql(sql), tuple(parametros))
+        versiones = {tabla: versiones_actuales.get(tabla) for tabla in tablas}
+        with self._bloqueo:
+            if clave in self._entradas:
+                self._eliminar(clave)
+            self._entradas[clave] = (resultado, versiones, time.monotonic(), tamano)
+            self._bytes += tamano
+            while self._bytes > self.max_bytes:
+                self._eliminar(next(iter(self._entradas)))
+                self._estadisticas['desalojadas'] += 1
+
+    def invalidar(self):
+        """Vacía la cache manualmente"""
+        with self._bloqueo:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estadisticas(self):
+        """Retorna aciertos, fallos, memoria usada y tasa de aciertos"""
+        with self._bloqueo:
+            total = self._estadisticas['aciertos'] + self._estadisticas['fallos']
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                **self._estadisticas,
+                'tasa_aciertos': self._estadisticas['aciertos'] / total if total else 0.0,
+            }
@@ -0,0 +1,70 @@
+# carga_masiva.py
+# CLI de carga masiva de CSV/JSONL sobre BaseDatos.cargar_masivo.
+# Ejemplo: python carga_masiva.py ventas_historicas.csv --tabla ventas
+import argparse
+import csv
+import json
+
+from base_datos import BaseDatos, TABLAS
+
+
+def leer_csv(ruta):
+    """Retorna (columnas, filas) de un CSV con encabezado; las celdas vacías se cargan como NULL"""
+    archivo = open(ruta, newline='', encoding='utf-8')
+    lector = csv.reader(archivo)
+    columnas = next(lector)
+
+    def filas():
+        with archivo:
+            for fila in lector:
+                yield tuple(valor if valor != '' else None for valor in fila)
+
+    return columnas, filas()
+
+
+def leer_jsonl(ruta, columnas=None):
+    """Retorna (columnas, filas) de un JSONL; las columnas salen del primer objeto si no se indican"""
+    archivo = open(ruta, encoding='utf-8')
+    lineas = (linea for linea in archivo if linea.strip())
+    primera = next(lineas, None)
+    if primera is None:
+        archivo.close()
+        return columnas or [], iter(())
+    primer_objeto = json.loads(primera)
+    columnas = columnas or list(primer_objeto)
+
+    def filas():
+        with archivo:
+            yield tuple(primer_objeto.get(c) for c in columnas)
+            for linea in lineas:
+                objeto = json.loads(linea)
+                yield tuple(objeto.get(c) for c in columnas)
+
+    return columnas, filas()
+
+
+def cargar_archivo(bd, ruta, tabla, tamano_lote=100000):
+    """Carga un .csv o .jsonl en la tabla y retorna el informe de cargar_masivo"""
+    if ruta.endswith('.jsonl') or ruta.endswith('.ndjson'):
+        columnas, filas = leer_jsonl(ruta)
+    else:
+        columnas, filas = leer_csv(ruta)
+    return bd.cargar_masivo(tabla, columnas, filas, tamano_lote=tamano_lote)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Carga masiva de CSV/JSONL en la base de ventas")
+    parser.add_argument('archivos', nargs='+', help="archivos .csv (con encabezado) o .jsonl")
+    parser.add_argument('--tabla', required=True, choices=TABLAS)
+    parser.add_argument('--bd', default="ventas.db")
+    parser.add_argument('--lote', type=int, default=100000, help="filas por transacción")
+    args = parser.parse_args()
+
+    bd = BaseDatos(args.bd)
+    for ruta in args.archivos:
+        informe = cargar_archivo(bd, ruta, args.tabla, args.lote)
+        print(f"{ruta}: {informe['filas']:,} filas en {args.tabla} "
+              f"({informe['rechazadas']:,} rechazadas por FOREIGN KEY), "
+              f"{informe['filas_por_segundo']:,.0f} filas/s de carga, "
+              f"{informe['filas_por_segundo_total']:,.0f} filas/s incluyendo índices y resúmenes")
+    bd.cerrar()
@@ -0,0 +1,96 @@
+# comparar_prompt.py
+# Compara el prompt completo contra el podado por pregunta: tokens de entrada y time-to-first-token.
+# Con GROQ_API_KEY mide contra Groq; con --stub usa servidor_stub_llm, cuyo prefill se modela
+# con --prefill (segundos por token de prompt), así que ahí el TTFT refleja ese modelo.
+import argparse
+import os
+import time
+
+from metricas import percentil
+
+PREGUNTAS_EXTRA = [
+    'cuál es el proveedor de cada producto',
+    'clientes de Medellín que compraron ropa',
+    'ventas de Pedro Pérez',
+    'top 5 clientes por total comprado',
+    'empleados contratados este año',
+]
+
+
+def tiempo_primer_token(cliente, parametros):
+    """Segundos hasta el primer fragmento con contenido de una respuesta con stream=True"""
+    inicio = time.perf_counter()
+    primero = None
+    for chunk in cliente.chat.completions.create(stream=True, **parametros):
+        if primero is None and chunk.choices and chunk.choices[0].delta.content:
+            primero = time.perf_counter() - inicio
+    return primero
+
+
+def comparar(agente, preguntas, repeticiones, medir_llm):
+    """Retorna una fila por pregunta con tokens y TTFT (p50) de ambos prompts"""
+    from esquema_prompt import estimar_tokens
+
+    # TTFT del modelo de Groq aunque PROVEEDORES_LLM no lo incluya
+    if medir_llm:
+        from proveedores_llm import ProveedorGroq
+        groq = agente.router.proveedor('groq') or ProveedorGroq()
+
+    filas = []
+    for pregunta in preguntas:
+        fila = {'pregunta': pregunta}
+        for modo, podar in (('completo', False), ('podado', True)):
+            prompt = agente._generar_prompt(pregunta, podar=podar)
+            fila[f'tokens_{modo}'] = estimar_tokens(prompt)
+            if medir_llm:
+                parametros = groq.parametros(prompt)
+                tiempos = [tiempo_primer_token(groq.cliente, parametros) for _ in range(repeticiones)]
+                fila[f'ttft_{modo}_ms'] = percentil([t for t in tiempos if t is not None], 50) * 1000
+        filas.append(fila)
+    return filas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tokens y TTFT del prompt completo vs podado")
+    parser.add_argument('--bd', default="ventas.db")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--stub', action='store_true', help="medir TTFT contra servidor_stub_llm")
+    parser.add_argument('--prefill', type=float, default=0.0002, help="segundos por token de prompt en el stub")
+    parser.add_argument('--sin-llm', action='store_true', help="solo contar tokens")
+    args = parser.parse_args()
+
+    servidor = None
+    if args.stub:
+        from servidor_stub_llm import ServidorStubLLM
+        servidor = ServidorStubLLM(latencia=0.05, latencia_token_prompt=args.prefill)
+        os.environ['GROQ_BASE_URL'] = servidor.iniciar()
+        os.environ.setdefault('GROQ_API_KEY', 'stub')
+
+    from agente_ia import AgenteIA, EJEMPLOS_PROMPT
+
+    agente = AgenteIA(archivo_bd=args.bd)
+    medir_llm = not args.sin_llm and bool(os.getenv('GROQ_API_KEY'))
+    preguntas = [entrada for entrada, _ in EJEMPLOS_PROMPT] + PREGUNTAS_EXTRA
+    try:
+        filas = comparar(agente, preguntas, args.repeticiones, medir_llm)
+    finally:
+        if servidor is not None:
+            servidor.detener()
+
+    encabezado = f"{'pregunta':<42} {'tokens completo':>15} {'tokens podado':>13}"
+    if medir_llm:
+        encabezado += f" {'TTFT completo ms':>16} {'TTFT podado ms':>14}"
+    print(encabezado)
+    for fila in filas:
+        linea = f"{fila['pregunta'][:42]:<42} {fila['tokens_completo']:>15,} {fila['tokens_podado']:>13,}"
+        if medir_llm:
+            linea += f" {fila['ttft_completo_ms']:>16.1f} {fila['ttft_podado_ms']:>14.1f}"
+        print(linea)
+
+    completo = sum(fila['tokens_completo'] for fila in filas) / len(filas)
+    podado = sum(fila['tokens_podado'] for fila in filas) / len(filas)
+    print(f"\nPromedio: {completo:,.0f} -> {podado:,.0f} tokens de prompt ({1 - podado / completo:.0%} menos)")
+    if medir_llm:
+        ttft_completo = percentil([fila['ttft_completo_ms'] for fila in filas], 50)
+        ttft_podado = percentil([fila['ttft_podado_ms'] for fila in filas], 50)
+        print(f"TTFT p50: {ttft_completo:.1f} ms -> {ttft_podado:.1f} ms")
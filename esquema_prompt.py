@@ -0,0 +1,209 @@
+# esquema_prompt.py
+# Esquema compacto para el prompt a partir de BaseDatos.introspeccionar_esquema,
+# y poda por pregunta: solo las tablas relevantes, sus caminos de JOIN y los ejemplos más parecidos.
+from collections import Counter, deque
+
+from cache_consultas import ngramas, normalizar_pregunta, tablas_de_consulta
+
+# Aclaraciones que la introspección no puede deducir
+NOTAS_COLUMNAS = {
+    ('resumen_ventas_producto_dia', 'cantidad'): 'unidades vendidas ese día',
+    ('resumen_ventas_producto_dia', 'ingresos'): 'suma de cantidad * precio_unitario',
+    ('resumen_ventas_categoria_dia', 'categoria_id'): '0 = sin categoría',
+    ('resumen_ventas_cliente_dia', 'ventas'): 'número de ventas',
+    ('resumen_ventas_cliente_dia', 'total'): 'suma de ventas.total',
+    ('resumen_ventas_empleado_dia', 'empleado_id'): '0 = sin empleado',
+}
+
+PREFIJO_RESUMEN = 'resumen_'
+
+# Índices FTS5 de base_datos: fts_<tabla>, con rowid = <tabla>.id
+PREFIJO_BUSQUEDA = 'fts_'
+
+# Raíces (sin tildes) que señalan cada tabla además de su nombre y sus columnas
+SINONIMOS = {
+    'categorias': ['categor', 'tipo de producto'],
+    'proveedores': ['proveedor', 'suministr', 'contacto'],
+    'productos': ['producto', 'articulo', 'stock', 'inventario', 'precio', 'vendido', 'compr'],
+    'clientes': ['cliente', 'comprador', 'ciudad', 'correo', 'compr'],
+    'empleados': ['empleado', 'vendedor', 'cajero', 'gerente', 'rol', 'personal', 'contrat'],
+    'ventas': ['venta', 'vend', 'compr', 'factur', 'pedido', 'mes', 'fecha', 'hoy', 'semana'],
+    'detalles_venta': ['detalle', 'compr', 'linea', 'unidades', 'cantidad'],
+}
+
+# Tablas con nombres de personas: un nombre propio en la pregunta las hace relevantes si no se nombró ninguna
+TABLAS_PERSONAS = ['clientes', 'empleados']
+
+# Similitud a partir de la cual un ejemplo aporta sus tablas aunque la pregunta no las nombre
+UMBRAL_TABLAS_EJEMPLO = 0.5
+
+# Palabras que indican un agregado: se agregan las tablas resumen de las dimensiones pedidas
+AGREGADOS = ['total', 'suma', 'cuanto', 'ranking', 'top', 'mas vendid', 'mejor', 'por dia', 'por mes',
+             'por categoria', 'por cliente', 'por empleado', 'por producto', 'promedio', 'ingreso']
+
+
+def estimar_tokens(texto):
+    """Aproximación de tokens (~4 caracteres por token), la misma que usa servidor_stub_llm"""
+    return len(texto) // 4
+
+
+def relaciones(esquema):
+    """FK declaradas más las implícitas por nombre (producto_id -> productos.id) de las tablas resumen"""
+    resultado = {}
+    for tabla, info in esquema.items():
+        fks = dict(info['fks'])
+        for columna, _, _ in info['columnas']:
+            if columna in fks or not columna.endswith('_id'):
+                continue
+            base = columna[:-3]
+            for candidata in (base + 's', base + 'es'):
+                if candidata in esquema:
+                    fks[columna] = (candidata, 'id')
+                    break
+        resultado[tabla] = fks
+    return resultado
+
+
+def formatear_esquema(esquema, tablas=None):
+    """Una línea por tabla: 'tabla: col TIPO, fk_id→otra.id, ...' (mucho más corto que una lista por columna)"""
+    fks = relaciones(esquema)
+    lineas = ["ESQUEMA (tabla: columnas; col→tabla.col es FOREIGN KEY):"]
+    for tabla, info in esquema.items():
+        if tablas is not None and tabla not in tablas:
+            continue
+        columnas = []
+        for columna, tipo, es_pk in info['columnas']:
+            if es_pk:
+                texto = f"{columna} PK"
+            elif columna in fks[tabla]:
+                destino, destino_columna = fks[tabla][columna]
+                texto = f"{columna}→{destino}.{destino_columna}"
+            else:
+                # Las columnas de las tablas FTS5 no tienen tipo
+                texto = f"{columna} {tipo}" if tipo else columna
+            nota = NOTAS_COLUMNAS.get((tabla, columna))
+            columnas.append(f"{texto} ({nota})" if nota else texto)
+        marca = " [resumen diario precalculado]" if tabla.startswith(PREFIJO_RESUMEN) else ""
+        if tabla.startswith(PREFIJO_BUSQUEDA):
+            marca = f" [búsqueda de texto FTS5, rowid = {tabla[len(PREFIJO_BUSQUEDA):]}.id]"
+        lineas.append(f"{tabla}{marca}: {', '.join(columnas)}")
+    return '\n'.join(lineas)
+
+
+def _contiene(texto, palabras, raiz):
+    """True si alguna palabra empieza por la raíz (o la raíz de varias palabras aparece en el texto)"""
+    if ' ' in raiz:
+        return raiz in texto
+    return any(palabra.startswith(raiz) for palabra in palabras)
+
+
+def _tiene_nombre_propio(pregunta):
+    """True si alguna palabra después de la primera empieza con mayúscula ("ventas de María González")"""
+    return any(palabra[:1].isupper() for palabra in pregunta.split()[1:])
+
+
+class PodadorPrompt:
+    """Elige las tablas, caminos de JOIN y ejemplos few-shot relevantes para una pregunta"""
+
+    def __init__(self, ejemplos, max_ejemplos=3):
+        self.ejemplos = [(entrada, sql, ngramas(normalizar_pregunta(entrada))) for entrada, sql in ejemplos]
+        self.max_ejemplos = max_ejemplos
+        self._raices_cache = (None, None)  # (esquema, raíces); el esquema introspectado es el mismo objeto mientras no cambie
+
+    def podar(self, pregunta, esquema):
+        """Retorna (tablas, ejemplos); tablas es None si la pregunta no permite podar el esquema"""
+        similitudes = self._similitudes(pregunta)
+        tablas = self.tablas_relevantes(pregunta, esquema, similitudes)
+        return tablas, self.ejemplos_relevantes(similitudes, tablas, esquema)
+
+    def _similitudes(self, pregunta):
+        """Coeficiente de Dice de trigramas entre la pregunta y cada ejemplo"""
+        ngramas_pregunta = ngramas(normalizar_pregunta(pregunta))
+        return [2 * len(ngramas_pregunta & ngramas_ejemplo) / (len(ngramas_pregunta) + len(ngramas_ejemplo))
+                for _, _, ngramas_ejemplo in self.ejemplos]
+
+    def _raices(self, esquema):
+        """Raíces de cada tabla: su nombre en singular, sus columnas propias y sus sinónimos"""
+        if self._raices_cache[0] is esquema:
+            return self._raices_cache[1]
+        base = {tabla: info for tabla, info in esquema.items()
+                if not tabla.startswith((PREFIJO_RESUMEN, PREFIJO_BUSQUEDA))}
+        # Columnas como nombre o email están en varias tablas y no ayudan a elegir
+        repetidas = Counter(columna for info in base.values() for columna, _, _ in info['columnas'])
+        raices = {}
+        for tabla, info in base.items():
+            propias = {tabla.rstrip('s'), tabla.split('_')[0].rstrip('s')}
+            propias.update(columna for columna, _, _ in info['columnas']
+                           if repetidas[columna] == 1 and not columna.endswith('_id'))
+            propias.update(SINONIMOS.get(tabla, []))
+            raices[tabla] = {raiz for raiz in propias if len(raiz) >= 3}
+        self._raices_cache = (esquema, raices)
+        return raices
+
+    def _camino(self, grafo, desde, hasta):
+        """Camino más corto entre dos tablas por las FK (BFS)"""
+        previos = {desde: None}
+        cola = deque([desde])
+        while cola:
+            actual = cola.popleft()
+            if actual in hasta:
+                camino = []
+                while actual is not None:
+                    camino.append(actual)
+                    actual = previos[actual]
+                return camino
+            for vecina in grafo.get(actual, ()):
+                if vecina not in previos:
+                    previos[vecina] = actual
+                    cola.append(vecina)
+        return []
+
+    def tablas_relevantes(self, pregunta, esquema, similitudes):
+        """Tablas mencionadas, conectadas por sus caminos de JOIN; None si no se reconoce ninguna"""
+        texto = normalizar_pregunta(pregunta)
+        palabras = texto.split()
+        raices = self._raices(esquema)
+        elegidas = [tabla for tabla, propias in raices.items()
+                    if any(_contiene(texto, palabras, raiz) for raiz in propias)]
+        if not elegidas:
+            return None
+        if _tiene_nombre_propio(pregunta) and not set(TABLAS_PERSONAS) & set(elegidas):
+            elegidas += [tabla for tabla in TABLAS_PERSONAS if tabla in esquema]
+        for (_, sql, _), similitud in zip(self.ejemplos, similitudes):
+            if similitud >= UMBRAL_TABLAS_EJEMPLO:
+                elegidas += [tabla for tabla in sorted(tablas_de_consulta(sql, esquema)) if tabla not in elegidas]
+
+        # Grafo no dirigido de las tablas base; los resúmenes se cuelgan después de su dimensión
+        fks = relaciones(esquema)
+        grafo = {}
+        for tabla, columnas in fks.items():
+            if tabla.startswith(PREFIJO_RESUMEN):
+                continue
+            for destino, _ in columnas.values():
+                grafo.setdefault(tabla, set()).add(destino)
+                grafo.setdefault(destino, set()).add(tabla)
+
+        conectadas = {elegidas[0]}
+        for tabla in elegidas[1:]:
+            conectadas.update(self._camino(grafo, tabla, conectadas))
+
+        if any(_contiene(texto, palabras, raiz) for raiz in AGREGADOS):
+            for tabla, columnas in fks.items():
+                if tabla.startswith(PREFIJO_RESUMEN):
+                    dimensiones = {destino for destino, _ in columnas.values()}
+                    if dimensiones & conectadas:
+                        conectadas.add(tabla)
+                        conectadas.update(dimensiones)
+        # Para buscar por nombre van los índices de texto de las tablas elegidas
+        conectadas.update(PREFIJO_BUSQUEDA + tabla for tabla in list(conectadas) if PREFIJO_BUSQUEDA + tabla in esquema)
+        return conectadas
+
+    def ejemplos_relevantes(self, similitudes, tablas, esquema):
+        """Los ejemplos más parecidos a la pregunta, desempatando por tablas en común"""
+        puntajes = []
+        for indice, ((_, sql, _), similitud) in enumerate(zip(self.ejemplos, similitudes)):
+            comunes = len(tablas_de_consulta(sql, esquema) & tablas) if tablas else 0
+            puntajes.append((similitud, comunes, -indice))
+        mejores = sorted(range(len(self.ejemplos)), key=lambda i: puntajes[i], reverse=True)[:self.max_ejemplos]
+        # Se respeta el orden original de los ejemplos
+        return [self.ejemplos[i][:2] for i in sorted(mejores)]
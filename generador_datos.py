@@ -0,0 +1,253 @@
+# generador_datos.py
+# Generador reproducible de datos sintéticos para medir el agente a escala.
+# Popularidad de productos Zipf, estacionalidad en ventas.fecha y sesgo de ciudades en clientes.
+# Ejemplo: python generador_datos.py ventas_1m.db --tamano 1m
+import argparse
+import itertools
+import random
+import time
+from datetime import date, timedelta
+from math import gcd
+
+from base_datos import BaseDatos
+
+# Tamaños de referencia, en número de ventas (cada venta trae ~2.2 líneas de detalle)
+TAMANOS = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '50m': 50_000_000,
+}
+
+CATEGORIAS = ['Electrónicos', 'Ropa', 'Hogar', 'Deportes', 'Juguetes', 'Libros',
+              'Belleza', 'Alimentos', 'Mascotas', 'Oficina', 'Jardín', 'Automotriz']
+
+# Artículos y rango de precio (mínimo, máximo) por categoría
+ARTICULOS = {
+    'Electrónicos': (['Celular', 'Portátil', 'Tablet', 'Audífonos', 'Monitor', 'Televisor'], (40, 2500)),
+    'Ropa': (['Camisa', 'Jeans', 'Chaqueta', 'Vestido', 'Tenis', 'Buzo'], (15, 250)),
+    'Hogar': (['Sofá', 'Lámpara', 'Cortina', 'Sartén', 'Colchón', 'Mesa'], (10, 1500)),
+    'Deportes': (['Balón', 'Raqueta', 'Bicicleta', 'Pesas', 'Guantes', 'Colchoneta'], (10, 900)),
+    'Juguetes': (['Muñeca', 'Carro a control', 'Rompecabezas', 'Peluche', 'Bloques'], (8, 200)),
+    'Libros': (['Novela', 'Cuento', 'Manual', 'Enciclopedia', 'Cómic'], (8, 120)),
+    'Belleza': (['Perfume', 'Crema', 'Labial', 'Secador', 'Champú'], (5, 180)),
+    'Alimentos': (['Café', 'Chocolate', 'Aceite', 'Arroz', 'Galletas'], (2, 40)),
+    'Mascotas': (['Concentrado', 'Collar', 'Cama para perro', 'Arena', 'Juguete'], (5, 150)),
+    'Oficina': (['Silla', 'Escritorio', 'Impresora', 'Cuaderno', 'Archivador'], (3, 700)),
+    'Jardín': (['Manguera', 'Podadora', 'Maceta', 'Abono', 'Semillas'], (3, 600)),
+    'Automotriz': (['Llanta', 'Batería', 'Aceite de motor', 'Plumillas', 'Forro'], (10, 450)),
+}
+
+MARCAS = ['Nova', 'Andina', 'Prime', 'Zenit', 'Aurora', 'Cóndor', 'Vértice', 'Delta', 'Pacífico', 'Orión']
+
+# Ciudades de mayor a menor peso; el rango de la ciudad define su probabilidad Zipf
+CIUDADES = ['Bogotá', 'Medellín', 'Cali', 'Barranquilla', 'Cartagena', 'Bucaramanga', 'Pereira',
+            'Manizales', 'Santa Marta', 'Cúcuta', 'Ibagué', 'Villavicencio', 'Pasto', 'Neiva',
+            'Armenia', 'Montería', 'Popayán', 'Valledupar', 'Tunja', 'Sincelejo']
+
+NOMBRES = ['María', 'Carlos', 'Ana', 'Juan', 'Laura', 'Andrés', 'Sofía', 'Miguel', 'Catalina', 'Luis',
+           'Valentina', 'Jorge', 'Camila', 'Diego', 'Daniela', 'Felipe', 'Paula', 'Santiago', 'Natalia', 'Javier']
+APELLIDOS = ['González', 'Rodríguez', 'Martínez', 'Pérez', 'Díaz', 'López', 'Gómez', 'Castro', 'Torres',
+             'Rojas', 'Ramírez', 'Herrera', 'Moreno', 'Vargas', 'Jiménez', 'Suárez', 'Ortiz', 'Mendoza']
+
+ROLES = ['Vendedor', 'Cajero', 'Gerente', 'Bodeguero']
+PESOS_ROLES = [70, 20, 4, 6]
+
+# Estacionalidad: prima de mitad de año, Black Friday y diciembre; más ventas el fin de semana
+FACTOR_MES = [0.80, 0.85, 0.95, 0.95, 1.00, 1.10, 0.95, 0.95, 0.95, 1.00, 1.25, 1.60]
+FACTOR_DIA_SEMANA = [0.95, 0.95, 1.00, 1.00, 1.15, 1.30, 0.85]
+
+LINEAS_POR_VENTA = [1, 2, 3, 4, 5]
+PESOS_LINEAS = [40, 28, 17, 10, 5]
+CANTIDADES = [1, 2, 3, 4, 5]
+PESOS_CANTIDADES = [62, 22, 9, 5, 2]
+ESTADOS = ['completada', 'pendiente', 'cancelada']
+PESOS_ESTADOS = [92, 5, 3]
+
+
+def pesos_zipf(n, s):
+    """Pesos acumulados de una Zipf(s) sobre los rangos 1..n, para random.choices(cum_weights=...)"""
+    return list(itertools.accumulate(1.0 / rango ** s for rango in range(1, n + 1)))
+
+
+def _paso_coprimo(n, semilla):
+    """Paso p coprimo con n: rango -> (rango * p) % n reparte la popularidad sin correlacionarla con el id"""
+    paso = (semilla * 2654435761) % n or 1
+    while gcd(paso, n) != 1:
+        paso += 1
+    return paso
+
+
+class GeneradorDatos:
+    """Genera un dataset sintético determinista (misma semilla, mismos datos) sobre una BaseDatos"""
+
+    def __init__(self, ventas, semilla=42, dias=730, fecha_fin=None, zipf_productos=1.1,
+                 zipf_ciudades=1.2, zipf_clientes=0.8):
+        self.ventas = ventas
+        self.semilla = semilla
+        self.dias = dias
+        self.fecha_fin = fecha_fin or date.today()
+        self.zipf_productos = zipf_productos
+        self.zipf_ciudades = zipf_ciudades
+        self.zipf_clientes = zipf_clientes
+        # Dimensiones proporcionales al volumen, con topes para que quepan en memoria
+        self.num_clientes = min(max(200, ventas // 20), 1_000_000)
+        self.num_productos = min(max(60, ventas // 500), 20_000)
+        self.num_empleados = min(max(10, ventas // 10_000), 2_000)
+        self.num_proveedores = max(5, self.num_productos // 40)
+
+    # --- dimensiones ---
+
+    def _categorias(self, bd):
+        """Agrega las categorías que falten y retorna {nombre: id}"""
+        existentes = {nombre for nombre, in bd.ejecutar_consulta("SELECT nombre FROM categorias")['datos']}
+        nuevas = [(nombre,) for nombre in CATEGORIAS if nombre not in existentes]
+        if nuevas:
+            bd.cargar_masivo('categorias', ['nombre'], nuevas)
+        return {nombre: id_ for id_, nombre in bd.ejecutar_consulta("SELECT id, nombre FROM categorias")['datos']}
+
+    def _cargar_dimensiones(self, bd, rng):
+        """Carga proveedores, productos, clientes y empleados; retorna los rangos de ids generados"""
+        ids_categoria = self._categorias(bd)
+        inicio = {tabla: bd.ejecutar_consulta(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {tabla}")['datos'][0][0]
+                  for tabla in ('proveedores', 'productos', 'clientes', 'empleados')}
+
+        proveedores = [(f"{MARCAS[i % len(MARCAS)]} Distribuciones {i + 1}", f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}",
+                        f"3{rng.randrange(10**9):09d}") for i in range(self.num_proveedores)]
+        bd.cargar_masivo('proveedores', ['nombre', 'contacto', 'telefono'], proveedores)
+
+        precios = []
+        productos = []
+        for i in range(self.num_productos):
+            categoria = CATEGORIAS[i % len(CATEGORIAS)]
+            articulos, (minimo, maximo) = ARTICULOS[categoria]
+            # Log-uniforme: muchos productos baratos y pocos caros dentro de cada categoría
+            precio = round(minimo * (maximo / minimo) ** rng.random(), 2)
+            precios.append(precio)
+            productos.append((f"{rng.choice(articulos)} {rng.choice(MARCAS)} {i + 1}", f"Referencia sintética {i + 1}",
+                              precio, rng.randrange(0, 200), ids_categoria[categoria],
+                              inicio['proveedores'] + rng.randrange(self.num_proveedores)))
+        bd.cargar_masivo('productos', ['nombre', 'descripcion', 'precio', 'stock', 'categoria_id', 'proveedor_id'],
+                         productos)
+
+        pesos_ciudades = pesos_zipf(len(CIUDADES), self.zipf_ciudades)
+        ciudades = rng.choices(CIUDADES, cum_weights=pesos_ciudades, k=self.num_clientes)
+        primer_registro = self.fecha_fin - timedelta(days=self.dias * 2)
+        clientes = ((f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}", f"cliente{inicio['clientes'] + i}@sintetico.com",
+                     f"3{rng.randrange(10**9):09d}", ciudades[i],
+                     (primer_registro + timedelta(days=rng.randrange(self.dias * 2))).isoformat())
+                    for i in range(self.num_clientes))
+        bd.cargar_masivo('clientes', ['nombre', 'email', 'telefono', 'ciudad', 'fecha_registro'], clientes)
+
+        roles = rng.choices(ROLES, weights=PESOS_ROLES, k=self.num_empleados)
+        empleados = [(f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}", f"empleado{inicio['empleados'] + i}@tienda.com",
+                      roles[i], (primer_registro + timedelta(days=rng.randrange(self.dias))).isoformat())
+                     for i in range(self.num_empleados)]
+        bd.cargar_masivo('empleados', ['nombre', 'email', 'rol', 'fecha_contratacion'], empleados)
+
+        return inicio, precios
+
+    # --- hechos ---
+
+    def _ventas_por_dia(self, rng):
+        """Reparte las ventas entre los días según estacionalidad y una leve tendencia de crecimiento"""
+        primer_dia = self.fecha_fin - timedelta(days=self.dias - 1)
+        dias = [primer_dia + timedelta(days=i) for i in range(self.dias)]
+        pesos = [FACTOR_MES[d.month - 1] * FACTOR_DIA_SEMANA[d.weekday()] * (0.85 + 0.3 * i / self.dias)
+                 * rng.uniform(0.9, 1.1) for i, d in enumerate(dias)]
+        total = sum(pesos)
+        cuotas = [self.ventas * peso / total for peso in pesos]
+        conteos = [int(cuota) for cuota in cuotas]
+        # Resto mayor: los días con mayor fracción reciben las ventas que faltan
+        faltantes = self.ventas - sum(conteos)
+        for i in sorted(range(self.dias), key=lambda i: cuotas[i] - conteos[i], reverse=True)[:faltantes]:
+            conteos[i] += 1
+        return list(zip(dias, conteos))
+
+    def _dia(self, indice, fecha, cantidad, primera_venta, contexto):
+        """Genera (ventas, detalles) de un día; cada día usa su propia semilla para poder regenerarlo"""
+        rng = random.Random(self.semilla * 1_000_003 + indice)
+        inicio, precios, pesos_clientes, pesos_productos, paso_clientes, paso_productos = contexto
+
+        rangos_clientes = rng.choices(range(self.num_clientes), cum_weights=pesos_clientes, k=cantidad)
+        empleados = rng.choices(range(inicio['empleados'], inicio['empleados'] + self.num_empleados), k=cantidad)
+        estados = rng.choices(ESTADOS, weights=PESOS_ESTADOS, k=cantidad)
+        lineas = rng.choices(LINEAS_POR_VENTA, weights=PESOS_LINEAS, k=cantidad)
+        total_lineas = sum(lineas)
+        rangos_productos = rng.choices(range(self.num_productos), cum_weights=pesos_productos, k=total_lineas)
+        cantidades = rng.choices(CANTIDADES, weights=PESOS_CANTIDADES, k=total_lineas)
+
+        texto_fecha = fecha.isoformat()
+        ventas = []
+        detalles = []
+        j = 0
+        for i in range(cantidad):
+            venta_id = primera_venta + i
+            total = 0.0
+            for _ in range(lineas[i]):
+                producto = (rangos_productos[j] * paso_productos) % self.num_productos
+                precio = precios[producto]
+                total += precio * cantidades[j]
+                detalles.append((venta_id, inicio['productos'] + producto, cantidades[j], precio))
+                j += 1
+            cliente = inicio['clientes'] + (rangos_clientes[i] * paso_clientes) % self.num_clientes
+            ventas.append((venta_id, cliente, empleados[i], texto_fecha, round(total, 2), estados[i]))
+        return ventas, detalles
+
+    def _recorrer_dias(self, plan, primera_venta, contexto, elemento):
+        """Genera las filas de ventas (elemento=0) o detalles (elemento=1) día por día"""
+        for indice, (fecha, cantidad) in enumerate(plan):
+            yield from self._dia(indice, fecha, cantidad, primera_venta, contexto)[elemento]
+            primera_venta += cantidad
+
+    def poblar(self, bd, tamano_lote=100000):
+        """Carga el dataset completo en bd y retorna el informe de cada tabla"""
+        rng = random.Random(self.semilla)
+        inicio_total = time.perf_counter()
+        inicio, precios = self._cargar_dimensiones(bd, rng)
+        primera_venta = bd.ejecutar_consulta("SELECT COALESCE(MAX(id), 0) + 1 FROM ventas")['datos'][0][0]
+        contexto = (inicio, precios,
+                    pesos_zipf(self.num_clientes, self.zipf_clientes),
+                    pesos_zipf(self.num_productos, self.zipf_productos),
+                    _paso_coprimo(self.num_clientes, self.semilla),
+                    _paso_coprimo(self.num_productos, self.semilla + 1))
+        plan = self._ventas_por_dia(rng)
+
+        # Dos pasadas con las mismas semillas por día: ventas primero (con su total) y luego sus detalles,
+        # sin tener que guardar en memoria los detalles de millones de ventas
+        informe_ventas = bd.cargar_masivo(
+            'ventas', ['id', 'cliente_id', 'empleado_id', 'fecha', 'total', 'estado'],
+            self._recorrer_dias(plan, primera_venta, contexto, 0), tamano_lote)
+        informe_detalles = bd.cargar_masivo(
+            'detalles_venta', ['venta_id', 'producto_id', 'cantidad', 'precio_unitario'],
+            self._recorrer_dias(plan, primera_venta, contexto, 1), tamano_lote)
+        return {
+            'ventas': informe_ventas,
+            'detalles_venta': informe_detalles,
+            'clientes': self.num_clientes,
+            'productos': self.num_productos,
+            'empleados': self.num_empleados,
+            'segundos': time.perf_counter() - inicio_total,
+        }
+
+
+def generar(archivo, ventas, semilla=42):
+    """Crea (o amplía) archivo con un dataset sintético de `ventas` ventas"""
+    bd = BaseDatos(archivo)
+    try:
+        return GeneradorDatos(ventas, semilla).poblar(bd)
+    finally:
+        bd.cerrar()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos de ventas")
+    parser.add_argument('archivo', help="base SQLite a crear o ampliar")
+    parser.add_argument('--tamano', default='10k', help=f"{', '.join(TAMANOS)} o un número de ventas")
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args()
+
+    ventas = TAMANOS.get(args.tamano.lower()) or int(args.tamano)
+    informe = generar(args.archivo, ventas, args.semilla)
+    print(f"{informe['ventas']['filas']:,} ventas y {informe['detalles_venta']['filas']:,} detalles "
+          f"({informe['clientes']:,} clientes, {informe['productos']:,} productos, "
+          f"{informe['empleados']:,} empleados) en {informe['segundos']:.1f}s")
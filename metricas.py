@@ -0,0 +1,160 @@
+# metricas.py
+# Tiempos por etapa de cada pregunta, exportados en formato Prometheus y como cabecera Server-Timing.
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Etapas de una pregunta, en el orden en que ocurren
+ETAPAS = ('plantilla', 'prompt', 'llm', 'validacion', 'ejecucion', 'lectura', 'render')
+
+# Límites (segundos) de los histogramas: de 0.1 ms (ruta rápida) hasta la latencia de un LLM lento
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def muestra(tasa):
+    """True para una fracción `tasa` de las llamadas; sirve para muestrear logs verbosos"""
+    return tasa >= 1 or random.random() < tasa
+
+
+def percentil(valores, p):
+    """El valor del percentil `p` (0 a 100) de `valores`, por rango más cercano"""
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def resumen_latencias(nombre, latencias, duracion):
+    """Peticiones, throughput (por segundo) y p50/p99 en ms de una corrida de `duracion` segundos"""
+    return {
+        'modo': nombre,
+        'peticiones': len(latencias),
+        'throughput': len(latencias) / duracion,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+    }
+
+
+class MedicionPregunta:
+    """Acumula la duración de cada etapa y los tokens de una sola pregunta"""
+
+    def __init__(self):
+        self.etapas = {}
+        self.tokens = {}
+        self.resultado = 'ok'
+        # (sql, parametros, resultado) de la respuesta; solo se llena si el agente graba trazas (ver trazas.py)
+        self.consulta = None
+        self._inicio = time.perf_counter()
+
+    def agregar(self, etapa, segundos):
+        self.etapas[etapa] = self.etapas.get(etapa, 0.0) + segundos
+
+    @contextmanager
+    def etapa(self, nombre):
+        """Mide el bloque y lo suma a la etapa (una etapa puede repetirse, p. ej. lectura por lotes)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.agregar(nombre, time.perf_counter() - inicio)
+
+    def registrar_tokens(self, uso):
+        """Guarda los tokens que reporta el campo usage de la respuesta del LLM"""
+        for tipo in ('prompt_tokens', 'completion_tokens'):
+            cantidad = getattr(uso, tipo, None)
+            if cantidad is not None:
+                self.tokens[tipo.split('_')[0]] = cantidad
+
+    def total(self):
+        return time.perf_counter() - self._inicio
+
+    def server_timing(self):
+        """Valor de la cabecera Server-Timing (duraciones en ms)"""
+        partes = [f"{etapa};dur={segundos * 1000:.2f}" for etapa, segundos in self.etapas.items()]
+        partes.append(f"total;dur={self.total() * 1000:.2f}")
+        return ', '.join(partes)
+
+
+class Metricas:
+    """Registro de contadores e histogramas en memoria, seguro entre hilos"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._contadores = {}  # (nombre, etiquetas) -> valor
+        self._histogramas = {}  # (nombre, etiquetas) -> [conteos por bucket, suma, total]
+        self._descripciones = {}  # nombre -> (tipo, ayuda)
+        self._bloqueo = threading.Lock()
+        self.describir('agente_etapa_segundos', 'histogram', "Duración de cada etapa de una pregunta")
+        self.describir('agente_pregunta_segundos', 'histogram', "Duración total de una pregunta")
+        self.describir('agente_preguntas_total', 'counter', "Preguntas procesadas por resultado")
+        self.describir('agente_tokens_total', 'counter', "Tokens reportados por el LLM")
+
+    def describir(self, nombre, tipo, ayuda):
+        self._descripciones[nombre] = (tipo, ayuda)
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._bloqueo:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._bloqueo:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    histograma[0][i] += 1
+            histograma[1] += valor
+            histograma[2] += 1
+
+    def registrar_pregunta(self, medicion):
+        """Vuelca una MedicionPregunta terminada en los histogramas y contadores"""
+        for etapa, segundos in medicion.etapas.items():
+            self.observar('agente_etapa_segundos', segundos, etapa=etapa)
+        self.observar('agente_pregunta_segundos', medicion.total())
+        self.incrementar('agente_preguntas_total', resultado=medicion.resultado)
+        for tipo, cantidad in medicion.tokens.items():
+            self.incrementar('agente_tokens_total', cantidad, tipo=tipo)
+
+    def exportar(self, medidores=None):
+        """Texto en formato de exposición de Prometheus; `medidores` agrega gauges {nombre: [(etiquetas, valor)]}"""
+        lineas = []
+        with self._bloqueo:
+            contadores = dict(self._contadores)
+            histogramas = {clave: (list(h[0]), h[1], h[2]) for clave, h in self._histogramas.items()}
+
+        def encabezado(nombre, tipo):
+            _, ayuda = self._descripciones.get(nombre, (tipo, nombre))
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+
+        for nombre in sorted({nombre for nombre, _ in contadores}):
+            encabezado(nombre, 'counter')
+            for (actual, etiquetas), valor in sorted(contadores.items()):
+                if actual == nombre:
+                    lineas.append(f"{nombre}{_etiquetas(etiquetas)} {valor}")
+
+        for nombre in sorted({nombre for nombre, _ in histogramas}):
+            encabezado(nombre, 'histogram')
+            for (actual, etiquetas), (conteos, suma, total) in sorted(histogramas.items()):
+                if actual != nombre:
+                    continue
+                for limite, conteo in zip(self.buckets, conteos):
+                    lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', repr(limite)),))} {conteo}")
+                lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', '+Inf'),))} {total}")
+                lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {suma}")
+                lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {total}")
+
+        for nombre, valores in (medidores or {}).items():
+            encabezado(nombre, 'gauge')
+            for etiquetas, valor in valores:
+                lineas.append(f"{nombre}{_etiquetas(tuple(sorted(etiquetas.items())))} {valor}")
+        return '\n'.join(lineas) + '\n'
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ''
+    return '{' + ','.join(f'{clave}="{valor}"' for clave, valor in etiquetas) + '}'
@@ -0,0 +1,1246 @@
+# motor_columnar.py
+# Motor analítico opcional para las agregaciones grandes (totales por mes, por categoría, por ciudad...).
+# Mantiene junto a la base una copia columnar de ventas y detalles_venta (<archivo>.columnar/: un archivo
+# binario por columna, abierto con mmap) y ejecuta sobre ella con numpy los SELECT de solo agregación:
+# agrupa con bincount en vez de recorrer fila por fila. El agente le ofrece cada consulta antes que a SQLite;
+# si no sabe ejecutarla exactamente como SQLite, o la copia está atrasada, retorna None y va a SQLite.
+# numpy es opcional: sin él (o con MOTOR_COLUMNAR=0) todo sigue yendo a SQLite.
+import copy
+import json
+import logging
+import operator
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from datetime import date
+
+from validador_sql import ErrorTokenizador, tokenizar
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+registro = logging.getLogger(__name__)
+
+# Columnas copiadas de cada tabla: (nombre, dtype, expresión SQL). detalles_venta lleva además las columnas
+# de su venta por las que se filtra y agrupa, así ninguna consulta tiene que cruzarla con ventas
+COLUMNAS = {
+    'ventas': [
+        ('id', 'int64', 'v.id'),
+        ('cliente_id', 'int32', 'v.cliente_id'),
+        ('empleado_id', 'int32', 'COALESCE(v.empleado_id, -1)'),
+        ('fecha', 'int32', 'v.fecha'),
+        ('total', 'float64', 'v.total'),
+        ('estado', 'int16', 'v.estado'),
+    ],
+    'detalles_venta': [
+        ('id', 'int64', 'd.id'),
+        ('venta_id', 'int64', 'd.venta_id'),
+        ('producto_id', 'int32', 'd.producto_id'),
+        ('cantidad', 'int32', 'd.cantidad'),
+        ('precio_unitario', 'float64', 'd.precio_unitario'),
+        ('fecha', 'int32', 'v.fecha'),
+        ('cliente_id', 'int32', 'v.cliente_id'),
+        ('empleado_id', 'int32', 'COALESCE(v.empleado_id, -1)'),
+        ('estado', 'int16', 'v.estado'),
+    ],
+}
+_ORIGEN_COPIA = {
+    'ventas': "ventas v WHERE v.id > ? ORDER BY v.id",
+    'detalles_venta': "detalles_venta d JOIN ventas v ON v.id = d.venta_id WHERE d.id > ? ORDER BY d.id",
+}
+# Columnas de ventas que detalles_venta trae copiadas (columna en ventas -> columna en detalles_venta)
+VENTA_EN_DETALLE = {'id': 'venta_id', 'fecha': 'fecha', 'cliente_id': 'cliente_id', 'empleado_id': 'empleado_id',
+                    'estado': 'estado'}
+# Enteros que pueden ser NULL: se copian como -1
+_NULABLES = {'empleado_id'}
+
+# FOREIGN KEY por las que se puede cruzar desde la tabla de hechos: (tabla, columna) -> tabla referida (id)
+RELACIONES = {
+    ('ventas', 'cliente_id'): 'clientes',
+    ('ventas', 'empleado_id'): 'empleados',
+    ('detalles_venta', 'venta_id'): 'ventas',
+    ('detalles_venta', 'producto_id'): 'productos',
+    ('productos', 'categoria_id'): 'categorias',
+    ('productos', 'proveedor_id'): 'proveedores',
+}
+
+_AGREGADOS = {'count', 'sum', 'avg', 'min', 'max'}
+_OPERADORES = {'=': operator.eq, '==': operator.eq, '!=': operator.ne, '<>': operator.ne,
+               '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+# Funciones de fecha que se pueden evaluar como constantes (sin columnas: date('now', 'start of month'))
+_NO_CONDICION = {'OR', 'NOT', 'LIKE', 'GLOB', 'MATCH', 'REGEXP', 'EXISTS', 'CASE', 'ESCAPE', 'COLLATE'}
+_FUNCIONES_CONSTANTES = {'date', 'datetime', 'strftime', 'time'}
+_FORMATO_FECHA = re.compile(r"(?:%[Ymd]|[^%])*")
+_FECHA = re.compile(r'\d{4}-\d\d-\d\d')
+_EPOCA = date(1970, 1, 1).toordinal()
+
+
+class NoSoportada(Exception):
+    """La consulta (o sus datos) se sale de lo que el motor resuelve igual que SQLite: va a SQLite"""
+
+
+def _orden_sqlite(valor):
+    """Clave de orden de SQLite: NULL, números, texto, blobs"""
+    if valor is None:
+        return (0, 0)
+    if isinstance(valor, (int, float)):
+        return (1, valor)
+    return (2, valor) if isinstance(valor, str) else (3, valor)
+
+
+def _afinidad_numerica(tipo):
+    """Si el tipo declarado le da a la columna afinidad INTEGER, REAL o NUMERIC (reglas de afinidad de SQLite)"""
+    tipo = (tipo or '').upper()
+    if 'INT' in tipo:
+        return True
+    return bool(tipo) and not any(parte in tipo for parte in ('CHAR', 'CLOB', 'TEXT', 'BLOB'))
+
+
+def _texto_fecha(dia):
+    return date.fromordinal(dia + _EPOCA).isoformat()
+
+
+# ---------------------------------------------------------------------------------------------------------
+# Copia columnar en disco
+# ---------------------------------------------------------------------------------------------------------
+
+class InstantaneaColumnar:
+    """Copia columnar de ventas y detalles_venta en <archivo>.columnar/, al día por versiones de tabla.
+
+    Las filas nuevas (id mayor al último copiado) se agregan al final de cada archivo. Un UPDATE o DELETE
+    en esas tablas obliga a reconstruirla en otra generación (g<N>/), que reemplaza a la anterior al terminar.
+    """
+
+    def __init__(self, bd, directorio=None, tamano_lote=100_000):
+        self.bd = bd
+        self.directorio = directorio or f"{bd.archivo}.columnar"
+        self.tamano_lote = tamano_lote
+        self._copia = (None, None)  # (manifiesto, {tabla: {columna: array}}) abiertos
+        self._dias = {}  # 'YYYY-MM-DD' -> días desde 1970-01-01
+        self._bloqueo = threading.Lock()
+
+    def _ruta(self, *partes):
+        return os.path.join(self.directorio, *partes)
+
+    def copia(self):
+        """(manifiesto, columnas) mapeados en memoria, o (None, None) si aún no se abrió"""
+        return self._copia
+
+    def _leer_manifiesto(self):
+        try:
+            with open(self._ruta('manifiesto.json'), encoding='utf-8') as archivo:
+                return json.load(archivo)
+        except (OSError, ValueError):
+            return None
+
+    def _escribir_manifiesto(self, manifiesto):
+        temporal = self._ruta('manifiesto.json.tmp')
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump(manifiesto, archivo)
+        os.replace(temporal, self._ruta('manifiesto.json'))
+
+    def abrir(self):
+        """Relee el manifiesto (otro proceso pudo actualizarlo) y mapea las columnas; retorna el manifiesto"""
+        manifiesto = self._leer_manifiesto()
+        if manifiesto is None or manifiesto == self._copia[0]:
+            return self._copia[0]
+        try:
+            columnas = {tabla: {nombre: self._mapear(manifiesto, tabla, nombre, tipo)
+                                for nombre, tipo, _ in definicion}
+                        for tabla, definicion in COLUMNAS.items()}
+        except OSError as e:
+            # Una generación borrada mientras se leía el manifiesto: se reintenta en la próxima consulta
+            registro.debug("Copia columnar no disponible: %s", e)
+            return self._copia[0]
+        self._copia = (manifiesto, columnas)
+        return manifiesto
+
+    def _mapear(self, manifiesto, tabla, nombre, tipo):
+        filas = manifiesto['tablas'][tabla]['filas']
+        if not filas:
+            return np.empty(0, dtype=tipo)
+        ruta = self._ruta(f"g{manifiesto['generacion']}", f"{tabla}.{nombre}.bin")
+        # Solo las filas del manifiesto: lo que otro proceso esté agregando al final no se ve
+        return np.memmap(ruta, dtype=tipo, mode='r', shape=(filas,))
+
+    @contextmanager
+    def _exclusivo(self):
+        """Un solo escritor de la copia, entre hilos y entre procesos (servidor_prefork)"""
+        with self._bloqueo:
+            os.makedirs(self.directorio, exist_ok=True)
+            with open(self._ruta('bloqueo'), 'w') as archivo:
+                if fcntl is not None:
+                    fcntl.flock(archivo, fcntl.LOCK_EX)
+                yield
+
+    def actualizar(self, reconstruir=False):
+        """Copia las filas nuevas, o todo si hubo UPDATE/DELETE (o con `reconstruir`); retorna el manifiesto"""
+        with self._exclusivo():
+            anterior = self._leer_manifiesto()
+            with self.bd.pool.conexion() as conexion:
+                # Una sola transacción de lectura: ventas, detalles y sus versiones de la misma instantánea
+                conexion.execute("BEGIN")
+                try:
+                    versiones = self._contadores(conexion, 'versiones_tablas')
+                    reescrituras = self._contadores(conexion, 'reescrituras_tablas')
+                    if anterior is not None and not reconstruir and anterior['versiones'] == versiones:
+                        manifiesto = anterior
+                    else:
+                        if reconstruir or anterior is None or anterior['reescrituras'] != reescrituras:
+                            manifiesto = self._nueva_generacion(anterior)
+                        else:
+                            manifiesto = copy.deepcopy(anterior)
+                        for tabla in COLUMNAS:
+                            self._copiar(conexion, manifiesto, tabla)
+                        manifiesto.update(versiones=versiones, reescrituras=reescrituras)
+                finally:
+                    conexion.rollback()
+            if manifiesto is not anterior:
+                self._escribir_manifiesto(manifiesto)
+                if anterior is not None and anterior['generacion'] != manifiesto['generacion']:
+                    shutil.rmtree(self._ruta(f"g{anterior['generacion']}"), ignore_errors=True)
+        self.abrir()
+        return manifiesto
+
+    def _contadores(self, conexion, tabla):
+        marcadores = ', '.join('?' * len(COLUMNAS))
+        return dict(conexion.execute(f"SELECT tabla, version FROM {tabla} WHERE tabla IN ({marcadores})",
+                                     list(COLUMNAS)).fetchall())
+
+    def _nueva_generacion(self, anterior):
+        generacion = anterior['generacion'] + 1 if anterior else 1
+        # Restos de una reconstrucción interrumpida
+        shutil.rmtree(self._ruta(f"g{generacion}"), ignore_errors=True)
+        os.makedirs(self._ruta(f"g{generacion}"))
+        return {'generacion': generacion, 'tablas': {tabla: {'filas': 0, 'ultimo_id': 0} for tabla in COLUMNAS},
+                'estados': [], 'versiones': {}, 'reescrituras': {}}
+
+    def _copiar(self, conexion, manifiesto, tabla):
+        """Agrega a los archivos de la tabla sus filas con id mayor al último copiado"""
+        estado = manifiesto['tablas'][tabla]
+        definicion = COLUMNAS[tabla]
+        archivos = []
+        try:
+            for nombre, tipo, _ in definicion:
+                archivo = open(self._ruta(f"g{manifiesto['generacion']}", f"{tabla}.{nombre}.bin"), 'ab')
+                archivos.append(archivo)
+                # Lo escrito después del último manifiesto (una copia interrumpida) se descarta
+                archivo.truncate(estado['filas'] * np.dtype(tipo).itemsize)
+            cursor = conexion.execute(
+                f"SELECT {', '.join(expresion for _, _, expresion in definicion)} FROM {_ORIGEN_COPIA[tabla]}",
+                (estado['ultimo_id'],))
+            while True:
+                filas = cursor.fetchmany(self.tamano_lote)
+                if not filas:
+                    break
+                for archivo, (nombre, tipo, _), valores in zip(archivos, definicion, zip(*filas)):
+                    self._columna(nombre, tipo, valores, manifiesto).tofile(archivo)
+                estado['filas'] += len(filas)
+                estado['ultimo_id'] = filas[-1][0]
+        finally:
+            for archivo in archivos:
+                archivo.close()
+
+    def _columna(self, nombre, tipo, valores, manifiesto):
+        if nombre == 'fecha':
+            valores = [self._dias[valor] if valor in self._dias else self._dia(valor) for valor in valores]
+        elif nombre == 'estado':
+            estados = manifiesto['estados']
+            codigos = {valor: i for i, valor in enumerate(estados)}
+            for valor in set(valores) - codigos.keys():
+                codigos[valor] = len(estados)
+                estados.append(valor)
+            valores = [codigos[valor] for valor in valores]
+        return np.array(valores, dtype=tipo)
+
+    def _dia(self, valor):
+        # Las comparaciones de SQLite sobre fecha son de texto: solo son equivalentes a las de días
+        # si todas las fechas tienen la forma YYYY-MM-DD
+        if not isinstance(valor, str) or not _FECHA.fullmatch(valor):
+            raise ValueError(f"fecha con formato inesperado: {valor!r}")
+        dia = self._dias[valor] = date.fromisoformat(valor).toordinal() - _EPOCA
+        return dia
+
+
+# ---------------------------------------------------------------------------------------------------------
+# Planificación: del SQL a una consulta de agregación sobre la tabla de hechos
+# ---------------------------------------------------------------------------------------------------------
+
+# Nodo del árbol de una expresión: tipo 'columna' (valor = (calificador, nombre)), 'literal', 'todo' (*),
+# 'funcion' (valor = nombre, args) o 'por' (args = [a, b]); inicio/fin delimitan su texto en el SQL
+Nodo = namedtuple('Nodo', ['tipo', 'valor', 'args', 'inicio', 'fin'])
+
+# Columna de salida: expr compilada ('col', tabla, columna) | ('fecha', formato, col) para las dimensiones,
+# ('agg', función, argumento) | ('round', agg, decimales) para las medidas
+Salida = namedtuple('Salida', ['nombre', 'expr', 'es_medida', 'oculta'])
+
+# Condición del WHERE: expresión de dimensión, operador ('=', '<', 'in', 'between', 'is', 'is not') y constantes
+Condicion = namedtuple('Condicion', ['expr', 'operador', 'constantes'])
+
+Plan = namedtuple('Plan', ['hechos', 'uniones', 'condiciones', 'salidas', 'grupos', 'orden', 'limite', 'desplazamiento'])
+
+
+def _separar(tokens, valor):
+    """Parte la lista de tokens en los `valor` del nivel de paréntesis del primero"""
+    if not tokens:
+        return []
+    nivel = tokens[0].profundidad
+    partes = [[]]
+    for token in tokens:
+        if token.profundidad == nivel and token.valor == valor and token.tipo in ('puntuacion', 'operador', 'palabra'):
+            partes.append([])
+        else:
+            partes[-1].append(token)
+    return partes
+
+
+def _nombre(token):
+    return token.valor.lower() if token.tipo in ('palabra', 'identificador') else None
+
+
+def _nodo(tokens):
+    """Árbol de una expresión simple (columna, literal, función, producto a*b) o None"""
+    if not tokens:
+        return None
+    inicio, fin = tokens[0].inicio, tokens[-1].fin
+    factores = _separar(tokens, '*')
+    if len(factores) == 2 and all(factores):
+        a, b = _nodo(factores[0]), _nodo(factores[1])
+        return Nodo('por', None, [a, b], inicio, fin) if a and b else None
+    if len(tokens) == 1:
+        token = tokens[0]
+        if token.valor == '*':
+            return Nodo('todo', None, [], inicio, fin)
+        if token.tipo == 'texto':
+            return Nodo('literal', token.valor[1:-1].replace("''", "'"), [], inicio, fin)
+        if token.tipo == 'numero':
+            if token.valor.lower().startswith('0x'):
+                numero = int(token.valor, 16)
+            else:
+                numero = float(token.valor) if re.search(r'[.eE]', token.valor) else int(token.valor)
+            return Nodo('literal', numero, [], inicio, fin)
+        if token.valor == 'NULL':
+            return Nodo('literal', None, [], inicio, fin)
+        if _nombre(token):
+            return Nodo('columna', (None, _nombre(token)), [], inicio, fin)
+        return None
+    if len(tokens) == 2 and tokens[0].valor == '-' and tokens[1].tipo == 'numero':
+        literal = _nodo(tokens[1:])
+        return Nodo('literal', -literal.valor, [], inicio, fin)
+    if len(tokens) == 3 and tokens[1].valor == '.' and _nombre(tokens[0]) and _nombre(tokens[2]):
+        return Nodo('columna', (_nombre(tokens[0]), _nombre(tokens[2])), [], inicio, fin)
+    if len(tokens) >= 3 and _nombre(tokens[0]) and tokens[1].valor == '(' and tokens[-1].valor == ')':
+        internos = tokens[2:-1]
+        if any(token.valor == 'DISTINCT' for token in internos[:1]):
+            return None
+        args = [_nodo(parte) for parte in _separar(internos, ',')] if internos else []
+        if any(arg is None for arg in args):
+            return None
+        return Nodo('funcion', _nombre(tokens[0]), args, inicio, fin)
+    return None
+
+
+def _es_constante(nodo):
+    """Literal o función de fecha sobre literales (date('now', 'start of month'))"""
+    if nodo.tipo == 'literal':
+        return True
+    return (nodo.tipo == 'funcion' and nodo.valor in _FUNCIONES_CONSTANTES
+            and all(arg.tipo == 'literal' for arg in nodo.args))
+
+
+def _clausulas(tokens):
+    """Tokens de cada cláusula de nivel 0 ({'select': [...], 'from': [...], ...}) o None si hay otras"""
+    clausulas = {}
+    actual = None
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.profundidad == 0 and token.tipo == 'palabra':
+            siguiente = tokens[i + 1].valor if i + 1 < len(tokens) else None
+            clave = None
+            if token.valor in ('SELECT', 'FROM', 'WHERE', 'LIMIT'):
+                clave = token.valor.lower()
+            elif token.valor in ('GROUP', 'ORDER') and siguiente == 'BY':
+                clave = token.valor.lower()
+                i += 1
+            elif token.valor in ('HAVING', 'UNION', 'EXCEPT', 'INTERSECT', 'WINDOW', 'WITH', 'VALUES'):
+                return None
+            if clave is not None:
+                if clave in clausulas:
+                    return None
+                clausulas[clave] = actual = []
+                i += 1
+                continue
+        if actual is None:
+            return None
+        actual.append(token)
+        i += 1
+    return clausulas
+
+
+class _Planificador:
+    """Traduce un SELECT a un Plan, o lanza NoSoportada"""
+
+    def __init__(self, sql, esquema):
+        self.sql = sql
+        self.esquema = esquema
+
+    def planificar(self):
+        try:
+            tokens = tokenizar(self.sql)
+        except ErrorTokenizador as e:
+            raise NoSoportada(str(e))
+        while tokens and tokens[-1].valor == ';':
+            tokens.pop()
+        if not tokens or tokens[0].valor != 'SELECT':
+            raise NoSoportada("no es un SELECT")
+        if any(token.valor == 'SELECT' for token in tokens[1:]) or any(t.tipo == 'parametro' for t in tokens):
+            raise NoSoportada("subconsultas o parámetros")
+        clausulas = _clausulas(tokens)
+        if not clausulas or 'from' not in clausulas:
+            raise NoSoportada("cláusulas no soportadas")
+        if clausulas['select'] and clausulas['select'][0].valor in ('DISTINCT', 'ALL'):
+            raise NoSoportada("DISTINCT")
+
+        self._uniones(clausulas['from'])
+        salidas = [self._salida(parte) for parte in _separar(clausulas['select'], ',')]
+        grupos = [self._grupo(parte, salidas) for parte in _separar(clausulas.get('group', []), ',')]
+        if not grupos and not any(salida.es_medida for salida in salidas):
+            raise NoSoportada("no es una agregación")
+        for salida in salidas:
+            if not salida.es_medida:
+                self._revisar_agrupada(salida.expr, grupos)
+        condiciones = []
+        if 'where' in clausulas:
+            condiciones = self._condiciones(clausulas['where'])
+        orden = [self._orden(parte, salidas, grupos) for parte in _separar(clausulas.get('order', []), ',')]
+        limite, desplazamiento = self._limite(clausulas.get('limit'))
+        return Plan(self.hechos, self.camino, condiciones, salidas, grupos, orden, limite, desplazamiento)
+
+    # FROM: la tabla de hechos y cómo se llega desde ella a cada tabla unida
+    def _uniones(self, tokens):
+        tablas = {}  # alias -> tabla
+        igualdades = []
+        for j, parte in enumerate(self._partes_from(tokens)):
+            tabla_tokens, condicion = parte
+            nombres = [token for token in tabla_tokens if token.valor != 'AS']
+            if not 1 <= len(nombres) <= 2 or not all(_nombre(token) for token in nombres):
+                raise NoSoportada("FROM no soportado")
+            tabla = _nombre(nombres[0])
+            if tabla not in self.esquema or tabla in tablas.values():
+                raise NoSoportada(f"tabla {tabla}")
+            tablas[tabla] = tabla
+            if len(nombres) == 2:
+                tablas[_nombre(nombres[1])] = tabla
+            if j and condicion is None:
+                raise NoSoportada("JOIN sin ON")
+            if condicion is not None:
+                igualdades.append(condicion)
+        self.alias = tablas
+        presentes = set(tablas.values())
+        self.hechos = 'detalles_venta' if 'detalles_venta' in presentes else 'ventas' if 'ventas' in presentes else None
+        if self.hechos is None:
+            raise NoSoportada("no lee ventas ni detalles_venta")
+
+        # Cada ON debe ser una FOREIGN KEY de RELACIONES; se recorren desde la tabla de hechos
+        aristas = []
+        for tokens_condicion in igualdades:
+            lados = _separar(tokens_condicion, '=')
+            if len(lados) != 2:
+                raise NoSoportada("ON no soportado")
+            a, b = (self._columna(_nodo(lado), sin_canonizar=True) for lado in lados)
+            for (tabla_a, columna_a), (tabla_b, columna_b) in (((a[1], a[2]), (b[1], b[2])), ((b[1], b[2]), (a[1], a[2]))):
+                if RELACIONES.get((tabla_a, columna_a)) == tabla_b and columna_b == 'id':
+                    aristas.append((tabla_a, columna_a, tabla_b))
+                    break
+            else:
+                raise NoSoportada("ON que no es una FOREIGN KEY conocida")
+        self.camino = {}  # tabla unida -> (tabla origen, columna)
+        alcanzadas = {self.hechos}
+        pendientes = list(aristas)
+        while pendientes:
+            for arista in pendientes:
+                origen, columna, destino = arista
+                if origen in alcanzadas and destino not in alcanzadas:
+                    self.camino[destino] = (origen, columna)
+                    alcanzadas.add(destino)
+                    pendientes.remove(arista)
+                    break
+            else:
+                raise NoSoportada("JOIN que no sale de la tabla de hechos")
+        if alcanzadas != presentes:
+            raise NoSoportada("tablas sin unir")
+
+    def _partes_from(self, tokens):
+        """[(tokens de la tabla y su alias, tokens del ON o None)] de un FROM con solo [INNER] JOIN ... ON"""
+        partes = []
+        actual, condicion = [], None
+        for token in tokens:
+            if token.profundidad != 0:
+                raise NoSoportada("subconsulta en FROM")
+            if token.valor in ('LEFT', 'RIGHT', 'FULL', 'OUTER', 'CROSS', 'NATURAL', 'USING', ',', 'INDEXED'):
+                raise NoSoportada(f"{token.valor} en FROM")
+            if token.valor == 'INNER':
+                continue
+            if token.valor == 'JOIN':
+                partes.append((actual, condicion))
+                actual, condicion = [], None
+            elif token.valor == 'ON':
+                condicion = []
+            elif condicion is not None:
+                if token.valor == 'AND':
+                    raise NoSoportada("ON con varias condiciones")
+                condicion.append(token)
+            else:
+                actual.append(token)
+        partes.append((actual, condicion))
+        return partes
+
+    def _columna(self, nodo, sin_canonizar=False):
+        """('col', tabla, columna) de una referencia a columna; la FK usada en un JOIN se canoniza a tabla.id"""
+        if nodo is None or nodo.tipo != 'columna':
+            raise NoSoportada("se esperaba una columna")
+        calificador, columna = nodo.valor
+        if calificador is not None:
+            tabla = self.alias.get(calificador)
+            if tabla is None:
+                raise NoSoportada(f"alias {calificador}")
+        else:
+            candidatas = {tabla for tabla in self.alias.values() if columna in self._columnas(tabla)}
+            if len(candidatas) != 1:
+                raise NoSoportada(f"columna {columna} ambigua o desconocida")
+            tabla, = candidatas
+        if columna not in self._columnas(tabla):
+            raise NoSoportada(f"columna {tabla}.{columna}")
+        if not sin_canonizar:
+            for destino, origen in self.camino.items():
+                if origen == (tabla, columna):
+                    return ('col', destino, 'id')
+        return ('col', tabla, columna)
+
+    def _columnas(self, tabla):
+        return {nombre for nombre, _, _ in self.esquema[tabla]['columnas']}
+
+    # SELECT, GROUP BY, ORDER BY
+    def _dimension(self, nodo):
+        if nodo is None:
+            raise NoSoportada("expresión no soportada")
+        if nodo.tipo == 'columna':
+            return self._columna(nodo)
+        if nodo.tipo == 'funcion' and nodo.valor == 'date' and len(nodo.args) == 1:
+            return ('fecha', '%Y-%m-%d', self._columna(nodo.args[0]))
+        if (nodo.tipo == 'funcion' and nodo.valor == 'strftime' and len(nodo.args) == 2
+                and nodo.args[0].tipo == 'literal' and isinstance(nodo.args[0].valor, str)
+                and _FORMATO_FECHA.fullmatch(nodo.args[0].valor)):
+            return ('fecha', nodo.args[0].valor, self._columna(nodo.args[1]))
+        raise NoSoportada("expresión no soportada")
+
+    def _medida(self, nodo):
+        """Expresión compilada si el nodo es una agregación, None si no lo es"""
+        if nodo is None or nodo.tipo != 'funcion':
+            return None
+        if nodo.valor == 'round' and len(nodo.args) in (1, 2):
+            medida = self._medida(nodo.args[0])
+            decimales = nodo.args[1] if len(nodo.args) == 2 else None
+            if medida is None or (decimales is not None and not (decimales.tipo == 'literal'
+                                                                 and isinstance(decimales.valor, int))):
+                raise NoSoportada("ROUND no soportado")
+            return ('round', medida, decimales.valor if decimales else 0)
+        if nodo.valor not in _AGREGADOS or len(nodo.args) != 1:
+            return None
+        arg = nodo.args[0]
+        if arg.tipo == 'todo':
+            if nodo.valor != 'count':
+                raise NoSoportada("* fuera de COUNT")
+            return ('agg', 'count', None)
+        if arg.tipo == 'por':
+            return ('agg', nodo.valor, ('por', self._columna(arg.args[0]), self._columna(arg.args[1])))
+        return ('agg', nodo.valor, self._dimension(arg))
+
+    def _salida(self, tokens):
+        alias = None
+        if len(tokens) >= 2 and _nombre(tokens[-1]) and tokens[-2].valor != '.':
+            alias_token = tokens[-1]
+            tokens = tokens[:-2] if tokens[-2].valor == 'AS' else tokens[:-1]
+            alias = (alias_token.valor if alias_token.tipo == 'identificador'
+                     else self.sql[alias_token.inicio:alias_token.fin])
+        nodo = _nodo(tokens)
+        if nodo is None or nodo.tipo == 'todo':
+            raise NoSoportada("columna de salida no soportada")
+        medida = self._medida(nodo)
+        expr = medida or self._dimension(nodo)
+        if alias is None:
+            # Como SQLite: una columna se llama como la columna; cualquier otra expresión, como su texto
+            alias = nodo.valor[1] if nodo.tipo == 'columna' else self.sql[nodo.inicio:nodo.fin]
+        return Salida(alias, expr, medida is not None, False)
+
+    def _grupo(self, tokens, salidas):
+        nodo = _nodo(tokens)
+        if nodo is not None and nodo.tipo == 'literal' and isinstance(nodo.valor, int):
+            return self._por_posicion(nodo.valor, salidas, agregada=False)
+        if nodo is not None and nodo.tipo == 'columna' and nodo.valor[0] is None:
+            # En GROUP BY un nombre es primero una columna y después un alias del SELECT
+            try:
+                return self._dimension(nodo)
+            except NoSoportada:
+                for salida in salidas:
+                    if salida.nombre.lower() == nodo.valor[1] and not salida.es_medida:
+                        return salida.expr
+                raise
+        return self._dimension(nodo)
+
+    def _por_posicion(self, posicion, salidas, agregada=None):
+        if not 1 <= posicion <= len(salidas) or (agregada is not None and salidas[posicion - 1].es_medida != agregada):
+            raise NoSoportada("posición fuera del SELECT")
+        return salidas[posicion - 1].expr
+
+    def _revisar_agrupada(self, expr, grupos):
+        """Una columna sin agregar debe estar en el GROUP BY o depender de un id agrupado de su tabla"""
+        if expr in grupos:
+            return
+        columna = expr[2] if expr[0] == 'fecha' else expr
+        if ('col', columna[1], 'id') in grupos:
+            return
+        raise NoSoportada("columna sin agregar fuera del GROUP BY")
+
+    def _orden(self, tokens, salidas, grupos):
+        descendente = False
+        if tokens and tokens[-1].valor in ('ASC', 'DESC'):
+            descendente = tokens[-1].valor == 'DESC'
+            tokens = tokens[:-1]
+        if any(token.valor in ('NULLS', 'COLLATE') for token in tokens):
+            raise NoSoportada("NULLS/COLLATE en ORDER BY")
+        nodo = _nodo(tokens)
+        if nodo is not None and nodo.tipo == 'literal' and isinstance(nodo.valor, int):
+            return self._por_posicion(nodo.valor, salidas), descendente
+        if nodo is not None and nodo.tipo == 'columna' and nodo.valor[0] is None:
+            # En ORDER BY un nombre es primero un alias del SELECT
+            for salida in salidas:
+                if salida.nombre.lower() == nodo.valor[1]:
+                    return salida.expr, descendente
+        medida = self._medida(nodo)
+        expr = medida or self._dimension(nodo)
+        if not any(salida.expr == expr for salida in salidas):
+            if medida is None:
+                self._revisar_agrupada(expr, grupos)
+            salidas.append(Salida(None, expr, medida is not None, True))
+        return expr, descendente
+
+    def _condiciones(self, tokens):
+        condiciones = []
+        partes = _separar(tokens, 'AND')
+        i = 0
+        while i < len(partes):
+            parte = partes[i]
+            if any(token.profundidad == parte[0].profundidad and token.valor == 'BETWEEN' for token in parte):
+                # BETWEEN a AND b: el AND separó el límite superior
+                if i + 1 >= len(partes):
+                    raise NoSoportada("BETWEEN incompleto")
+                posicion = next(j for j, token in enumerate(parte) if token.valor == 'BETWEEN')
+                expr = self._dimension(_nodo(parte[:posicion]))
+                desde, hasta = _nodo(parte[posicion + 1:]), _nodo(partes[i + 1])
+                condiciones.append(Condicion(expr, 'between', [self._constante(desde), self._constante(hasta)]))
+                i += 2
+                continue
+            condiciones.append(self._condicion(parte))
+            i += 1
+        return condiciones
+
+    def _condicion(self, tokens):
+        if not tokens:
+            raise NoSoportada("condición vacía")
+        nivel = tokens[0].profundidad
+        for j, token in enumerate(tokens):
+            # NOT solo en IS NOT NULL
+            if token.tipo == 'palabra' and token.valor in _NO_CONDICION and not (
+                    token.valor == 'NOT' and j and tokens[j - 1].valor == 'IS'):
+                raise NoSoportada(f"{token.valor} en WHERE")
+        for j, token in enumerate(tokens):
+            if token.profundidad != nivel:
+                continue
+            if token.valor == 'IS':
+                negada = j + 1 < len(tokens) and tokens[j + 1].valor == 'NOT'
+                resto = tokens[j + 2:] if negada else tokens[j + 1:]
+                if len(resto) != 1 or resto[0].valor != 'NULL':
+                    raise NoSoportada("IS no soportado")
+                return Condicion(self._dimension(_nodo(tokens[:j])), 'is not' if negada else 'is', [])
+            if token.valor == 'IN':
+                lista = tokens[j + 1:]
+                if len(lista) < 2 or lista[0].valor != '(' or lista[-1].valor != ')':
+                    raise NoSoportada("IN no soportado")
+                constantes = [self._constante(_nodo(parte)) for parte in _separar(lista[1:-1], ',')]
+                return Condicion(self._dimension(_nodo(tokens[:j])), 'in', constantes)
+            if token.tipo == 'operador' and token.valor in _OPERADORES:
+                izquierda, derecha = _nodo(tokens[:j]), _nodo(tokens[j + 1:])
+                operador = token.valor
+                if izquierda is not None and _es_constante(izquierda):
+                    # 'x' = columna: se da vuelta
+                    izquierda, derecha = derecha, izquierda
+                    operador = {'<': '>', '<=': '>=', '>': '<', '>=': '<='}.get(operador, operador)
+                return Condicion(self._dimension(izquierda), operador, [self._constante(derecha)])
+        raise NoSoportada("condición no soportada")
+
+    def _constante(self, nodo):
+        if nodo is None or not _es_constante(nodo):
+            raise NoSoportada("se esperaba una constante")
+        return nodo if nodo.tipo != 'literal' else nodo.valor
+
+    def _limite(self, tokens):
+        if tokens is None:
+            return None, 0
+        numeros = [token for token in tokens if token.tipo == 'numero' and token.valor.isdigit()]
+        if len(tokens) == 1 and len(numeros) == 1:
+            return int(numeros[0].valor), 0
+        if len(tokens) == 3 and len(numeros) == 2 and tokens[1].valor in ('OFFSET', ','):
+            primero, segundo = int(tokens[0].valor), int(tokens[2].valor)
+            return (primero, segundo) if tokens[1].valor == 'OFFSET' else (segundo, primero)
+        raise NoSoportada("LIMIT no soportado")
+
+
+# ---------------------------------------------------------------------------------------------------------
+# Ejecución vectorizada
+# ---------------------------------------------------------------------------------------------------------
+
+class _Vector:
+    """Una expresión evaluada sobre las filas de la tabla de hechos.
+
+    Las dimensiones van como códigos sobre un diccionario ordenado como ordena SQLite (NULL primero), así
+    el código sirve a la vez de clave de grupo y de orden; las columnas numéricas, como arrays con su máscara
+    de NULL.
+    """
+    __slots__ = ('codigos', 'diccionario', 'numeros', 'nulos')
+
+    def __init__(self, codigos=None, diccionario=None, numeros=None, nulos=None):
+        self.codigos = codigos
+        self.diccionario = diccionario
+        self.numeros = numeros
+        self.nulos = nulos
+
+    @classmethod
+    def desde_codigos(cls, codigos, diccionario):
+        """Reordena un diccionario cualquiera al orden de SQLite"""
+        ordenado = sorted(set(diccionario), key=_orden_sqlite)
+        if ordenado == list(diccionario):
+            return cls(codigos=codigos, diccionario=ordenado)
+        posicion = {valor: i for i, valor in enumerate(ordenado)}
+        mapa = np.array([posicion[valor] for valor in diccionario] + [-1], dtype=np.int32)
+        return cls(codigos=mapa[codigos], diccionario=ordenado)
+
+    def como_dimension(self):
+        if self.codigos is not None:
+            return self
+        numeros, nulos = self.numeros, self.nulos
+        if np.issubdtype(numeros.dtype, np.integer) and len(numeros):
+            validos = numeros if nulos is None else numeros[~nulos]
+            minimo = int(validos.min()) if len(validos) else 0
+            maximo = int(validos.max()) if len(validos) else 0
+            if maximo - minimo <= 2_000_000:
+                codigos = (numeros - minimo + 1).astype(np.int64)
+                diccionario = [None] + list(range(minimo, maximo + 1))
+                if nulos is not None:
+                    codigos[nulos] = 0
+                return _Vector(codigos=codigos, diccionario=diccionario)
+        unicos, codigos = np.unique(numeros, return_inverse=True)
+        diccionario = [None] + unicos.tolist()
+        codigos = codigos + 1
+        if nulos is not None:
+            codigos[nulos] = 0
+        return _Vector(codigos=codigos, diccionario=diccionario)
+
+    def como_numeros(self):
+        if self.numeros is not None:
+            return self.numeros, self.nulos
+        if not all(valor is None or isinstance(valor, (int, float)) for valor in self.diccionario):
+            raise NoSoportada("agregación numérica sobre texto")
+        enteros = all(valor is None or isinstance(valor, int) for valor in self.diccionario)
+        valores = np.array([(0 if enteros else np.nan) if valor is None else valor for valor in self.diccionario] + [0],
+                           dtype=np.int64 if enteros else np.float64)
+        if None not in self.diccionario:
+            return valores[self.codigos], None
+        nulos = np.array([valor is None for valor in self.diccionario] + [True])
+        return valores[self.codigos], nulos[self.codigos]
+
+    def no_nulos(self):
+        """Máscara de las filas que no son NULL"""
+        if self.codigos is not None:
+            if self.diccionario and self.diccionario[0] is None:
+                return self.codigos > 0
+            return np.ones(len(self.codigos), bool)
+        return np.ones(len(self.numeros), bool) if self.nulos is None else ~self.nulos
+
+    def filtrar(self, mascara):
+        if self.codigos is not None:
+            return _Vector(codigos=self.codigos[mascara], diccionario=self.diccionario)
+        return _Vector(numeros=self.numeros[mascara], nulos=None if self.nulos is None else self.nulos[mascara])
+
+
+def _comparar(valor, operador, constante):
+    """Comparación de SQLite entre un valor de la columna y una constante (NULL nunca cumple)"""
+    if valor is None or constante is None:
+        return False
+    if isinstance(valor, str) != isinstance(constante, str):
+        # SQLite aplicaría la afinidad de la columna: no se imita
+        raise NoSoportada("comparación entre texto y número")
+    return _OPERADORES[operador](valor, constante)
+
+
+class _SQLiteMemoria(threading.local):
+    """Conexión en memoria por hilo para lo que conviene que calcule SQLite mismo (fechas, ROUND)"""
+
+    @property
+    def conexion(self):
+        if not hasattr(self, '_conexion'):
+            self._conexion = sqlite3.connect(':memory:')
+        return self._conexion
+
+
+_memoria = _SQLiteMemoria()
+
+
+class _Ejecucion:
+    """Una consulta planificada contra una copia abierta"""
+
+    def __init__(self, motor, sql, plan, columnas, manifiesto, versiones):
+        self.motor = motor
+        self.sql = sql
+        self.plan = plan
+        self.columnas = columnas[plan.hechos]
+        self.manifiesto = manifiesto
+        self.versiones = versiones
+        self._vectores = {}
+        self._ids = {}
+
+    def vector(self, expr):
+        if expr not in self._vectores:
+            self._vectores[expr] = self._calcular(expr)
+        return self._vectores[expr]
+
+    def _calcular(self, expr):
+        if expr[0] == 'fecha':
+            return self._formatear_fecha(self.vector(expr[2]), expr[1])
+        _, tabla, columna = expr
+        if tabla == 'ventas' and self.plan.hechos == 'detalles_venta':
+            if columna not in VENTA_EN_DETALLE:
+                # total repetido por cada línea de la venta: SQLite lo sumaría varias veces
+                raise NoSoportada(f"ventas.{columna} en una consulta por línea de detalle")
+            tabla, columna = self.plan.hechos, VENTA_EN_DETALLE[columna]
+        if tabla == self.plan.hechos:
+            return self._columna_hechos(columna)
+        dimension = self.motor.dimension(tabla, columna, self.versiones.get(tabla))
+        return _Vector(codigos=dimension.codigos[self.ids(tabla)], diccionario=dimension.diccionario)
+
+    def _columna_hechos(self, columna):
+        valores = self.columnas[columna]
+        if columna == 'fecha':
+            minimo, diccionario = self.motor.fechas(self.plan.hechos, self.manifiesto, valores)
+            return _Vector(codigos=valores - minimo, diccionario=diccionario)
+        if columna == 'estado':
+            return _Vector.desde_codigos(valores, self.manifiesto['estados'])
+        return _Vector(numeros=valores, nulos=valores < 0 if columna in _NULABLES else None)
+
+    def _formatear_fecha(self, vector, formato):
+        # strftime de SQLite y de Python coinciden en %Y, %m y %d, los únicos que acepta el planificador
+        if not all(valor is None or (isinstance(valor, str) and _FECHA.fullmatch(valor)) for valor in vector.diccionario):
+            raise NoSoportada("función de fecha sobre valores que no son YYYY-MM-DD")
+        nuevos = [None if valor is None else date.fromisoformat(valor).strftime(formato)
+                  for valor in vector.diccionario]
+        return _Vector.desde_codigos(vector.codigos, nuevos)
+
+    def ids(self, tabla):
+        """Id de la fila de `tabla` unida a cada fila de hechos (-1 si no hay)"""
+        if tabla not in self._ids:
+            origen, columna = self.plan.uniones[tabla]
+            if origen == self.plan.hechos or (origen == 'ventas' and self.plan.hechos == 'detalles_venta'):
+                ids = np.asarray(self.vector(('col', origen, columna)).numeros)
+            else:
+                referidos = self.motor.dimension(origen, columna, self.versiones.get(origen))
+                ids = referidos.enteros[referidos.codigos[self.ids(origen)]]
+            self._ids[tabla] = ids
+        return self._ids[tabla]
+
+    def mascara(self):
+        """Filas que sobreviven a los JOIN (INNER) y al WHERE, o None si todas"""
+        mascara = None
+        for tabla in self.plan.uniones:
+            if tabla == 'ventas' and self.plan.hechos == 'detalles_venta':
+                continue  # la copia de detalles ya es el JOIN con ventas
+            existe = self.motor.dimension(tabla, 'id', self.versiones.get(tabla)).codigos[self.ids(tabla)] >= 0
+            mascara = existe if mascara is None else mascara & existe
+        for condicion in self.plan.condiciones:
+            cumple = self._condicion(condicion)
+            mascara = cumple if mascara is None else mascara & cumple
+        return mascara
+
+    def _condicion(self, condicion):
+        vector = self.vector(condicion.expr)
+        constantes = [self._evaluar(constante) for constante in condicion.constantes]
+        if condicion.expr[0] == 'col' and any(isinstance(constante, str) and not _FECHA.fullmatch(constante)
+                                              for constante in constantes):
+            # Contra una columna de afinidad numérica (fecha DATE es NUMERIC) SQLite convierte '2025' en el
+            # entero 2025, y todo texto es mayor que un número; solo una fecha YYYY-MM-DD queda como texto
+            if _afinidad_numerica(self._tipo_declarado(*condicion.expr[1:])):
+                raise NoSoportada("texto que no es YYYY-MM-DD contra una columna de afinidad numérica")
+        if vector.codigos is None and condicion.operador not in ('is', 'is not'):
+            if not all(isinstance(constante, (int, float)) for constante in constantes):
+                raise NoSoportada("comparación entre número y texto")
+            numeros = vector.numeros
+            if condicion.operador == 'in':
+                cumple = np.isin(numeros, constantes)
+            elif condicion.operador == 'between':
+                cumple = (numeros >= constantes[0]) & (numeros <= constantes[1])
+            else:
+                cumple = _OPERADORES[condicion.operador](numeros, constantes[0])
+            return cumple if vector.nulos is None else cumple & ~vector.nulos
+        if vector.codigos is None:
+            nulos = vector.nulos if vector.nulos is not None else np.zeros(len(vector.numeros), bool)
+            return nulos if condicion.operador == 'is' else ~nulos
+        # Dimensiones: se evalúa una vez por valor del diccionario y se expande por código
+        if condicion.operador == 'is':
+            tabla = [valor is None for valor in vector.diccionario]
+        elif condicion.operador == 'is not':
+            tabla = [valor is not None for valor in vector.diccionario]
+        elif condicion.operador == 'in':
+            tabla = [any(_comparar(valor, '=', constante) for constante in constantes) for valor in vector.diccionario]
+        elif condicion.operador == 'between':
+            tabla = [_comparar(valor, '>=', constantes[0]) and _comparar(valor, '<=', constantes[1])
+                     for valor in vector.diccionario]
+        else:
+            tabla = [_comparar(valor, condicion.operador, constantes[0]) for valor in vector.diccionario]
+        return np.array(tabla + [False], dtype=bool)[vector.codigos]
+
+    def _tipo_declarado(self, tabla, columna):
+        """Tipo declarado de la columna en SQLite; 'NUMERIC' si no se encuentra, para no suponer texto"""
+        for nombre, tipo, _ in self.motor.bd.introspeccionar_esquema().get(tabla, {}).get('columnas', ()):
+            if nombre == columna:
+                return tipo
+        return 'NUMERIC'
+
+    def _evaluar(self, constante):
+        """Valor de una constante; las funciones de fecha las calcula SQLite (incluye 'now')"""
+        if not isinstance(constante, Nodo):
+            return constante
+        return _memoria.conexion.execute(f"SELECT {self.sql[constante.inicio:constante.fin]}").fetchone()[0]
+
+    def resolver(self):
+        plan = self.plan
+        mascara = self.mascara()
+        filas = len(self.columnas['id'])
+
+        # Clave de grupo: códigos de cada dimensión del GROUP BY en base mixta (el orden de la clave es el de SQLite)
+        dimensiones = [self.vector(expr).como_dimension() for expr in plan.grupos]
+        if mascara is not None:
+            dimensiones = [vector.filtrar(mascara) for vector in dimensiones]
+            filas = int(mascara.sum())
+        tamanos = [len(vector.diccionario) for vector in dimensiones]
+        clave = np.zeros(filas, dtype=np.int64)
+        for vector, tamano in zip(dimensiones, tamanos):
+            clave = clave * tamano + vector.codigos
+        total_claves = 1
+        for tamano in tamanos:
+            total_claves *= tamano
+        if total_claves > 2**62:
+            raise NoSoportada("demasiadas combinaciones de grupos")
+        if total_claves <= 8_000_000:
+            presentes = np.flatnonzero(np.bincount(clave, minlength=total_claves))
+            posicion = np.full(total_claves, -1, dtype=np.int64)
+            posicion[presentes] = np.arange(len(presentes))
+            grupo = posicion[clave]
+        else:
+            presentes, grupo = np.unique(clave, return_inverse=True)
+        grupos = len(presentes)
+        if not plan.grupos:
+            # Agregación sin GROUP BY: siempre una fila, aunque no haya datos
+            presentes, grupos = np.zeros(1, dtype=np.int64), 1
+            grupo = np.zeros(filas, dtype=np.int64)
+
+        # Códigos de cada dimensión por grupo, decodificados de la clave
+        codigos_grupo = {}
+        divisor = 1
+        for expr, vector, tamano in reversed(list(zip(plan.grupos, dimensiones, tamanos))):
+            codigos_grupo[expr] = ((presentes // divisor) % tamano, vector.diccionario)
+            divisor *= tamano
+
+        valores = []  # por salida: (lista de valores por grupo, clave de orden por grupo)
+        for salida in plan.salidas:
+            if salida.es_medida:
+                valores.append(self._medida(salida.expr, grupo, grupos, mascara))
+            else:
+                valores.append(self._dimension_grupo(salida.expr, codigos_grupo, grupo, grupos, mascara))
+
+        orden = np.arange(grupos)
+        fin = grupos if plan.limite is None or plan.limite < 0 else min(grupos, plan.desplazamiento + plan.limite)
+        if plan.orden:
+            claves = []
+            for expr, descendente in reversed(plan.orden):
+                indice = next(i for i, salida in enumerate(plan.salidas) if salida.expr == expr)
+                clave_orden = valores[indice][1]
+                claves.append(-clave_orden if descendente else clave_orden)
+            orden = np.lexsort(claves)
+            # El orden de los empates depende de cómo SQLite arma cada consulta: si se ven en el resultado
+            # (o deciden qué filas entran en el LIMIT), la consulta va a SQLite
+            empates = np.ones(max(grupos - 1, 0), dtype=bool)
+            for clave_orden in claves:
+                ordenada = clave_orden[orden]
+                empates &= ordenada[1:] == ordenada[:-1]
+            if empates[max(plan.desplazamiento - 1, 0):fin].any():
+                raise NoSoportada("empates en el ORDER BY")
+        orden = orden[plan.desplazamiento:fin]
+        visibles = [i for i, salida in enumerate(plan.salidas) if not salida.oculta]
+        columnas = [valores[i][0] for i in visibles]
+        datos = [tuple(columna[j] for columna in columnas) for j in orden.tolist()]
+        return {'datos': datos, 'columnas': [plan.salidas[i].nombre for i in visibles]}
+
+    def _dimension_grupo(self, expr, codigos_grupo, grupo, grupos, mascara):
+        if expr in codigos_grupo:
+            codigos, diccionario = codigos_grupo[expr]
+        else:
+            # Depende de un id agrupado: cualquier fila del grupo tiene el mismo valor; se toma la primera
+            vector = self.vector(expr).como_dimension()
+            if mascara is not None:
+                vector = vector.filtrar(mascara)
+            primera = np.full(grupos, len(grupo), dtype=np.int64)
+            np.minimum.at(primera, grupo, np.arange(len(grupo)))
+            codigos, diccionario = vector.codigos[primera], vector.diccionario
+        lista = [diccionario[codigo] for codigo in codigos.tolist()]
+        return lista, np.asarray(codigos, dtype=np.float64)
+
+    def _medida(self, expr, grupo, grupos, mascara):
+        if expr[0] == 'round':
+            lista, _ = self._medida(expr[1], grupo, grupos, mascara)
+            # El ROUND de SQLite redondea distinto que el de Python en los empates: lo calcula SQLite
+            redondeados = [fila[0] for fila in _memoria.conexion.execute(
+                "SELECT round(value, ?) FROM json_each(?)", (expr[2], json.dumps(lista)))]
+            return redondeados, _clave_orden(redondeados)
+        _, funcion, arg = expr
+        if arg is None:
+            conteos = np.bincount(grupo, minlength=grupos)
+            lista = conteos.tolist()
+            return lista, conteos.astype(np.float64)
+        if arg[0] == 'por':
+            a, nulos_a = self.vector(arg[1]).como_numeros()
+            b, nulos_b = self.vector(arg[2]).como_numeros()
+            if np.issubdtype(a.dtype, np.integer) and np.issubdtype(b.dtype, np.integer):
+                numeros = a.astype(np.int64) * b.astype(np.int64)
+            else:
+                numeros = a.astype(np.float64) * b
+            nulos = nulos_a if nulos_b is None else nulos_b if nulos_a is None else nulos_a | nulos_b
+            vector = _Vector(numeros=numeros, nulos=nulos)
+        else:
+            vector = self.vector(arg)
+        if mascara is not None:
+            vector = vector.filtrar(mascara)
+
+        if funcion in ('min', 'max') and vector.codigos is not None:
+            # Sobre el código: el diccionario ya está en el orden de SQLite
+            codigos = vector.codigos.astype(np.int64)
+            validos = vector.no_nulos()
+            inicial = len(vector.diccionario) if funcion == 'min' else -1
+            resultado = np.full(grupos, inicial, dtype=np.int64)
+            (np.minimum if funcion == 'min' else np.maximum).at(resultado, grupo[validos], codigos[validos])
+            vacios = (resultado < 0) | (resultado >= len(vector.diccionario))
+            lista = [None if vacio else vector.diccionario[codigo]
+                     for codigo, vacio in zip(resultado.tolist(), vacios.tolist())]
+            return lista, np.where(vacios, -np.inf, resultado)
+
+        presentes = vector.no_nulos()
+        no_nulos = np.bincount(grupo[presentes], minlength=grupos)
+        if funcion == 'count':
+            return no_nulos.tolist(), no_nulos.astype(np.float64)
+        numeros, _ = vector.como_numeros()
+        enteros = np.issubdtype(numeros.dtype, np.integer)
+        if funcion in ('sum', 'avg'):
+            sumas = np.bincount(grupo[presentes], weights=numeros[presentes], minlength=grupos)
+            if funcion == 'avg':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    sumas = sumas / no_nulos
+                lista = [float(valor) if cantidad else None for valor, cantidad in zip(sumas.tolist(), no_nulos.tolist())]
+            else:
+                lista = [(int(valor) if enteros else valor) if cantidad else None
+                         for valor, cantidad in zip(sumas.tolist(), no_nulos.tolist())]
+            return lista, _clave_orden(lista)
+        inicial = np.inf if funcion == 'min' else -np.inf
+        resultado = np.full(grupos, inicial)
+        (np.minimum if funcion == 'min' else np.maximum).at(resultado, grupo[presentes], numeros[presentes])
+        lista = [((int(valor) if enteros else valor) if cantidad else None)
+                 for valor, cantidad in zip(resultado.tolist(), no_nulos.tolist())]
+        return lista, _clave_orden(lista)
+
+
+def _clave_orden(lista):
+    """Clave numérica de orden para valores de medida (NULL primero, como en SQLite)"""
+    return np.array([-np.inf if valor is None else valor for valor in lista], dtype=np.float64)
+
+
+# Valores de una columna de una tabla de dimensión: codigos[id] es el código del valor de la fila con ese id
+# (-1 si no existe, también en la última posición para los id -1) y enteros[código] el valor como entero
+Dimension = namedtuple('Dimension', ['codigos', 'diccionario', 'enteros'])
+
+
+class MotorColumnar:
+    """Ejecuta con numpy, sobre la InstantaneaColumnar, los SELECT de agregación que resuelve igual que SQLite"""
+
+    def __init__(self, bd, directorio=None, max_filas_en_linea=50_000, max_planes=1024, metricas=None):
+        self.bd = bd
+        self.instantanea = InstantaneaColumnar(bd, directorio)
+        # Hasta esta cantidad de filas nuevas la copia se pone al día dentro de la consulta; con más, en otro hilo
+        self.max_filas_en_linea = max_filas_en_linea
+        self.max_planes = max_planes
+        self.metricas = metricas
+        self._planes = OrderedDict()  # SQL -> Plan o None
+        self._esquema = None
+        self._dimensiones = {}  # (tabla, columna) -> (versión, Dimension)
+        self._fechas = (None, 0, [])
+        self._bloqueo = threading.Lock()
+        self._en_fondo = None
+        if metricas is not None:
+            metricas.describir('agente_columnar_total', 'counter',
+                               "Consultas de agregación por resultado en el motor columnar "
+                               "('desactualizada' = fueron a SQLite mientras la copia se ponía al día)")
+
+    @staticmethod
+    def disponible():
+        """True si numpy está instalado"""
+        return np is not None
+
+    def preparar(self):
+        """Crea o pone al día la copia columnar; retorna sus filas por tabla"""
+        manifiesto = self.instantanea.actualizar()
+        return {tabla: estado['filas'] for tabla, estado in manifiesto['tablas'].items()}
+
+    def planificar(self, sql):
+        """Plan del SQL, o None si no es una agregación que el motor sepa ejecutar"""
+        esquema = self.bd.introspeccionar_esquema()
+        with self._bloqueo:
+            if self._esquema is not esquema:
+                self._planes.clear()
+                self._dimensiones.clear()
+                self._esquema = esquema
+            if sql in self._planes:
+                self._planes.move_to_end(sql)
+                return self._planes[sql]
+        try:
+            plan = _Planificador(sql, esquema).planificar()
+        except NoSoportada as e:
+            registro.debug("Consulta fuera del motor columnar (%s): %s", e, sql)
+            plan = None
+        with self._bloqueo:
+            self._planes[sql] = plan
+            while len(self._planes) > self.max_planes:
+                self._planes.popitem(last=False)
+        return plan
+
+    def ejecutar(self, sql, parametros=(), versiones=None, medicion=None):
+        """Resultado como el de BaseDatos.ejecutar_consulta, o None si la consulta debe ir a SQLite"""
+        if parametros:
+            return None
+        plan = self.planificar(sql)
+        if plan is None:
+            return None
+        versiones = versiones or self.bd.versiones_tablas()
+        manifiesto, columnas = self._copia_al_dia(versiones)
+        if manifiesto is None:
+            self._contar('desactualizada')
+            return None
+        inicio = time.perf_counter()
+        try:
+            resultado = _Ejecucion(self, sql, plan, columnas, manifiesto, versiones).resolver()
+        except NoSoportada as e:
+            registro.debug("Consulta devuelta a SQLite (%s): %s", e, sql)
+            self._contar('no_soportada')
+            return None
+        if medicion is not None:
+            medicion.agregar('ejecucion', time.perf_counter() - inicio)
+        self._contar('ok')
+        return resultado
+
+    def _contar(self, resultado):
+        if self.metricas is not None:
+            self.metricas.incrementar('agente_columnar_total', resultado=resultado)
+
+    def _copia_al_dia(self, versiones):
+        """(manifiesto, columnas) de una copia al menos tan nueva como `versiones`, o (None, None)"""
+        manifiesto, columnas = self.instantanea.copia()
+        if manifiesto is None or not _al_dia(manifiesto, versiones):
+            # Otro proceso pudo haberla actualizado
+            self.instantanea.abrir()
+            manifiesto, columnas = self.instantanea.copia()
+        if manifiesto is not None and _al_dia(manifiesto, versiones):
+            return manifiesto, columnas
+        if self._en_fondo is not None and self._en_fondo.is_alive():
+            return None, None
+        if manifiesto is not None and self._pocas_filas_nuevas(manifiesto):
+            self.instantanea.actualizar()
+            manifiesto, columnas = self.instantanea.copia()
+            return (manifiesto, columnas) if _al_dia(manifiesto, versiones) else (None, None)
+        self._en_fondo = threading.Thread(target=self._actualizar_en_fondo, name="columnar", daemon=True)
+        self._en_fondo.start()
+        return None, None
+
+    def _pocas_filas_nuevas(self, manifiesto):
+        """True si desde la copia solo hubo INSERT, y no más de max_filas_en_linea"""
+        reescrituras = self.bd.reescrituras_tablas()
+        if any(reescrituras.get(tabla) != manifiesto['reescrituras'].get(tabla) for tabla in COLUMNAS):
+            return False
+        ultimos = self.bd.ejecutar_consulta(
+            "SELECT (SELECT COALESCE(MAX(id), 0) FROM ventas), (SELECT COALESCE(MAX(id), 0) FROM detalles_venta)")
+        if not ultimos:
+            return False
+        nuevas = sum(ultimo - manifiesto['tablas'][tabla]['ultimo_id']
+                     for tabla, ultimo in zip(COLUMNAS, ultimos['datos'][0]))
+        return nuevas <= self.max_filas_en_linea
+
+    def _actualizar_en_fondo(self):
+        inicio = time.perf_counter()
+        try:
+            manifiesto = self.instantanea.actualizar()
+            registro.info("Copia columnar al día en %.2fs (%s)", time.perf_counter() - inicio,
+                          ', '.join(f"{estado['filas']:,} {tabla}" for tabla, estado in manifiesto['tablas'].items()))
+        except Exception:
+            registro.exception("No se pudo actualizar la copia columnar")
+
+    def fechas(self, tabla, manifiesto, valores):
+        """(primer día, ['YYYY-MM-DD' de cada día hasta el último]) de la columna fecha de la copia"""
+        clave = (tabla, manifiesto['generacion'], manifiesto['tablas'][tabla]['filas'])
+        guardadas = self._fechas
+        if guardadas[0] != clave:
+            minimo, maximo = (int(valores.min()), int(valores.max())) if len(valores) else (0, -1)
+            guardadas = self._fechas = (clave, minimo, [_texto_fecha(dia) for dia in range(minimo, maximo + 1)])
+        return guardadas[1], guardadas[2]
+
+    def dimension(self, tabla, columna, version):
+        """Dimension de tabla.columna, recargada de SQLite cuando cambia la versión de la tabla"""
+        clave = (tabla, columna)
+        guardada = self._dimensiones.get(clave)
+        if guardada is not None and guardada[0] == version:
+            return guardada[1]
+        resultado = self.bd.ejecutar_consulta(f"SELECT id, {columna} FROM {tabla}")
+        if resultado is None:
+            raise NoSoportada(f"no se pudo leer {tabla}.{columna}")
+        filas = resultado['datos']
+        diccionario = sorted({valor for _, valor in filas}, key=_orden_sqlite)
+        posicion = {valor: i for i, valor in enumerate(diccionario)}
+        maximo = max((id_ for id_, _ in filas), default=0)
+        codigos = np.full(maximo + 2, -1, dtype=np.int32)
+        if filas:
+            codigos[np.array([id_ for id_, _ in filas])] = [posicion[valor] for _, valor in filas]
+        enteros = np.array([valor if isinstance(valor, int) else -1 for valor in diccionario] + [-1], dtype=np.int64)
+        dimension = Dimension(codigos, diccionario, enteros)
+        with self._bloqueo:
+            self._dimensiones[clave] = (version, dimension)
+        return dimension
+
+
+def _al_dia(manifiesto, versiones):
+    return all(manifiesto['versiones'].get(tabla, -1) >= versiones.get(tabla, 0) for tabla in COLUMNAS)
@@ -0,0 +1,374 @@
+# paginacion.py
+# Paginación por clave (keyset/seek) del resultado de un SELECT ya validado: cada página pide las filas
+# posteriores a la última entregada en vez de saltarse las anteriores con OFFSET, así la página 10.000
+# cuesta lo mismo que la primera. Los tokens de página son opacos y no guardan estado en el servidor:
+# llevan el SQL, sus parámetros y la clave de la última fila, y sirven en cualquier proceso del pre-fork.
+import base64
+import hashlib
+import json
+import threading
+from collections import OrderedDict, namedtuple
+
+from validador_sql import ErrorTokenizador, separar_limite, tokenizar
+
+# Una expresión de la clave de orden; nula indica si puede valer NULL
+Clave = namedtuple('Clave', ['expr', 'descendente', 'nula'])
+
+# modo es 'clave' u 'offset'. En modo clave: partes (lista del SELECT, FROM, WHERE o None) y claves
+# reescriben la consulta; consultas cachea el SQL de cada combinación de claves nulas (en modo offset,
+# el único SQL va en la entrada None). tope es el LIMIT de la pregunta (total entre todas las páginas) o None.
+PlanPagina = namedtuple('PlanPagina', ['modo', 'partes', 'claves', 'tope', 'consultas'])
+
+# desde es cuántas filas se entregaron antes de esta página; siguiente es None en la última
+Pagina = namedtuple('Pagina', ['columnas', 'filas', 'siguiente', 'desde', 'modo'])
+
+_AGREGADOS = {'COUNT', 'SUM', 'AVG', 'MIN', 'MAX', 'TOTAL', 'GROUP_CONCAT', 'STRING_AGG'}
+
+# Cláusulas del SELECT externo que impiden reescribirlo: la clave de una fila deja de ser sus columnas
+_SIN_CLAVE = {'GROUP', 'HAVING', 'WINDOW', 'UNION', 'EXCEPT', 'INTERSECT', 'OVER'}
+
+# Uniones cuyas filas pueden no tener rowid de un lado (NULL)
+_UNIONES_EXTERNAS = {'LEFT', 'RIGHT', 'FULL', 'OUTER'}
+
+# Palabras que pueden seguir a una tabla del FROM y no son su alias
+_NO_ALIAS = _UNIONES_EXTERNAS | {'JOIN', 'ON', 'USING', 'NATURAL', 'INNER', 'CROSS', 'INDEXED', 'NOT'}
+
+_PREFIJO_OCULTA = '_pagina_'
+
+
+def _sin_alias(elemento):
+    """(expresión, alias o None) de un elemento de la lista del SELECT"""
+    if len(elemento) >= 3 and elemento[-2].valor == 'AS':
+        return elemento[:-2], elemento[-1].valor.lower()
+    if (len(elemento) >= 2 and elemento[-1].tipo in ('palabra', 'identificador') and elemento[-1].valor != 'END'
+            and elemento[-2].tipo != 'operador' and elemento[-2].valor != 'COLLATE'):
+        return elemento[:-1], elemento[-1].valor.lower()
+    return elemento, None
+
+
+def _separar(tokens, separador=','):
+    """Parte una lista de tokens en los `separador` de su propio nivel de paréntesis"""
+    if not tokens:
+        return []
+    nivel = tokens[0].profundidad
+    grupos = [[]]
+    for token in tokens:
+        if token.profundidad == nivel and token.valor == separador:
+            grupos.append([])
+        else:
+            grupos[-1].append(token)
+    return grupos
+
+
+class Paginador:
+    """Pagina SELECT validados con una clave estable: las expresiones de su ORDER BY y el rowid de cada
+    tabla del FROM. La reescritura de cada SQL se hace una vez y queda en una cache LRU.
+
+    Lo que no se puede reescribir así (GROUP BY, DISTINCT, agregados, UNION, subconsultas o funciones
+    en el FROM, LEFT JOIN, tablas WITHOUT ROWID) se pagina con OFFSET. Un LIMIT igual al tope del
+    validador (`limite_filas`) es el tope por respuesta, que aquí pone cada página, y no limita el total.
+    """
+
+    def __init__(self, bd, limite_filas=10000, tamano=100, max_tamano=1000, max_planes=1024, metricas=None):
+        self.bd = bd
+        self.limite_filas = limite_filas
+        self.tamano = tamano
+        self.max_tamano = max_tamano
+        self.max_planes = max_planes
+        self.metricas = metricas
+        self._planes = OrderedDict()  # sha1 del SQL -> PlanPagina
+        self._no_nulas = {}  # tabla -> columnas que no pueden valer NULL
+        self._esquema = None
+        self._bloqueo = threading.Lock()
+        if metricas is not None:
+            metricas.describir('agente_paginas_total', 'counter', "Páginas entregadas por modo (clave u offset)")
+
+    def planificar(self, sql, marcadores=0):
+        """PlanPagina del SQL, reescrito la primera vez y después desde la cache"""
+        clave = hashlib.sha1(f"{marcadores}:{sql}".encode('utf-8')).hexdigest()
+        # Índices y columnas cambian el plan: un cambio de esquema vacía la cache
+        esquema = self.bd.introspeccionar_esquema()
+        with self._bloqueo:
+            if self._esquema is not esquema:
+                self._planes.clear()
+                self._no_nulas.clear()
+                self._esquema = esquema
+            plan = self._planes.get(clave)
+            if plan is not None:
+                self._planes.move_to_end(clave)
+                return plan
+
+        plan = self._planificar(sql, marcadores, esquema)
+        with self._bloqueo:
+            self._planes[clave] = plan
+            while len(self._planes) > self.max_planes:
+                self._planes.popitem(last=False)
+        return plan
+
+    def _planificar(self, sql, marcadores, esquema):
+        try:
+            tokens = tokenizar(sql)
+        except ErrorTokenizador:
+            tokens = []
+        while tokens and tokens[-1].valor == ';':
+            tokens.pop()
+        tope, sin_tope = separar_limite(tokens, self.limite_filas)
+        # Sin tope el total lo decide el paginador: el LIMIT del validador se quita también en modo offset
+        base = sql[tokens[0].inicio:sin_tope[-1].fin] if tokens and sin_tope and tope is None else sql
+        offset = PlanPagina('offset', None, None, tope, {None: (f"SELECT * FROM ({base}) LIMIT ? OFFSET ?", [])})
+        tokens = sin_tope
+        if len(tokens) < 2 or tokens[0].valor != 'SELECT' or tokens[1].valor in ('DISTINCT', 'ALL'):
+            return offset
+        if any(token.profundidad == 0 and token.valor in _SIN_CLAVE for token in tokens):
+            return offset
+        if any(token.profundidad == 0 and token.valor in _AGREGADOS and tokens[i + 1].valor == '('
+               for i, token in enumerate(tokens[:-1])):
+            return offset
+
+        # Cláusulas del SELECT externo: SELECT lista FROM tablas [WHERE condición] [ORDER BY términos]
+        posiciones = {token.valor: i for i, token in enumerate(tokens)
+                      if token.profundidad == 0 and token.valor in ('FROM', 'WHERE', 'ORDER')}
+        if 'FROM' not in posiciones:
+            return offset
+        fin_from = posiciones.get('WHERE', posiciones.get('ORDER', len(tokens)))
+        fin_where = posiciones.get('ORDER', len(tokens))
+        lista = tokens[1:posiciones['FROM']]
+        desde = tokens[posiciones['FROM'] + 1:fin_from]
+        condicion = tokens[posiciones['WHERE'] + 1:fin_where] if 'WHERE' in posiciones else None
+        orden = tokens[posiciones['ORDER'] + 2:] if 'ORDER' in posiciones else []
+
+        variables = self._variables_from(desde)
+        if not variables:
+            return offset
+        claves = self._claves_orden(sql, orden, lista, variables, esquema)
+        if claves is None:
+            return offset
+        # El rowid de cada tabla desempata y hace única la clave; una PK entera ya ordenada ya lo es
+        descendente = claves[-1].descendente if claves else False
+        for variable, (tabla, cubierta) in variables.items():
+            if not cubierta:
+                claves.append(Clave(f'"{variable}".rowid', descendente, False))
+
+        texto = lambda parte: sql[parte[0].inicio:parte[-1].fin]
+        plan = PlanPagina('clave', (texto(lista), texto(desde), condicion and texto(condicion)), claves, tope, {})
+        # Vistas, tablas WITHOUT ROWID o expresiones que SQLite no acepta en el WHERE: OFFSET
+        consulta, indices = self._consulta(plan, [None if clave.nula else 0 for clave in claves])
+        parametros = (None,) * marcadores + (0,) * len(indices) + (1,)
+        if self.bd.explicar(consulta, parametros, avisar=False) is None:
+            return offset
+        return plan
+
+    def _variables_from(self, desde):
+        """{nombre con que se refiere la tabla: (tabla, False)} del FROM externo, o None si no es paginable"""
+        variables = {}
+        esperando_tabla = True
+        i = 0
+        while i < len(desde):
+            token = desde[i]
+            if token.profundidad != 0:
+                i += 1
+                continue
+            if token.valor in _UNIONES_EXTERNAS:
+                return None
+            if token.valor in (',', 'JOIN'):
+                esperando_tabla = True
+            elif token.valor in ('ON', 'USING'):
+                esperando_tabla = False
+            elif esperando_tabla:
+                if token.valor == '(' or token.tipo not in ('palabra', 'identificador'):
+                    return None
+                if i + 2 < len(desde) and desde[i + 1].valor == '.':
+                    i += 2
+                tabla = desde[i].valor.lower()
+                if i + 1 < len(desde) and desde[i + 1].valor == '(':
+                    # Función de tabla (json_each, ...)
+                    return None
+                nombre = tabla
+                siguiente = i + 1
+                if siguiente < len(desde) and desde[siguiente].valor == 'AS':
+                    siguiente += 1
+                if (siguiente < len(desde) and desde[siguiente].tipo in ('palabra', 'identificador')
+                        and desde[siguiente].valor not in _NO_ALIAS):
+                    nombre = desde[siguiente].valor.lower()
+                    i = siguiente
+                variables[nombre] = (tabla, False)
+                esperando_tabla = False
+            i += 1
+        return variables
+
+    def _claves_orden(self, sql, orden, lista, variables, esquema):
+        """Claves de los términos del ORDER BY (alias y números resueltos a su expresión), o None"""
+        elementos = [_sin_alias(elemento) for elemento in _separar(lista)]
+        alias = {nombre: expresion for expresion, nombre in elementos if nombre}
+
+        claves = []
+        for termino in _separar(orden):
+            descendente = False
+            if termino and termino[-1].valor in ('ASC', 'DESC'):
+                descendente = termino.pop().valor == 'DESC'
+            if not termino or any(token.valor == 'NULLS' for token in termino):
+                return None
+            if len(termino) == 1 and termino[0].tipo == 'numero':
+                numero = int(termino[0].valor, 0)
+                if not 1 <= numero <= len(elementos):
+                    return None
+                termino = elementos[numero - 1][0]
+                if termino and termino[-1].valor == '*':
+                    return None
+            elif len(termino) == 1 and termino[0].valor.lower() in alias:
+                termino = alias[termino[0].valor.lower()]
+            if not termino or any(token.tipo == 'parametro' for token in termino):
+                return None
+            nula = self._nula(termino, variables, esquema)
+            claves.append(Clave(sql[termino[0].inicio:termino[-1].fin], descendente, nula))
+        return claves
+
+    def _nula(self, termino, variables, esquema):
+        """False si el término es una columna NOT NULL (o la PK entera); marca la tabla si es su PK"""
+        if len(termino) == 3 and termino[1].valor == '.':
+            variable, columna = termino[0].valor.lower(), termino[2].valor.lower()
+            candidatas = [variable] if variable in variables else []
+        elif len(termino) == 1 and termino[0].tipo in ('palabra', 'identificador'):
+            columna = termino[0].valor.lower()
+            candidatas = [variable for variable, (tabla, _) in variables.items()
+                          if any(nombre.lower() == columna for nombre, _, _ in esquema.get(tabla, {}).get('columnas', ()))]
+        else:
+            return True
+        if len(candidatas) != 1:
+            return True
+        tabla = variables[candidatas[0]][0]
+        no_nulas, pk = self._columnas_no_nulas(tabla)
+        if columna == pk:
+            variables[candidatas[0]] = (tabla, True)
+        return columna not in no_nulas
+
+    def _columnas_no_nulas(self, tabla):
+        """(columnas NOT NULL, nombre de la PK entera o None) de la tabla"""
+        with self._bloqueo:
+            cacheado = self._no_nulas.get(tabla)
+        if cacheado is None:
+            resultado = self.bd.ejecutar_consulta(
+                'SELECT name, "notnull", pk, type FROM pragma_table_info(?)', (tabla,))
+            filas = resultado['datos'] if resultado else []
+            pks = [nombre.lower() for nombre, _, pk, tipo in filas if pk]
+            # Una INTEGER PRIMARY KEY sola es el rowid: nunca es NULL
+            pk = pks[0] if len(pks) == 1 and any(nombre.lower() == pks[0] and tipo.upper() == 'INTEGER'
+                                                 for nombre, _, _, tipo in filas) else None
+            cacheado = ({nombre.lower() for nombre, no_nula, _, _ in filas if no_nula} | ({pk} if pk else set()), pk)
+            with self._bloqueo:
+                self._no_nulas[tabla] = cacheado
+        return cacheado
+
+    def _consulta(self, plan, clave):
+        """(SQL, índices de la clave en el orden de sus ?) de la página que sigue a `clave` (None: la primera)"""
+        mascara = None if clave is None else tuple(valor is None for valor in clave)
+        cacheada = plan.consultas.get(mascara)
+        if cacheada is not None:
+            return cacheada
+        lista, desde, condicion = plan.partes
+        ocultas = ', '.join(f"{clave.expr} AS {_PREFIJO_OCULTA}{i}" for i, clave in enumerate(plan.claves))
+        orden = ', '.join(f"{clave.expr}{' DESC' if clave.descendente else ''}" for clave in plan.claves)
+        condiciones = [f"({condicion})"] if condicion else []
+        indices = []
+        if mascara is not None:
+            seek, indices = self._seek(plan.claves, mascara)
+            condiciones.append(seek)
+        donde = f" WHERE {' AND '.join(condiciones)}" if condiciones else ''
+        cacheada = (f"SELECT {lista}, {ocultas} FROM {desde}{donde} ORDER BY {orden} LIMIT ?", indices)
+        plan.consultas[mascara] = cacheada
+        return cacheada
+
+    def _seek(self, claves, nulos):
+        """Condición "fila posterior a la clave" con el orden de SQLite (NULL antes que todo en ASC)"""
+        indices = []
+        opciones = []
+        for i, clave in enumerate(claves):
+            partes = []
+            parametros = []
+            for j in range(i):
+                if nulos[j]:
+                    partes.append(f"{claves[j].expr} IS NULL")
+                else:
+                    partes.append(f"{claves[j].expr} = ?")
+                    parametros.append(j)
+            if nulos[i]:
+                if clave.descendente:
+                    # En DESC los NULL van al final: después de un NULL solo hay otros NULL
+                    continue
+                partes.append(f"{clave.expr} IS NOT NULL")
+            elif clave.descendente:
+                partes.append(f"({clave.expr} < ? OR {clave.expr} IS NULL)" if clave.nula else f"{clave.expr} < ?")
+                parametros.append(i)
+            else:
+                partes.append(f"{clave.expr} > ?")
+                parametros.append(i)
+            opciones.append(f"({' AND '.join(partes)})")
+            indices.extend(parametros)
+        if not opciones:
+            return "0", []
+        seek = f"({' OR '.join(opciones)})"
+        # La cota redundante sobre la primera clave deja a SQLite recorrer el índice desde ahí
+        primera = claves[0]
+        if not nulos[0] and not (primera.descendente and primera.nula):
+            seek = f"{primera.expr} {'<=' if primera.descendente else '>='} ? AND {seek}"
+            indices = [0] + indices
+        return seek, indices
+
+    def pagina(self, sql, parametros=(), tamano=None, posicion=None, presupuesto=None, medicion=None):
+        """Pagina con hasta `tamano` filas a partir de `posicion` ((emitidas, clave) de leer_token).
+
+        Retorna None si SQLite no pudo ejecutar la consulta; un PresupuestoExcedido se propaga.
+        """
+        plan = self.planificar(sql, len(parametros))
+        emitidas, clave = posicion or (0, None)
+        tamano = max(1, min(int(tamano or self.tamano), self.max_tamano))
+        # Una fila de más dice si hay otra página sin contar el resultado
+        pedir = tamano + 1 if plan.tope is None else min(tamano + 1, plan.tope - emitidas)
+        if pedir <= 0:
+            return Pagina([], [], None, emitidas, plan.modo)
+
+        if plan.modo == 'clave':
+            if clave is not None and len(clave) != len(plan.claves):
+                raise ValueError("token de página inválido")
+            consulta, indices = self._consulta(plan, clave)
+            valores = tuple(parametros) + tuple(clave[i] for i in indices) + (pedir,)
+        else:
+            consulta = plan.consultas[None][0]
+            valores = tuple(parametros) + (pedir, emitidas)
+        resultado = self.bd.ejecutar_consulta(consulta, valores, medicion, presupuesto)
+        if resultado is None:
+            return None
+        if self.metricas is not None:
+            self.metricas.incrementar('agente_paginas_total', modo=plan.modo)
+
+        filas = resultado['datos'][:tamano]
+        columnas = resultado['columnas']
+        siguiente = None
+        if plan.modo == 'clave':
+            ocultas = len(plan.claves)
+            columnas = columnas[:-ocultas]
+            if len(resultado['datos']) > tamano:
+                siguiente = self.token(sql, parametros, emitidas + len(filas), list(filas[-1][-ocultas:]))
+            filas = [fila[:-ocultas] for fila in filas]
+        elif len(resultado['datos']) > tamano:
+            siguiente = self.token(sql, parametros, emitidas + len(filas))
+        return Pagina(columnas, filas, siguiente, emitidas, plan.modo)
+
+    def token(self, sql, parametros, emitidas, clave=None):
+        """Token opaco de la página que empieza después de `emitidas` filas (y de la fila con `clave`)"""
+        datos = json.dumps({'sql': sql, 'parametros': list(parametros), 'emitidas': emitidas, 'clave': clave})
+        return base64.urlsafe_b64encode(datos.encode('utf-8')).decode('ascii')
+
+    def leer_token(self, token):
+        """(sql, parametros, posicion) de un token; ValueError si no es un token de página.
+
+        El SQL viaja en el token: quien lo ejecuta debe volver a validarlo.
+        """
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+            clave = datos.get('clave')
+            if clave is not None and not isinstance(clave, list):
+                raise TypeError(clave)
+            return datos['sql'], tuple(datos.get('parametros', ())), (int(datos['emitidas']), clave)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            raise ValueError("token de página inválido") from None
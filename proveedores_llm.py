@@ -0,0 +1,459 @@
+# proveedores_llm.py
+# Backends que convierten una pregunta en SQL y el router que elige cuál usar:
+#  - plantillas: reglas locales deterministas para las intenciones más comunes (sin red, microsegundos)
+#  - groq: el modelo de Groq, con límites de tasa compartidos entre hilos
+#  - stub: el mismo cliente contra servidor_stub_llm, para pruebas de carga y benchmarks sin red
+# Groq y el stub reciben la respuesta con stream=True y la cortan en cuanto llega la sentencia SQL completa.
+import asyncio
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+import httpx
+from groq import AsyncGroq, Groq, RateLimitError
+
+from cache_consultas import normalizar_pregunta
+from esquema_prompt import estimar_tokens
+from validador_sql import extraer_sentencia
+
+registro = logging.getLogger(__name__)
+
+# texto: la respuesta cruda (SQL, quizá entre ```); uso: el campo usage del LLM o None
+RespuestaLLM = namedtuple('RespuestaLLM', ['texto', 'proveedor', 'uso'])
+
+# usage de una respuesta cortada antes del chunk final (el único que lo trae), con los tokens estimados
+UsoParcial = namedtuple('UsoParcial', ['prompt_tokens', 'completion_tokens'])
+
+
+def _segundos_groq(valor):
+    """Convierte las duraciones de las cabeceras de Groq ('7.66s', '2m59.56s', '120') a segundos"""
+    if not valor:
+        return 0.0
+    try:
+        return float(valor)
+    except ValueError:
+        pass
+    unidades = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    return sum(float(cantidad) * unidades[unidad] for cantidad, unidad in re.findall(r'([\d.]+)(ms|h|m|s)', valor))
+
+
+class ProveedorLLM:
+    """Interfaz de un backend: `generar` recibe la pregunta y el prompt y retorna una RespuestaLLM"""
+    nombre = 'proveedor'
+    # False si el proveedor resuelve con la pregunta sola: el router no arma el prompt para él
+    usa_prompt = True
+    # Latencia con la que el router lo ordena hasta tener mediciones reales
+    latencia_inicial = 1.0
+
+    def adecuado(self, pregunta):
+        """True si el proveedor sabe responder esta pregunta"""
+        return True
+
+    def generar(self, pregunta, prompt, especular=None):
+        """`especular(sql)`, si el proveedor genera de a poco, recibe cada versión parcial del SQL"""
+        raise NotImplementedError
+
+    async def generar_async(self, pregunta, prompt, especular=None):
+        # Los proveedores locales son instantáneos; los remotos lo redefinen
+        return self.generar(pregunta, prompt, especular)
+
+    def cerrar(self):
+        pass
+
+
+# Tablas que se pueden listar completas: nombre en la pregunta -> (tabla, ORDER BY)
+TABLAS_LISTABLES = {
+    'productos': ('productos', 'nombre'),
+    'clientes': ('clientes', 'nombre'),
+    'empleados': ('empleados', 'nombre'),
+    'proveedores': ('proveedores', 'nombre'),
+    'categorias': ('categorias', 'nombre'),
+    'ventas': ('ventas', 'fecha DESC'),
+}
+
+_VERBO_LISTAR = r'(?:(?:lista(?:r|do)?|muestra(?:me)?|mostrar|ver|dame|cuales son)\s+)?(?:de\s+)?(?:(?:todos|todas)\s+)?(?:(?:los|las)\s+)?'
+
+
+class ProveedorPlantillas(ProveedorLLM):
+    """Reglas locales para las intenciones frecuentes: listados, stock bajo, por ciudad y más vendidos.
+
+    Solo acepta preguntas que coinciden completas con una intención; lo demás lo resuelve otro proveedor.
+    """
+    nombre = 'plantillas'
+    usa_prompt = False
+    latencia_inicial = 0.0001
+
+    def __init__(self, stock_bajo=10, top=10):
+        self.stock_bajo = stock_bajo
+        self.top = top
+        self.intenciones = [
+            (re.compile(rf'{_VERBO_LISTAR}({"|".join(TABLAS_LISTABLES)})'), self._listado),
+            (re.compile(r'(?:(?:los|las)\s+)?productos?\s+(?:con\s+)?(?:poco\s+stock|stock\s+bajo|bajo\s+stock|'
+                        r'stock\s+menor\s+(?:a|de|que)\s+(\d+))'), self._stock_bajo),
+            (re.compile(r'(?:cuant[oa]s\s+)?(clientes|ventas)\s+(?:hay\s+)?por\s+ciudad'), self._por_ciudad),
+            (re.compile(r'(?:(?:cuales\s+son\s+)?(?:los|las)\s+)?(?:top\s+)?(\d+\s+)?productos?\s+(?:mas\s+vendidos?|'
+                        r'que\s+mas\s+se\s+venden)(?:\s+top\s+(\d+))?'), self._mas_vendidos),
+        ]
+
+    def _intencion(self, pregunta):
+        texto = normalizar_pregunta(pregunta)
+        for patron, plantilla in self.intenciones:
+            coincidencia = patron.fullmatch(texto)
+            if coincidencia:
+                return plantilla, coincidencia
+        return None, None
+
+    def adecuado(self, pregunta):
+        return self._intencion(pregunta)[0] is not None
+
+    def generar(self, pregunta, prompt, especular=None):
+        plantilla, coincidencia = self._intencion(pregunta)
+        if plantilla is None:
+            raise ValueError(f"sin plantilla para {pregunta!r}")
+        return RespuestaLLM(plantilla(*coincidencia.groups()), self.nombre, None)
+
+    def _listado(self, nombre):
+        tabla, orden = TABLAS_LISTABLES[nombre]
+        return f"SELECT * FROM {tabla} ORDER BY {orden}"
+
+    def _stock_bajo(self, limite):
+        return f"SELECT nombre, precio, stock FROM productos WHERE stock < {int(limite or self.stock_bajo)} ORDER BY stock"
+
+    def _por_ciudad(self, tabla):
+        if tabla == 'clientes':
+            return "SELECT ciudad, COUNT(*) as clientes FROM clientes GROUP BY ciudad ORDER BY clientes DESC"
+        return ("SELECT c.ciudad, SUM(r.ventas) as ventas, SUM(r.total) as total FROM resumen_ventas_cliente_dia r "
+                "JOIN clientes c ON r.cliente_id = c.id GROUP BY c.ciudad ORDER BY total DESC")
+
+    def _mas_vendidos(self, antes, despues):
+        cantidad = int(antes or despues or self.top)
+        return ("SELECT p.nombre, SUM(r.cantidad) as total_vendido FROM resumen_ventas_producto_dia r "
+                "JOIN productos p ON r.producto_id = p.id GROUP BY p.id, p.nombre "
+                f"ORDER BY total_vendido DESC LIMIT {cantidad}")
+
+
+class _LecturaStream:
+    """Acumula los chunks de una respuesta con stream=True hasta que la sentencia SQL está completa"""
+
+    def __init__(self, especular=None):
+        self.especular = especular
+        self.partes = []
+        self.uso = None
+        self._parcial = None
+
+    def agregar(self, chunk):
+        """Procesa un chunk; retorna True cuando ya llegó la sentencia completa y se puede cortar"""
+        x_groq = getattr(chunk, 'x_groq', None)
+        uso = getattr(x_groq, 'usage', None) or getattr(chunk, 'usage', None)
+        if uso is not None:
+            self.uso = uso
+        contenido = chunk.choices[0].delta.content if chunk.choices else None
+        if not contenido:
+            return False
+        self.partes.append(contenido)
+        sql, completa = extraer_sentencia(''.join(self.partes))
+        if completa:
+            return True
+        if self.especular is not None and sql and sql != self._parcial:
+            self._parcial = sql
+            self.especular(sql)
+        return False
+
+    def respuesta(self, proveedor):
+        texto = ''.join(self.partes)
+        return RespuestaLLM(texto, proveedor, self.uso or UsoParcial(None, estimar_tokens(texto)))
+
+
+class ProveedorGroq(ProveedorLLM):
+    """Modelo de Groq; respeta sus límites de tasa con una pausa compartida entre todos los hilos.
+
+    Con `stream` la respuesta llega por tokens y la conexión se cierra al completarse la sentencia,
+    así el modelo deja de generar (y cobrar) lo que escriba después del ';'.
+    """
+    nombre = 'groq'
+    latencia_inicial = 0.5
+    CONEXIONES_POR_CLIENTE = 16
+
+    def __init__(self, modelo="llama-3.1-8b-instant", temperature=0.1, max_tokens=200, api_key=None,
+                 base_url=None, max_conexiones=200, reintentos=3, metricas=None, stream=True):
+        self.modelo = modelo
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        self.base_url = base_url
+        self.max_conexiones = max_conexiones
+        self.reintentos = reintentos
+        self.metricas = metricas
+        self.stream = stream
+        self.cliente = Groq(api_key=self.api_key, base_url=base_url)
+        self._clientes_async = None
+        self._pausa_hasta = 0.0
+        self._bloqueo_pausa = threading.Lock()
+        if metricas is not None:
+            metricas.describir('agente_llm_limite_tasa_total', 'counter', "Respuestas 429 del LLM")
+            metricas.describir('agente_llm_stream_total', 'counter',
+                               "Respuestas en stream: 'cortada' al completar la sentencia o 'completa'")
+
+    def parametros(self, prompt):
+        """Parámetros de la llamada al modelo, comunes a los clientes sync y async"""
+        return {
+            'messages': [{"role": "user", "content": prompt}],
+            'model': self.modelo,
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens
+        }
+
+    def _pausar(self, segundos):
+        """Pausa compartida: ningún hilo llama al LLM hasta que pase el límite de tasa"""
+        with self._bloqueo_pausa:
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + segundos)
+
+    def _limite_tasa(self, error, intento):
+        """Registra un 429 y retorna cuánto esperar antes del siguiente intento"""
+        espera = _segundos_groq(error.response.headers.get('retry-after')) or 2 ** intento
+        registro.warning("Límite de tasa de %s, reintentando en %.1fs", self.nombre, espera)
+        if self.metricas is not None:
+            self.metricas.incrementar('agente_llm_limite_tasa_total', proveedor=self.nombre)
+        self._pausar(espera)
+        return espera
+
+    def _registrar_stream(self, cortada):
+        if self.metricas is not None:
+            self.metricas.incrementar('agente_llm_stream_total', proveedor=self.nombre,
+                                      resultado='cortada' if cortada else 'completa')
+
+    def _leer_stream(self, stream, especular):
+        lectura = _LecturaStream(especular)
+        cortada = False
+        try:
+            for chunk in stream:
+                if lectura.agregar(chunk):
+                    cortada = True
+                    break
+        finally:
+            stream.close()
+        self._registrar_stream(cortada)
+        return lectura.respuesta(self.nombre)
+
+    def generar(self, pregunta, prompt, especular=None):
+        for intento in range(self.reintentos + 1):
+            espera = self._pausa_hasta - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            try:
+                crudo = self.cliente.chat.completions.with_raw_response.create(stream=self.stream,
+                                                                                **self.parametros(prompt))
+                # Si ya no quedan peticiones en la ventana, frenar a los demás hasta que se reinicie
+                if crudo.headers.get('x-ratelimit-remaining-requests') == '0':
+                    self._pausar(_segundos_groq(crudo.headers.get('x-ratelimit-reset-requests')))
+                respuesta = crudo.parse()
+                if self.stream:
+                    return self._leer_stream(respuesta, especular)
+                return RespuestaLLM(respuesta.choices[0].message.content, self.nombre, getattr(respuesta, 'usage', None))
+            except RateLimitError as e:
+                if intento == self.reintentos:
+                    raise
+                self._limite_tasa(e, intento)
+
+    def _cliente_asincrono(self):
+        """Cliente AsyncGroq con keep-alive, creado al primer uso dentro del event loop"""
+        if self._clientes_async is None:
+            # El pool de httpcore recorre todas sus conexiones en cada petición (costo O(n²)
+            # con cientos en vuelo), así que se reparten entre varios clientes pequeños
+            cantidad = max(1, -(-self.max_conexiones // self.CONEXIONES_POR_CLIENTE))
+            clientes = []
+            for _ in range(cantidad):
+                http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=self.CONEXIONES_POR_CLIENTE,
+                                        max_keepalive_connections=self.CONEXIONES_POR_CLIENTE),
+                    timeout=httpx.Timeout(60.0, connect=5.0, pool=None)
+                )
+                clientes.append(AsyncGroq(api_key=self.api_key, base_url=self.base_url, http_client=http_client))
+            self._clientes_async = itertools.cycle(clientes)
+        return next(self._clientes_async)
+
+    async def _leer_stream_async(self, stream, especular):
+        lectura = _LecturaStream(especular)
+        cortada = False
+        try:
+            async for chunk in stream:
+                if lectura.agregar(chunk):
+                    cortada = True
+                    break
+        finally:
+            await stream.close()
+        self._registrar_stream(cortada)
+        return lectura.respuesta(self.nombre)
+
+    async def generar_async(self, pregunta, prompt, especular=None):
+        # Mismos reintentos y pausa compartida que generar(), esperando sin bloquear el loop
+        for intento in range(self.reintentos + 1):
+            espera = self._pausa_hasta - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            try:
+                crudo = await self._cliente_asincrono().chat.completions.with_raw_response.create(
+                    stream=self.stream, **self.parametros(prompt))
+                if crudo.headers.get('x-ratelimit-remaining-requests') == '0':
+                    self._pausar(_segundos_groq(crudo.headers.get('x-ratelimit-reset-requests')))
+                respuesta = await crudo.parse()
+                if self.stream:
+                    return await self._leer_stream_async(respuesta, especular)
+                return RespuestaLLM(respuesta.choices[0].message.content, self.nombre, getattr(respuesta, 'usage', None))
+            except RateLimitError as e:
+                if intento == self.reintentos:
+                    raise
+                self._limite_tasa(e, intento)
+
+
+class ProveedorStub(ProveedorGroq):
+    """ProveedorGroq contra servidor_stub_llm (mismo cliente y protocolo, sin red); lo levanta si no hay url"""
+    nombre = 'stub'
+    latencia_inicial = 0.2
+
+    def __init__(self, url=None, latencia=0.2, **kwargs):
+        self.servidor = None
+        url = url or os.getenv('LLM_STUB_URL')
+        if url is None:
+            from servidor_stub_llm import ServidorStubLLM
+            self.servidor = ServidorStubLLM(latencia=latencia)
+            url = self.servidor.iniciar()
+        super().__init__(api_key='stub', base_url=url, **kwargs)
+
+    def cerrar(self):
+        if self.servidor is not None:
+            self.servidor.detener()
+            self.servidor = None
+
+
+PROVEEDORES = {
+    'plantillas': ProveedorPlantillas,
+    'groq': ProveedorGroq,
+    'stub': ProveedorStub,
+}
+
+
+def crear_proveedores(nombres, metricas=None, max_conexiones=200):
+    """Instancia proveedores por nombre ('plantillas,groq'), en el orden dado"""
+    proveedores = []
+    for nombre in (n.strip() for n in nombres.split(',')):
+        if not nombre:
+            continue
+        clase = PROVEEDORES.get(nombre)
+        if clase is None:
+            raise ValueError(f"proveedor de LLM desconocido: {nombre!r} (disponibles: {', '.join(PROVEEDORES)})")
+        if issubclass(clase, ProveedorGroq):
+            proveedores.append(clase(max_conexiones=max_conexiones, metricas=metricas))
+        else:
+            proveedores.append(clase())
+    return proveedores
+
+
+class RouterLLM:
+    """Elige el proveedor adecuado más rápido para cada pregunta y pasa al siguiente si falla.
+
+    La latencia de cada proveedor es un promedio móvil de sus llamadas; un proveedor que lanza
+    una excepción queda al final de la lista durante `enfriamiento` segundos.
+    """
+
+    def __init__(self, proveedores, enfriamiento=30.0, alfa=0.2, metricas=None):
+        if not proveedores:
+            raise ValueError("se necesita al menos un proveedor de LLM")
+        self.proveedores = list(proveedores)
+        self.enfriamiento = enfriamiento
+        self.alfa = alfa
+        self.metricas = metricas
+        self.latencias = {proveedor.nombre: proveedor.latencia_inicial for proveedor in self.proveedores}
+        self._fallido_hasta = {}
+        self._bloqueo = threading.Lock()
+        if metricas is not None:
+            metricas.describir('agente_llm_proveedor_total', 'counter', "Llamadas a cada proveedor de LLM por resultado")
+
+    def proveedor(self, nombre):
+        """El proveedor con ese nombre, o None"""
+        return next((proveedor for proveedor in self.proveedores if proveedor.nombre == nombre), None)
+
+    def candidatos(self, pregunta):
+        """Proveedores adecuados para la pregunta: primero los sanos, cada grupo del más rápido al más lento"""
+        ahora = time.monotonic()
+        adecuados = [proveedor for proveedor in self.proveedores if proveedor.adecuado(pregunta)]
+        return sorted(adecuados, key=lambda proveedor: (self._fallido_hasta.get(proveedor.nombre, 0.0) > ahora,
+                                                        self.latencias[proveedor.nombre]))
+
+    def _registrar(self, proveedor, segundos=None, error=None):
+        with self._bloqueo:
+            if error is None:
+                anterior = self.latencias[proveedor.nombre]
+                self.latencias[proveedor.nombre] = anterior + self.alfa * (segundos - anterior)
+                self._fallido_hasta.pop(proveedor.nombre, None)
+            else:
+                self._fallido_hasta[proveedor.nombre] = time.monotonic() + self.enfriamiento
+        if error is not None:
+            registro.warning("Proveedor %s falló, probando el siguiente: %s", proveedor.nombre, error)
+        if self.metricas is not None:
+            self.metricas.incrementar('agente_llm_proveedor_total', proveedor=proveedor.nombre,
+                                      resultado='ok' if error is None else 'error')
+
+    def _preparar(self, proveedor, construir_prompt, prompts):
+        if proveedor.usa_prompt and 'prompt' not in prompts:
+            prompts['prompt'] = construir_prompt()
+        return prompts.get('prompt')
+
+    def respuestas(self, pregunta, construir_prompt, medicion, especular=None):
+        """Generador de RespuestaLLM, una por proveedor candidato, hasta que el llamador deje de pedir.
+
+        El llamador valida cada respuesta y pide la siguiente solo si la rechaza; si ningún proveedor
+        respondió se propaga la última excepción. El prompt se arma una sola vez y solo si hace falta.
+        `especular` pasa a los proveedores que generan en stream (ver ProveedorLLM.generar).
+        """
+        prompts = {}
+        ultimo_error = None
+        entregadas = 0
+        for proveedor in self.candidatos(pregunta):
+            prompt = self._preparar(proveedor, construir_prompt, prompts)
+            inicio = time.perf_counter()
+            try:
+                with medicion.etapa('llm'):
+                    respuesta = proveedor.generar(pregunta, prompt, especular)
+            except Exception as e:
+                self._registrar(proveedor, error=e)
+                ultimo_error = e
+                continue
+            self._registrar(proveedor, time.perf_counter() - inicio)
+            medicion.registrar_tokens(respuesta.uso)
+            entregadas += 1
+            yield respuesta
+        if ultimo_error is not None and not entregadas:
+            raise ultimo_error
+
+    async def respuestas_async(self, pregunta, construir_prompt, medicion, especular=None):
+        """Versión asyncio de respuestas(); `construir_prompt` retorna un awaitable con el prompt"""
+        prompts = {}
+        ultimo_error = None
+        entregadas = 0
+        for proveedor in self.candidatos(pregunta):
+            if proveedor.usa_prompt and 'prompt' not in prompts:
+                prompts['prompt'] = await construir_prompt()
+            prompt = prompts.get('prompt')
+            inicio = time.perf_counter()
+            try:
+                with medicion.etapa('llm'):
+                    respuesta = await proveedor.generar_async(pregunta, prompt, especular)
+            except Exception as e:
+                self._registrar(proveedor, error=e)
+                ultimo_error = e
+                continue
+            self._registrar(proveedor, time.perf_counter() - inicio)
+            medicion.registrar_tokens(respuesta.uso)
+            entregadas += 1
+            yield respuesta
+        if ultimo_error is not None and not entregadas:
+            raise ultimo_error
+
+    def cerrar(self):
+        for proveedor in self.proveedores:
+            proveedor.cerrar()
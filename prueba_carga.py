@@ -0,0 +1,90 @@
+# prueba_carga.py
+# Compara throughput y p99 del camino síncrono (hilos WSGI) contra procesar_pregunta_async,
+# usando servidor_stub_llm en lugar de Groq.
+import argparse
+import asyncio
+import contextlib
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metricas import resumen_latencias
+from servidor_stub_llm import ServidorStubLLM
+
+
+def _crear_agente(directorio):
+    from agente_ia import AgenteIA
+    from cache_consultas import CachePreguntas, CacheResultados
+
+    agente = AgenteIA(archivo_bd=os.path.join(directorio, "ventas.db"))
+    # Sin caches: cada pregunta debe llegar al LLM y a SQLite
+    agente.cache_preguntas = CachePreguntas(max_entradas=0)
+    agente.cache_resultados = CacheResultados(max_bytes=0)
+    return agente
+
+
+def medir_sincrono(agente, preguntas, hilos):
+    latencias = []
+
+    def una(pregunta):
+        inicio = time.perf_counter()
+        agente.procesar_pregunta(pregunta)
+        latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        list(executor.map(una, preguntas))
+    return resumen_latencias(f"sync ({hilos} hilos)", latencias, time.perf_counter() - inicio)
+
+
+async def _medir_asincrono(agente, preguntas, concurrencia):
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias = []
+
+    async def una(pregunta):
+        async with semaforo:
+            inicio = time.perf_counter()
+            await agente.procesar_pregunta_async(pregunta)
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una(p) for p in preguntas))
+    return resumen_latencias(f"async ({concurrencia} en vuelo)", latencias, time.perf_counter() - inicio)
+
+
+def medir_asincrono(agente, preguntas, concurrencia):
+    return asyncio.run(_medir_asincrono(agente, preguntas, concurrencia))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga sync vs async con LLM stub")
+    parser.add_argument('--peticiones', type=int, default=500)
+    parser.add_argument('--hilos', type=int, default=16, help="hilos del servidor WSGI simulado")
+    parser.add_argument('--concurrencia', type=int, default=200, help="preguntas en vuelo en modo async")
+    parser.add_argument('--latencia', type=float, default=0.2, help="latencia del LLM stub en segundos")
+    args = parser.parse_args()
+
+    stub = ServidorStubLLM(latencia=args.latencia)
+    os.environ['GROQ_BASE_URL'] = stub.iniciar()
+    os.environ.setdefault('GROQ_API_KEY', 'stub')
+
+    preguntas = [f"pregunta de carga {i}" for i in range(args.peticiones)]
+    with tempfile.TemporaryDirectory() as directorio:
+        with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+            agente = _crear_agente(directorio)
+            resultados = [
+                medir_sincrono(agente, preguntas, args.hilos),
+                medir_asincrono(agente, preguntas, args.concurrencia),
+            ]
+        agente.bd.cerrar()
+    stub.detener()
+
+    print(f"LLM stub: {args.latencia * 1000:.0f} ms por respuesta, {args.peticiones} peticiones")
+    print(f"{'modo':<24}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for r in resultados:
+        print(f"{r['modo']:<24}{r['throughput']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# prueba_prefork.py
+# Throughput de servidor_prefork por número de procesos, con servidor_stub_llm en lugar de Groq.
+# Cada pregunta es distinta y las caches del agente están apagadas, así que todas pasan por
+# prompt, LLM stub, validación, SQLite y render.
+# Ejemplo: python prueba_prefork.py --procesos 1 2 4 --peticiones 2000
+import argparse
+import contextlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from metricas import resumen_latencias
+from servidor_stub_llm import ServidorStubLLM
+
+
+def _servir(procesos, archivo_bd, listo):
+    """Proceso del servidor: importa la app (crea la base), apaga caches y lanza el pre-fork"""
+    os.environ['ARCHIVO_BD'] = archivo_bd
+    os.environ['NIVEL_LOG'] = 'WARNING'
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        from app_principal import agente, app
+        from cache_consultas import CachePreguntas, CacheResultados
+        from servidor_prefork import ServidorPrefork
+
+        # Sin caches de preguntas ni resultados: cada pregunta recorre todo el camino
+        agente.cache_preguntas = CachePreguntas(max_entradas=0)
+        agente.cache_resultados = CacheResultados(max_bytes=0)
+        servidor = ServidorPrefork(app, agente, '127.0.0.1', 0, procesos)
+        servidor.iniciar()
+    listo.put(servidor.puerto)
+    servidor.supervisar()
+
+
+def esperar_listo(url, timeout=30.0):
+    """Espera a que /listo responda 200"""
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        with contextlib.suppress(httpx.HTTPError):
+            if httpx.get(f"{url}/listo").status_code == 200:
+                return
+        time.sleep(0.05)
+    raise TimeoutError("el servidor no quedó listo")
+
+
+def medir(url, preguntas, concurrencia):
+    latencias = []
+    cliente = httpx.Client(base_url=url, timeout=30.0,
+                           limits=httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia))
+
+    def una(pregunta):
+        inicio = time.perf_counter()
+        respuesta = cliente.post('/preguntar', json={'pregunta': pregunta})
+        respuesta.raise_for_status()
+        latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+        list(executor.map(una, preguntas))
+    duracion = time.perf_counter() - inicio
+    cliente.close()
+    return latencias, duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput por proceso de servidor_prefork con LLM stub")
+    parser.add_argument('--procesos', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--peticiones', type=int, default=1000)
+    parser.add_argument('--concurrencia', type=int, default=32, help="peticiones en vuelo del cliente")
+    parser.add_argument('--latencia', type=float, default=0.05, help="latencia del LLM stub en segundos")
+    parser.add_argument('--bd', default='ventas.db', help="base a copiar para cada corrida")
+    args = parser.parse_args()
+
+    stub = ServidorStubLLM(latencia=args.latencia)
+    os.environ['GROQ_BASE_URL'] = stub.iniciar()
+    os.environ.setdefault('GROQ_API_KEY', 'stub')
+    contexto = multiprocessing.get_context('fork')
+
+    print(f"{os.cpu_count()} CPU, LLM stub de {args.latencia * 1000:.0f} ms, {args.peticiones} peticiones, "
+          f"{args.concurrencia} en vuelo (el cliente corre en la misma máquina)")
+    print(f"{'procesos':<10}{'req/s':>10}{'req/s/proc':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for procesos in args.procesos:
+        with tempfile.TemporaryDirectory() as directorio:
+            archivo_bd = os.path.join(directorio, 'ventas.db')
+            shutil.copyfile(args.bd, archivo_bd)
+            listo = contexto.Queue()
+            servidor = contexto.Process(target=_servir, args=(procesos, archivo_bd, listo))
+            servidor.start()
+            try:
+                url = f"http://127.0.0.1:{listo.get(timeout=60)}"
+                esperar_listo(url)
+                # Preguntas que no se parecen entre sí, para que ninguna se resuelva sin el LLM
+                preguntas = [f"consulta {i * 7919 % 100003} sobre ventas del lote {i}" for i in range(args.peticiones)]
+                medir(url, preguntas[:args.concurrencia], args.concurrencia)
+                latencias, duracion = medir(url, preguntas, args.concurrencia)
+            finally:
+                servidor.terminate()
+                servidor.join()
+        resumen = resumen_latencias(procesos, latencias, duracion)
+        print(f"{procesos:<10}{resumen['throughput']:>10.1f}{resumen['throughput'] / procesos:>12.1f}"
+              f"{resumen['p50_ms']:>10.1f}{resumen['p99_ms']:>10.1f}")
+    stub.detener()
+
+
+if __name__ == '__main__':
+    main()
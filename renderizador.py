@@ -0,0 +1,89 @@
+# renderizador.py
+# Filas <tr> de la tabla de resultados, armadas por columna: el formato de cada columna se decide una sola vez
+# según los tipos de sus valores, y todas las filas salen de una plantilla compilada con un solo join.
+# Acepta filas (tuplas, como las da sqlite3) o columnas (listas o arreglos NumPy, como las del motor columnar).
+from functools import partial
+from html import escape
+
+# Tipo de una columna según las clases de sus valores (sin contar los NULL); None si mezcla tipos
+TIPOS_COLUMNA = {frozenset(): 'nulo', frozenset({int}): 'entero', frozenset({float}): 'real', frozenset({str}): 'texto'}
+_NULO = type(None)
+_SIN_VALOR = frozenset({_NULO})
+
+# Celda de la plantilla para una columna sin NULL: str.format aplica el formato sin llamar a Python por celda
+_CELDA_PLANTILLA = {'entero': '<td>{{{0}:,}}</td>', 'real': '<td>${{{0}:.2f}}</td>'}
+
+
+def formatear_valor(valor):
+    """Texto de una celda: '-' para NULL, '$' con dos decimales para reales y separador de miles para enteros"""
+    if valor is None:
+        return "-"
+    elif isinstance(valor, float):
+        return f"${valor:.2f}"
+    elif isinstance(valor, int):
+        return f"{valor:,}"
+    else:
+        return str(valor)
+
+
+# Dentro de un <td> basta escapar &, < y >
+_escapar = partial(escape, quote=False)
+
+
+def _celda_html(valor):
+    return _escapar(formatear_valor(valor))
+
+
+# Formato de un valor no NULL de cada tipo, para las columnas con NULL que no entran directo en la plantilla
+_FORMATOS_VALOR = {'entero': '{:,}'.format, 'real': '${:.2f}'.format, 'texto': _escapar}
+
+
+def _requiere_escape(textos):
+    """Si algún texto tiene &, < o >; se revisa la columna unida, sin recorrerla celda por celda en Python"""
+    unido = ''.join(textos)
+    return '&' in unido or '<' in unido or '>' in unido
+
+
+def _celdas(columna, tipo, tiene_nulos):
+    """Textos ya formateados y escapados de una columna que no entra directo en la plantilla"""
+    if tipo is None:
+        return list(map(_celda_html, columna))
+    if tipo == 'texto' and not tiene_nulos:
+        return list(map(_escapar, columna)) if _requiere_escape(columna) else columna
+    formato = _FORMATOS_VALOR[tipo]
+    if tipo == 'texto' and not _requiere_escape(valor for valor in columna if valor is not None):
+        formato = str
+    return ['-' if valor is None else formato(valor) for valor in columna]
+
+
+def tipo_columna(valores):
+    """(tipo, tiene_nulos) de una columna; tipo es None si mezcla tipos, como un SUM que a veces da entero"""
+    clases = frozenset(map(type, valores))
+    return TIPOS_COLUMNA.get(clases - _SIN_VALOR), _NULO in clases
+
+
+def filas_html(filas=(), columnas=None):
+    """HTML de los <tr> de todas las filas, desde `filas` o desde `columnas` (listas o arreglos NumPy)"""
+    if columnas is None:
+        columnas = list(zip(*filas))
+    else:
+        # tolist() pasa un arreglo NumPy a escalares de Python en C; el formato es el mismo que el de las filas
+        columnas = [columna.tolist() if hasattr(columna, 'tolist') else columna for columna in columnas]
+    if not columnas:
+        return ''
+
+    celdas, argumentos = [], []
+    for columna in columnas:
+        tipo, tiene_nulos = tipo_columna(columna)
+        if tipo == 'nulo':
+            celdas.append('<td>-</td>')
+        elif tipo in _CELDA_PLANTILLA and not tiene_nulos:
+            celdas.append(_CELDA_PLANTILLA[tipo].format(len(argumentos)))
+            argumentos.append(columna)
+        else:
+            celdas.append(f'<td>{{{len(argumentos)}}}</td>')
+            argumentos.append(_celdas(columna, tipo, tiene_nulos))
+    plantilla = '<tr>' + ''.join(celdas) + '</tr>'
+    if not argumentos:
+        return plantilla * len(columnas[0])
+    return ''.join(map(plantilla.format, *argumentos))
@@ -0,0 +1,121 @@
+# ruta_rapida.py
+# Ruta rápida sin LLM: reconoce las preguntas que siguen los patrones de los ejemplos del prompt
+# ("ventas de <cliente>", "clientes de <ciudad>", ...) y llena plantillas de SQL con parámetros ?.
+# Los nombres se reconocen contra un índice en memoria de clientes, empleados, categorías y ciudades,
+# así que solo encajan valores que existen en la base y nunca se interpola texto del usuario en el SQL.
+import re
+import threading
+import time
+from collections import namedtuple
+
+from cache_consultas import normalizar_pregunta
+
+# sql lleva un ? por cada valor de `parametros`; intencion es el nombre de la plantilla
+ConsultaRapida = namedtuple('ConsultaRapida', ['intencion', 'sql', 'parametros'])
+
+# Tipo de entidad -> (tabla, columna) de donde se cargan sus valores
+ENTIDADES = {
+    'cliente': ('clientes', 'nombre'),
+    'empleado': ('empleados', 'nombre'),
+    'categoria': ('categorias', 'nombre'),
+    'ciudad': ('clientes', 'ciudad'),
+}
+
+# Verbos y artículos opcionales al inicio de la pregunta ("muéstrame las ventas de ...")
+_PREFIJO = r'(?:(?:muestrame|mostrar|dame|ver|lista(?:r|do)?(?:\s+de)?|cuales\s+son)\s+)?(?:(?:todos|todas)\s+)?(?:(?:los|las)\s+)?'
+
+# (intención, patrón sobre la pregunta normalizada, SQL). Cada patrón tiene un solo grupo, con el nombre
+# del tipo de entidad, y el SQL un solo {marcadores}. Van en orden: "ventas de X" prueba primero
+# X como cliente, después como empleado y por último como ciudad.
+PLANTILLAS = [
+    ('compras_cliente', r'(?:que|lo\s+que)\s+(?:ha\s+)?compr(?:o|ado)\s+(?P<cliente>.+)',
+     "SELECT p.nombre as producto, dv.cantidad, dv.precio_unitario, v.fecha FROM ventas v "
+     "JOIN clientes c ON v.cliente_id = c.id JOIN detalles_venta dv ON v.id = dv.venta_id "
+     "JOIN productos p ON dv.producto_id = p.id WHERE c.nombre IN ({marcadores})"),
+    ('ventas_cliente', r'(?:ventas|compras)\s+(?:de|del\s+cliente)\s+(?P<cliente>.+)',
+     "SELECT v.*, c.nombre as cliente, e.nombre as empleado FROM ventas v JOIN clientes c ON v.cliente_id = c.id "
+     "JOIN empleados e ON v.empleado_id = e.id WHERE c.nombre IN ({marcadores})"),
+    ('ventas_empleado', r'ventas\s+(?:de|del\s+(?:empleado|vendedor)|hechas\s+por)\s+(?P<empleado>.+)',
+     "SELECT v.id, c.nombre as cliente, v.total, v.fecha FROM ventas v JOIN clientes c ON v.cliente_id = c.id "
+     "JOIN empleados e ON v.empleado_id = e.id WHERE e.nombre IN ({marcadores})"),
+    ('ventas_ciudad', r'ventas\s+(?:de|en)\s+(?P<ciudad>.+)',
+     "SELECT v.id, c.nombre as cliente, v.total, v.fecha FROM ventas v JOIN clientes c ON v.cliente_id = c.id "
+     "WHERE c.ciudad IN ({marcadores})"),
+    ('productos_categoria', r'productos\s+(?:de\s+(?:la\s+)?categoria|de)\s+(?P<categoria>.+)',
+     "SELECT p.nombre, p.precio, p.stock FROM productos p JOIN categorias c ON p.categoria_id = c.id "
+     "WHERE c.nombre IN ({marcadores})"),
+    ('clientes_ciudad', r'clientes\s+(?:de|en)\s+(?P<ciudad>.+)',
+     "SELECT nombre, email, telefono FROM clientes WHERE ciudad IN ({marcadores})"),
+]
+
+
+class IndiceEntidades:
+    """Valores de cada tipo de entidad indexados por su texto normalizado (sin tildes ni mayúsculas).
+
+    Se recarga cuando cambia la versión de alguna de sus tablas, revisándola cada `intervalo` segundos.
+    """
+
+    def __init__(self, bd, entidades=None, intervalo=5.0):
+        self.bd = bd
+        self.entidades = entidades or ENTIDADES
+        self.intervalo = intervalo
+        self._indice = {}  # tipo -> texto normalizado -> [valores exactos]
+        self._versiones = None
+        self._revisado = None
+        self._bloqueo = threading.Lock()
+
+    def _cargar(self):
+        indice = {}
+        for tipo, (tabla, columna) in self.entidades.items():
+            valores = indice[tipo] = {}
+            resultado = self.bd.ejecutar_consulta(f"SELECT DISTINCT {columna} FROM {tabla} WHERE {columna} IS NOT NULL")
+            for (valor,) in resultado['datos'] if resultado else ():
+                # Nombres que solo difieren en tildes o mayúsculas comparten entrada
+                valores.setdefault(normalizar_pregunta(valor), []).append(valor)
+        return indice
+
+    def actualizar(self, forzar=False):
+        """Recarga el índice si cambió alguna de sus tablas (o siempre, con `forzar`)"""
+        if not forzar and self._revisado is not None and time.monotonic() - self._revisado < self.intervalo:
+            return
+        with self._bloqueo:
+            if not forzar and self._revisado is not None and time.monotonic() - self._revisado < self.intervalo:
+                return
+            # Las versiones se leen antes de cargar: una escritura en medio provoca otra recarga
+            todas = self.bd.versiones_tablas()
+            versiones = {tabla: todas.get(tabla) for tabla, _ in self.entidades.values()}
+            if forzar or versiones != self._versiones:
+                self._indice = self._cargar()
+                self._versiones = versiones
+            self._revisado = time.monotonic()
+
+    def buscar(self, tipo, texto):
+        """Valores exactos de la entidad cuyo texto normalizado es `texto`, o None"""
+        self.actualizar()
+        return self._indice.get(tipo, {}).get(texto)
+
+    def tamanos(self):
+        """Cantidad de nombres distintos de cada tipo"""
+        return {tipo: len(valores) for tipo, valores in self._indice.items()}
+
+
+class RutaRapida:
+    """Resuelve con plantillas las preguntas parametrizables; las demás siguen hacia el LLM"""
+
+    def __init__(self, indice, plantillas=None):
+        self.indice = indice
+        self.plantillas = [(intencion, re.compile(_PREFIJO + patron), sql)
+                           for intencion, patron, sql in plantillas or PLANTILLAS]
+
+    def resolver(self, pregunta):
+        """ConsultaRapida para la pregunta, o None si no encaja en ninguna plantilla"""
+        texto = normalizar_pregunta(pregunta)
+        for intencion, patron, sql in self.plantillas:
+            coincidencia = patron.fullmatch(texto)
+            if not coincidencia:
+                continue
+            (tipo, nombre), = coincidencia.groupdict().items()
+            valores = self.indice.buscar(tipo, nombre)
+            if valores:
+                return ConsultaRapida(intencion, sql.format(marcadores=', '.join('?' * len(valores))), tuple(valores))
+        return None
@@ -0,0 +1,124 @@
+# servidor_prefork.py
+# Servidor de producción: el padre crea la base, precalienta el agente y abre el socket una sola vez,
+# y luego hace fork de un proceso por núcleo. Los hijos heredan por copy-on-write el esquema, los prompts,
+# las validaciones y las caches ya construidas, y aceptan conexiones del mismo socket.
+# Ejemplo: python servidor_prefork.py --procesos 4 --puerto 5000
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+registro = logging.getLogger(__name__)
+
+
+class ServidorPrefork:
+    """Pre-fork de la app WSGI: un padre que supervisa y `procesos` hijos con servidor de hilos"""
+
+    def __init__(self, app, agente, host='0.0.0.0', puerto=5000, procesos=None, backlog=1024):
+        self.app = app
+        self.agente = agente
+        self.host = host
+        self.puerto = puerto
+        self.procesos = procesos or os.cpu_count() or 1
+        self.backlog = backlog
+        self.socket = None
+        self.hijos = set()
+        self._deteniendo = False
+
+    def iniciar(self):
+        """Precalienta, abre el socket y lanza los hijos; retorna el puerto en que escucha"""
+        informe = self.agente.precalentar()
+        # Ninguna conexión SQLite debe cruzar el fork; cada hijo abre las suyas al primer uso
+        self.agente.bd.reabrir_conexiones()
+        # Lo construido hasta aquí no lo vuelve a recorrer el GC de los hijos, así sus páginas
+        # siguen compartidas en vez de copiarse al actualizar los contadores de referencias del GC
+        gc.freeze()
+
+        self.socket = socket.create_server((self.host, self.puerto), backlog=self.backlog)
+        self.puerto = self.socket.getsockname()[1]
+        for _ in range(self.procesos):
+            self._lanzar_hijo()
+        registro.info("Escuchando en %s:%d con %d procesos (precalentado en %.2fs)",
+                      self.host, self.puerto, self.procesos, sum(informe.values()))
+        return self.puerto
+
+    def _lanzar_hijo(self):
+        pid = os.fork()
+        if pid:
+            self.hijos.add(pid)
+            return pid
+        # Hijo: atiende hasta que el padre lo termine
+        codigo = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            # Sin log de acceso por petición: con varios procesos solo agrega costo y ruido
+            logging.getLogger('werkzeug').setLevel(logging.WARNING)
+            from werkzeug.serving import make_server
+            servidor = make_server(self.host, self.puerto, self.app, threaded=True, fd=self.socket.fileno())
+            servidor.serve_forever()
+        except Exception:
+            registro.exception("El proceso %d terminó con error", os.getpid())
+            codigo = 1
+        finally:
+            os._exit(codigo)
+
+    def supervisar(self):
+        """Bloquea relanzando los hijos que mueran, hasta SIGTERM/SIGINT"""
+        signal.signal(signal.SIGTERM, lambda *_: self.detener())
+        signal.signal(signal.SIGINT, lambda *_: self.detener())
+        while not self._deteniendo:
+            try:
+                pid, estado = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self.hijos.discard(pid)
+            if not self._deteniendo:
+                registro.warning("Proceso %d terminó (estado %d); lanzando otro", pid, estado)
+                time.sleep(0.1)
+                self._lanzar_hijo()
+
+    def detener(self, timeout=5.0):
+        """Termina los hijos (SIGTERM, luego SIGKILL) y cierra el socket"""
+        self._deteniendo = True
+        for pid in list(self.hijos):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                self.hijos.discard(pid)
+        limite = time.monotonic() + timeout
+        while self.hijos and time.monotonic() < limite:
+            for pid in list(self.hijos):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        self.hijos.discard(pid)
+                except ChildProcessError:
+                    self.hijos.discard(pid)
+            time.sleep(0.05)
+        for pid in self.hijos:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.hijos.clear()
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servidor pre-fork del agente de ventas")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--puerto', type=int, default=5000)
+    parser.add_argument('--procesos', type=int, default=os.cpu_count(), help="por defecto, uno por núcleo")
+    args = parser.parse_args()
+
+    # Importar la app crea la base y el agente una sola vez, en el padre
+    from app_principal import agente, app
+
+    servidor = ServidorPrefork(app, agente, args.host, args.puerto, args.procesos)
+    servidor.iniciar()
+    servidor.supervisar()
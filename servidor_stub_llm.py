@@ -0,0 +1,169 @@
+# servidor_stub_llm.py
+# Servidor HTTP local que imita la API de chat de Groq para pruebas de carga sin red.
+# Es asyncio puro: cientos de conexiones keep-alive en vuelo no cuestan un hilo cada una.
+import asyncio
+import json
+import multiprocessing
+import re
+import socket
+import time
+
+SQL_POR_DEFECTO = "SELECT * FROM productos LIMIT 5"
+
+
+def _respuesta_fija(prompt):
+    return SQL_POR_DEFECTO
+
+
+def _cuerpo_respuesta(peticion, contenido, prompt):
+    return json.dumps({
+        'id': 'stub',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': peticion.get('model', 'stub'),
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': contenido},
+            'finish_reason': 'stop'
+        }],
+        'usage': {
+            'prompt_tokens': len(prompt) // 4,
+            'completion_tokens': len(contenido) // 4,
+            'total_tokens': (len(prompt) + len(contenido)) // 4
+        }
+    }).encode('utf-8')
+
+
+def _evento_sse(peticion, delta, finish_reason=None, uso=None):
+    """Un chunk chat.completion.chunk en formato server-sent events"""
+    chunk = {
+        'id': 'stub',
+        'object': 'chat.completion.chunk',
+        'created': int(time.time()),
+        'model': peticion.get('model', 'stub'),
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+    }
+    if uso is not None:
+        chunk['x_groq'] = {'usage': uso}
+    return b"data: " + json.dumps(chunk).encode('utf-8') + b"\n\n"
+
+
+def _trozos(contenido):
+    """Divide la respuesta como un tokenizador: cada palabra o signo con el espacio que lo precede"""
+    return re.findall(r'\s*(?:\w+|[^\w\s]+)|\s+$', contenido)
+
+
+def _fragmento_http(datos):
+    return b"%x\r\n" % len(datos) + datos + b"\r\n"
+
+
+class ServidorStubLLM:
+    """Stub compatible con /openai/v1/chat/completions con latencia configurable.
+
+    latencia es el tiempo fijo hasta la respuesta (o el primer token con stream=True),
+    latencia_token_prompt modela el prefill (segundos por token de prompt) y
+    latencia_token el tiempo de generar cada token (con stream, el tiempo entre chunks).
+    """
+
+    def __init__(self, puerto=0, latencia=0.2, responder=_respuesta_fija, latencia_token_prompt=0.0,
+                 latencia_token=0.0):
+        self.latencia = latencia
+        self.responder = responder
+        self.latencia_token_prompt = latencia_token_prompt
+        self.latencia_token = latencia_token
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(('127.0.0.1', puerto))
+        self._socket.listen(1024)
+        self._proceso = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._socket.getsockname()[1]}"
+
+    async def _atender(self, lector, escritor):
+        try:
+            while True:
+                cabeceras = await lector.readuntil(b"\r\n\r\n")
+                longitud = 0
+                for linea in cabeceras.split(b"\r\n"):
+                    if linea.lower().startswith(b"content-length:"):
+                        longitud = int(linea.split(b":", 1)[1])
+                peticion = json.loads(await lector.readexactly(longitud) or b'{}')
+                prompt = peticion.get('messages', [{}])[-1].get('content', '')
+
+                await asyncio.sleep(self.latencia + self.latencia_token_prompt * (len(prompt) // 4))
+                contenido = self.responder(prompt)
+                if peticion.get('stream'):
+                    await self._responder_stream(escritor, peticion, contenido, prompt)
+                    continue
+                if self.latencia_token:
+                    await asyncio.sleep(self.latencia_token * len(_trozos(contenido)))
+                cuerpo = _cuerpo_respuesta(peticion, contenido, prompt)
+                escritor.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n" % len(cuerpo) + cuerpo
+                )
+                await escritor.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+
+    async def _responder_stream(self, escritor, peticion, contenido, prompt):
+        """Respuesta SSE con un chunk por token, como la API con stream=True"""
+        escritor.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+        for i, trozo in enumerate(_trozos(contenido)):
+            delta = {'content': trozo}
+            if i == 0:
+                delta['role'] = 'assistant'
+            escritor.write(_fragmento_http(_evento_sse(peticion, delta)))
+            await escritor.drain()
+            if self.latencia_token:
+                await asyncio.sleep(self.latencia_token)
+        uso = {
+            'prompt_tokens': len(prompt) // 4,
+            'completion_tokens': len(contenido) // 4,
+            'total_tokens': (len(prompt) + len(contenido)) // 4,
+        }
+        escritor.write(_fragmento_http(_evento_sse(peticion, {}, 'stop', uso)))
+        escritor.write(_fragmento_http(b"data: [DONE]\n\n") + b"0\r\n\r\n")
+        await escritor.drain()
+
+    async def _servir(self):
+        servidor = await asyncio.start_server(self._atender, sock=self._socket)
+        async with servidor:
+            await servidor.serve_forever()
+
+    def servir(self):
+        """Atiende peticiones en el proceso actual hasta que se interrumpa"""
+        asyncio.run(self._servir())
+
+    def iniciar(self):
+        """Arranca el servidor en otro proceso (sin competir por el GIL) y retorna su URL base"""
+        self._proceso = multiprocessing.get_context('fork').Process(target=self.servir, daemon=True)
+        self._proceso.start()
+        return self.url
+
+    def detener(self):
+        if self._proceso is not None:
+            self._proceso.terminate()
+            self._proceso.join()
+            self._proceso = None
+        self._socket.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stub local de la API de Groq")
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--latencia', type=float, default=0.2, help="segundos de espera por respuesta")
+    parser.add_argument('--latencia-token-prompt', type=float, default=0.0, help="segundos de prefill por token de prompt")
+    parser.add_argument('--latencia-token', type=float, default=0.0, help="segundos por token generado")
+    args = parser.parse_args()
+
+    servidor = ServidorStubLLM(args.puerto, args.latencia, latencia_token_prompt=args.latencia_token_prompt,
+                               latencia_token=args.latencia_token)
+    print(f"Stub LLM en {servidor.url} (usar GROQ_BASE_URL={servidor.url})")
+    servidor.servir()
@@ -0,0 +1,57 @@
+# test_cache_consultas.py
+# Invalidación de la cache de resultados por las tablas que lee cada consulta.
+# Ejecutar con: python -m unittest test_cache_consultas
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from base_datos import BaseDatos
+from cache_consultas import CacheResultados, tablas_de_consulta
+
+TABLAS = ['categorias', 'productos', 'clientes', 'empleados', 'ventas', 'detalles_venta']
+
+UNION_CON_COMA = ("SELECT v.id, c.nombre FROM ventas v, clientes c "
+                  "WHERE v.cliente_id = c.id ORDER BY v.id LIMIT 1")
+
+
+class TestTablasDeConsulta(unittest.TestCase):
+
+    def test_union_con_coma_lee_todas_las_tablas(self):
+        self.assertEqual(tablas_de_consulta(UNION_CON_COMA, TABLAS), {'ventas', 'clientes'})
+
+    def test_subconsulta_y_join(self):
+        sql = ("SELECT p.nombre FROM productos p JOIN categorias c ON p.categoria_id = c.id "
+               "WHERE p.id IN (SELECT producto_id FROM detalles_venta) LIMIT 5")
+        self.assertEqual(tablas_de_consulta(sql, TABLAS), {'productos', 'categorias', 'detalles_venta'})
+
+    def test_tabla_desconocida_depende_de_todas(self):
+        sql = "WITH x AS (SELECT id FROM ventas) SELECT * FROM x LIMIT 5"
+        self.assertEqual(tablas_de_consulta(sql, TABLAS), set(TABLAS))
+
+
+class TestInvalidacion(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.archivo = os.path.join(self.directorio.name, 'ventas.db')
+        self.bd = BaseDatos(self.archivo)
+
+    def tearDown(self):
+        self.bd.cerrar()
+        self.directorio.cleanup()
+
+    def test_union_con_coma_se_invalida_al_cambiar_la_segunda_tabla(self):
+        cache = CacheResultados()
+        resultado = self.bd.ejecutar_consulta(UNION_CON_COMA)
+        cache.guardar(UNION_CON_COMA, tablas_de_consulta(UNION_CON_COMA, TABLAS), self.bd.versiones_tablas(), resultado)
+        self.assertIs(cache.obtener(UNION_CON_COMA, self.bd.versiones_tablas()), resultado)
+
+        with sqlite3.connect(self.archivo) as conexion:
+            conexion.execute("UPDATE clientes SET nombre = 'Nombre nuevo'")
+        self.assertIsNone(cache.obtener(UNION_CON_COMA, self.bd.versiones_tablas()))
+        self.assertEqual(self.bd.ejecutar_consulta(UNION_CON_COMA)['datos'][0][1], 'Nombre nuevo')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+# trazas.py
+# Corpus de regresión a partir de preguntas reales: graba por pregunta el SQL, la huella de las filas y los
+# tiempos por etapa; las repite offline con un LLM stub que responde el SQL grabado, y compara dos corridas
+# (resultados iguales y p95 por etapa) para detectar regresiones entre versiones.
+# Grabar en producción: GRABAR_TRAZAS=trazas.jsonl (y GRABAR_TRAZAS_MUESTREO=0.1 para una fracción).
+# Ejemplos:
+#   python trazas.py grabar --salida trazas.jsonl                 # preguntas de ejemplo contra el LLM real
+#   python trazas.py reproducir trazas.jsonl --salida v2.jsonl    # con el código de esta versión
+#   python trazas.py comparar v1.jsonl v2.jsonl --umbral 0.2      # código de salida 1 si hay regresión
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+
+from metricas import muestra, percentil
+
+registro = logging.getLogger(__name__)
+
+
+def huella_filas(filas):
+    """Huella corta de las filas sin importar su orden: SQLite no garantiza el orden de los empates"""
+    return hashlib.sha1('\n'.join(sorted(map(repr, filas))).encode('utf-8')).hexdigest()[:16]
+
+
+def traza(pregunta, medicion):
+    """Registro de una pregunta ya procesada, con los tiempos en ms; medicion.consulta la llena _renderizar"""
+    sql, parametros, resultado = medicion.consulta or (None, (), None)
+    registro_traza = {'pregunta': pregunta, 'sql': sql, 'parametros': list(parametros),
+                      'resultado': medicion.resultado, 'columnas': None, 'filas': None, 'huella': None,
+                      'etapas': {etapa: round(segundos * 1000, 3) for etapa, segundos in medicion.etapas.items()},
+                      'total': round(medicion.total() * 1000, 3)}
+    if resultado is not None:
+        registro_traza.update(columnas=list(resultado['columnas']), filas=len(resultado['datos']),
+                              huella=huella_filas(resultado['datos']))
+    return registro_traza
+
+
+def _abrir(ruta, modo='rt'):
+    """Abre un archivo de trazas, comprimido con gzip si termina en .gz"""
+    if ruta.endswith('.gz'):
+        return gzip.open(ruta, modo, encoding='utf-8')
+    return open(ruta, modo, encoding='utf-8')
+
+
+def leer_trazas(ruta):
+    with _abrir(ruta) as archivo:
+        return [json.loads(linea) for linea in archivo if linea.strip()]
+
+
+class GrabadorTrazas:
+    """Agrega una línea JSON por pregunta a `ruta`, para una fracción `muestreo` de las preguntas.
+
+    Cada línea se escribe con una sola llamada en modo append, así que varios procesos del pre-fork
+    pueden grabar en el mismo archivo. Las filas no se guardan, solo su cantidad y su huella.
+    """
+
+    def __init__(self, ruta, muestreo=1.0):
+        self.ruta = ruta
+        self.muestreo = muestreo
+        self._bloqueo = threading.Lock()
+
+    def grabar(self, pregunta, medicion):
+        if not muestra(self.muestreo):
+            return
+        try:
+            linea = json.dumps(traza(pregunta, medicion), ensure_ascii=False, default=str) + '\n'
+            with self._bloqueo, _abrir(self.ruta, 'at') as archivo:
+                archivo.write(linea)
+        except (OSError, TypeError, ValueError) as e:
+            # Grabar nunca debe romper la respuesta a la pregunta
+            registro.warning("No se pudo grabar la traza de %r: %s", pregunta, e)
+
+
+def responder_grabado(sql_por_pregunta):
+    """responder para servidor_stub_llm: el SQL grabado para la pregunta del prompt, terminado en ';'.
+
+    El prompt termina en `Entrada: "<pregunta>"\nSalida:`. La pregunta puede tener comillas (y hasta
+    `Entrada: "`), así que se toma desde cada `Entrada: "`, de la última hacia atrás, hasta el cierre del
+    prompt, y vale la primera que sea una pregunta grabada.
+    """
+    apertura, cierre = 'Entrada: "', '"\nSalida:'
+
+    def responder(prompt):
+        prompt = prompt.rstrip()
+        fin = len(prompt) - len(cierre) if prompt.endswith(cierre) else len(prompt)
+        inicio = prompt.rfind(apertura, 0, fin)
+        while inicio >= 0:
+            sql = sql_por_pregunta.get(prompt[inicio + len(apertura):fin])
+            if sql:
+                return f"{sql};"
+            inicio = prompt.rfind(apertura, 0, inicio)
+        return ";"
+    return responder
+
+
+def reproducir(trazas, archivo_bd, salida, latencia_llm=0.0):
+    """Repite las preguntas de `trazas` en orden con el código actual y graba las trazas nuevas en `salida`.
+
+    El LLM es servidor_stub_llm respondiendo el SQL grabado, con `latencia_llm` segundos fijos; los
+    demás proveedores de PROVEEDORES_LLM (como las plantillas) se usan como en producción.
+    """
+    from servidor_stub_llm import ServidorStubLLM
+
+    servidor = ServidorStubLLM(latencia=latencia_llm,
+                               responder=responder_grabado({t['pregunta']: t['sql'] for t in trazas if t['sql']}))
+    os.environ['LLM_STUB_URL'] = servidor.iniciar()
+    nombres = [nombre.strip() for nombre in os.getenv('PROVEEDORES_LLM', 'plantillas,groq').split(',')]
+    os.environ['PROVEEDORES_LLM'] = ','.join('stub' if nombre == 'groq' else nombre for nombre in nombres)
+    try:
+        from agente_ia import AgenteIA
+        from metricas import MedicionPregunta
+
+        # Sin precalentar: la cache de preguntas empieza vacía y cada pregunta pasa por el SQL grabado
+        agente = AgenteIA(archivo_bd=archivo_bd)
+        if os.path.exists(salida):
+            os.remove(salida)
+        agente.grabador = GrabadorTrazas(salida)
+        for registro_traza in trazas:
+            agente.procesar_pregunta(registro_traza['pregunta'], MedicionPregunta())
+    finally:
+        servidor.detener()
+    return leer_trazas(salida)
+
+
+def _emparejar(base, nueva):
+    """Pares (base, nueva) por pregunta, en el orden en que aparece cada una"""
+    pendientes = {}
+    for registro_traza in nueva:
+        pendientes.setdefault(registro_traza['pregunta'], []).append(registro_traza)
+    pares = []
+    for registro_traza in base:
+        candidatas = pendientes.get(registro_traza['pregunta'])
+        pares.append((registro_traza, candidatas.pop(0) if candidatas else None))
+    return pares
+
+
+def comparar(base, nueva, umbral=0.2, minimo_ms=1.0):
+    """(diferencias, etapas) entre dos corridas.
+
+    diferencias lista las preguntas cuyo resultado, columnas, cantidad o huella de filas cambió.
+    etapas es {etapa: (p95 base, p95 nueva, regresion)} en ms; hay regresión si el p95 nuevo supera al
+    de base en más de `umbral` (fracción) y en más de `minimo_ms`, para no fallar por ruido en etapas de µs.
+    """
+    diferencias = []
+    tiempos = {}
+    for anterior, actual in _emparejar(base, nueva):
+        if actual is None:
+            diferencias.append((anterior['pregunta'], 'no se repitió'))
+            continue
+        for campo in ('resultado', 'columnas', 'filas', 'huella'):
+            if anterior[campo] != actual[campo]:
+                diferencias.append((anterior['pregunta'], f"{campo}: {anterior[campo]!r} -> {actual[campo]!r}"))
+                break
+        for nombre, registro_traza in (('base', anterior), ('nueva', actual)):
+            for etapa, ms in list(registro_traza['etapas'].items()) + [('total', registro_traza['total'])]:
+                tiempos.setdefault(etapa, {'base': [], 'nueva': []})[nombre].append(ms)
+
+    etapas = {}
+    for etapa, medidas in tiempos.items():
+        # El p95 de cada etapa es sobre las preguntas que pasaron por ella en esa corrida
+        p95_base = percentil(medidas['base'], 95) if medidas['base'] else 0.0
+        p95_nueva = percentil(medidas['nueva'], 95) if medidas['nueva'] else 0.0
+        regresion = p95_nueva > p95_base * (1 + umbral) and p95_nueva - p95_base > minimo_ms
+        etapas[etapa] = (p95_base, p95_nueva, regresion)
+    return diferencias, etapas
+
+
+def preguntas_de_ejemplo():
+    from agente_ia import EJEMPLOS_PROMPT
+    from comparar_prompt import PREGUNTAS_EXTRA
+    return [entrada for entrada, _ in EJEMPLOS_PROMPT] + PREGUNTAS_EXTRA
+
+
+def _grabar(args):
+    from agente_ia import AgenteIA
+    from metricas import MedicionPregunta
+
+    if args.preguntas:
+        with open(args.preguntas, encoding='utf-8') as archivo:
+            preguntas = [linea.strip() for linea in archivo if linea.strip()]
+    else:
+        preguntas = preguntas_de_ejemplo()
+    if os.path.exists(args.salida):
+        os.remove(args.salida)
+    agente = AgenteIA(archivo_bd=args.bd)
+    agente.grabador = GrabadorTrazas(args.salida)
+    for pregunta in preguntas:
+        agente.procesar_pregunta(pregunta, MedicionPregunta())
+    print(f"{len(preguntas)} trazas en {args.salida}")
+
+
+def _reproducir(args):
+    trazas = reproducir(leer_trazas(args.trazas), args.bd, args.salida, args.latencia_llm)
+    print(f"{len(trazas)} trazas repetidas en {args.salida}")
+
+
+def _comparar(args):
+    diferencias, etapas = comparar(leer_trazas(args.base), leer_trazas(args.nueva), args.umbral, args.minimo_ms)
+    for pregunta, detalle in diferencias:
+        print(f"DIFERENTE  {pregunta!r}: {detalle}")
+    print(f"\n{'etapa':<12} {'p95 base ms':>12} {'p95 nueva ms':>13} {'cambio':>8}")
+    for etapa, (p95_base, p95_nueva, regresion) in sorted(etapas.items()):
+        cambio = f"{p95_nueva / p95_base - 1:+.0%}" if p95_base else '-'
+        print(f"{etapa:<12} {p95_base:>12.2f} {p95_nueva:>13.2f} {cambio:>8}{'  REGRESIÓN' if regresion else ''}")
+    regresiones = [etapa for etapa, (_, _, regresion) in etapas.items() if regresion]
+    print(f"\n{len(diferencias)} resultados distintos, {len(regresiones)} etapas con regresión del p95 "
+          f"(umbral {args.umbral:.0%})")
+    return 1 if diferencias or regresiones else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Graba, repite y compara trazas de preguntas")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    grabar = subparsers.add_parser('grabar', help="procesa preguntas con los proveedores reales y graba sus trazas")
+    grabar.add_argument('--preguntas', help="archivo con una pregunta por línea (por defecto, las de ejemplo)")
+    grabar.add_argument('--bd', default='ventas.db')
+    grabar.add_argument('--salida', default='trazas.jsonl')
+    grabar.set_defaults(funcion=_grabar)
+
+    repetir = subparsers.add_parser('reproducir', help="repite las trazas offline con el SQL grabado")
+    repetir.add_argument('trazas')
+    repetir.add_argument('--bd', default='ventas.db')
+    repetir.add_argument('--salida', default='trazas_repetidas.jsonl')
+    repetir.add_argument('--latencia-llm', type=float, default=0.0, help="segundos fijos del LLM stub")
+    repetir.set_defaults(funcion=_reproducir)
+
+    comparar_parser = subparsers.add_parser('comparar', help="compara resultados y p95 por etapa de dos corridas")
+    comparar_parser.add_argument('base')
+    comparar_parser.add_argument('nueva')
+    comparar_parser.add_argument('--umbral', type=float, default=0.2, help="regresión tolerada del p95 (0.2 = 20%%)")
+    comparar_parser.add_argument('--minimo-ms', type=float, default=1.0,
+                                 help="diferencia mínima de p95 en ms para contar como regresión")
+    comparar_parser.set_defaults(funcion=_comparar)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=os.getenv('NIVEL_LOG', 'WARNING'))
+    sys.exit(args.funcion(args) or 0)
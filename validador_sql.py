@@ -0,0 +1,371 @@
+# validador_sql.py
+# Validación del SQL generado por el LLM con un tokenizador propio: solo un SELECT de lectura,
+# con presupuesto de costo (JOINs, LIMIT obligatorio y revisión del EXPLAIN QUERY PLAN).
+import hashlib
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+Validacion = namedtuple('Validacion', ['valido', 'sql', 'motivo'])
+
+Token = namedtuple('Token', ['tipo', 'valor', 'profundidad', 'inicio', 'fin'])
+
+_PATRON_TOKENS = re.compile(r"""
+    (?P<espacio>\s+)
+  | (?P<comentario>--[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<texto>'(?:[^']|'')*'?)
+  | (?P<identificador_citado>"(?:[^"]|"")*"?|`[^`]*`?|\[[^\]]*\]?)
+  | (?P<numero>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|0[xX][0-9a-fA-F]+)
+  | (?P<palabra>[A-Za-z_À-￿][\w$À-￿]*)
+  | (?P<parametro>[?:@$]\w*)
+  | (?P<operador>\|\||<<|>>|<=|>=|==|!=|<>|[-+*/%<>=~&|.])
+  | (?P<puntuacion>[(),;])
+""", re.VERBOSE | re.DOTALL)
+
+# Palabras clave que solo aparecen en sentencias que escriben, cambian el esquema o la conexión
+_PROHIBIDAS = {
+    'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'UPSERT', 'DROP', 'CREATE', 'ALTER', 'ATTACH', 'DETACH',
+    'PRAGMA', 'VACUUM', 'REINDEX', 'ANALYZE', 'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE',
+    'TRUNCATE', 'GRANT', 'REVOKE', 'RECURSIVE',
+}
+
+# Prohibidas como sentencia (REPLACE INTO, INSERT OR REPLACE) pero también nombre de una función escalar
+_PROHIBIDAS_SALVO_FUNCION = {'REPLACE'}
+
+# Funciones con efectos fuera de la consulta (extensiones, archivos)
+_FUNCIONES_PROHIBIDAS = {'load_extension', 'readfile', 'writefile', 'edit', 'fts3_tokenizer'}
+
+# Palabras que cierran la lista de tablas de un FROM
+_FIN_FROM = {'WHERE', 'GROUP', 'ORDER', 'LIMIT', 'HAVING', 'WINDOW', 'UNION', 'EXCEPT', 'INTERSECT'}
+
+# Palabras que pueden seguir a una tabla y no son su alias
+_NO_ALIAS = _FIN_FROM | {'ON', 'USING', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'CROSS', 'NATURAL',
+                         'FULL', 'AS', 'INDEXED', 'NOT'}
+
+
+class ErrorTokenizador(ValueError):
+    pass
+
+
+def tokenizar(sql):
+    """Lista de Token (sin espacios ni comentarios) con la profundidad de paréntesis de cada uno"""
+    tokens = []
+    profundidad = 0
+    posicion = 0
+    while posicion < len(sql):
+        coincidencia = _PATRON_TOKENS.match(sql, posicion)
+        if not coincidencia:
+            raise ErrorTokenizador(f"carácter inesperado {sql[posicion]!r}")
+        inicio, posicion = posicion, coincidencia.end()
+        tipo = coincidencia.lastgroup
+        valor = coincidencia.group()
+        if tipo in ('espacio', 'comentario'):
+            continue
+        if tipo == 'texto' and (len(valor) < 2 or not valor.endswith("'")):
+            raise ErrorTokenizador("texto sin cerrar")
+        if tipo == 'palabra':
+            valor = valor.upper()
+        elif tipo == 'identificador_citado':
+            tipo, valor = 'identificador', valor[1:-1].replace('""', '"')
+        if valor == ')':
+            profundidad -= 1
+            if profundidad < 0:
+                raise ErrorTokenizador("paréntesis sin abrir")
+        tokens.append(Token(tipo, valor, profundidad, inicio, posicion))
+        if valor == '(':
+            profundidad += 1
+    if profundidad:
+        raise ErrorTokenizador("paréntesis sin cerrar")
+    return tokens
+
+
+_APERTURA_MARKDOWN = re.compile(r'```[ \t]*(?:sqlite|sql)?', re.IGNORECASE)
+
+
+def extraer_sentencia(texto, final=False):
+    """(sql, completa): la primera sentencia de la respuesta del LLM, sin los ``` de markdown.
+
+    La sentencia está completa cuando llegó su ';' o el ``` de cierre, o con `final` (ya no llega más
+    texto); lo que el LLM agregue después (explicaciones, otra sentencia) queda fuera del sql.
+    Sirve para texto parcial: un ';' dentro de un texto entre comillas aún sin cerrar no cuenta.
+    """
+    cuerpo = texto.lstrip()
+    apertura = _APERTURA_MARKDOWN.match(cuerpo)
+    if apertura:
+        cuerpo = cuerpo[apertura.end():]
+    cierre = cuerpo.find('```')
+    if cierre >= 0:
+        cuerpo, final = cuerpo[:cierre], True
+    posicion = 0
+    while posicion < len(cuerpo):
+        coincidencia = _PATRON_TOKENS.match(cuerpo, posicion)
+        if not coincidencia:
+            # Carácter inválido: el validador lo rechazará con su motivo
+            break
+        if coincidencia.group() == ';':
+            return cuerpo[:coincidencia.start()].strip(), True
+        posicion = coincidencia.end()
+    return cuerpo.strip(), final
+
+
+# Palabras tras las cuales la sentencia no puede terminar
+_CONTINUAN = _NO_ALIAS | {'SELECT', 'FROM', 'BY', 'AND', 'OR', 'IN', 'IS', 'LIKE', 'GLOB', 'MATCH', 'BETWEEN',
+                          'CASE', 'WHEN', 'THEN', 'ELSE', 'DISTINCT', 'ALL', 'WITH', 'OFFSET'}
+
+
+def puede_terminar(sql):
+    """True si el SQL parcial podría ser ya la sentencia entera (tokeniza y no termina a medio camino)"""
+    try:
+        tokens = tokenizar(sql)
+    except ErrorTokenizador:
+        return False
+    if not tokens:
+        return False
+    ultimo = tokens[-1]
+    if ultimo.tipo in ('operador', 'parametro') and ultimo.valor != '*':
+        return False
+    return ultimo.valor not in ('(', ',') and not (ultimo.tipo == 'palabra' and ultimo.valor in _CONTINUAN)
+
+
+def _es_nombre(token):
+    return token.tipo in ('palabra', 'identificador')
+
+
+def analizar_from(tokens):
+    """Recorre cada FROM: retorna (alias -> tabla, número de JOINs, uniones sin condición)"""
+    alias = {}
+    joins = 0
+    sin_condicion = 0
+    for i, token in enumerate(tokens):
+        if token.tipo != 'palabra' or token.valor != 'FROM':
+            continue
+        nivel = token.profundidad
+        esperando_tabla = True
+        pendiente_condicion = False
+        j = i + 1
+        while j < len(tokens):
+            actual = tokens[j]
+            if actual.profundidad < nivel or (actual.profundidad == nivel and actual.valor in _FIN_FROM):
+                break
+            if actual.profundidad == nivel:
+                if actual.valor == ',' or actual.valor == 'JOIN':
+                    joins += 1
+                    if pendiente_condicion:
+                        sin_condicion += 1
+                    # Hasta ver ON/USING es producto cartesiano (coma, CROSS JOIN), salvo NATURAL JOIN
+                    pendiente_condicion = tokens[j - 1].valor != 'NATURAL'
+                    esperando_tabla = True
+                elif actual.valor in ('ON', 'USING'):
+                    pendiente_condicion = False
+                elif esperando_tabla and _es_nombre(actual) and actual.valor not in _NO_ALIAS:
+                    tabla = actual.valor.lower()
+                    if j + 2 < len(tokens) and tokens[j + 1].valor == '.':
+                        # esquema.tabla
+                        j += 2
+                        tabla = tokens[j].valor.lower()
+                    alias[tabla] = tabla
+                    siguiente = j + 1
+                    if siguiente < len(tokens) and tokens[siguiente].valor == 'AS':
+                        siguiente += 1
+                    if (siguiente < len(tokens) and _es_nombre(tokens[siguiente])
+                            and tokens[siguiente].valor not in _NO_ALIAS and tokens[siguiente].profundidad == nivel):
+                        alias[tokens[siguiente].valor.lower()] = tabla
+                        j = siguiente
+                    esperando_tabla = False
+                elif actual.valor == '(':
+                    esperando_tabla = False
+            j += 1
+        if pendiente_condicion:
+            sin_condicion += 1
+    return alias, joins, sin_condicion
+
+
+def _limite(tokens):
+    """(hay LIMIT de nivel 0, token de la cantidad si es un entero literal, si no None)"""
+    for i in range(len(tokens) - 1, -1, -1):
+        token = tokens[i]
+        if token.profundidad == 0 and token.valor == 'LIMIT':
+            resto = tokens[i + 1:]
+            # LIMIT cantidad [OFFSET n] o LIMIT desplazamiento, cantidad
+            if len(resto) >= 3 and resto[1].valor == ',':
+                cantidad = resto[2]
+            else:
+                cantidad = resto[0] if resto else None
+            if cantidad is not None and cantidad.tipo == 'numero' and cantidad.valor.isdigit():
+                return True, cantidad
+            return True, None
+    return False, None
+
+
+def separar_limite(tokens, limite_filas):
+    """(tope, tokens sin el LIMIT final) de un SQL ya validado, que siempre trae un LIMIT con un número entero.
+
+    tope es el LIMIT de la pregunta, o None si es el del validador (`limite_filas`, agregado o recortado).
+    Con LIMIT x OFFSET y o LIMIT y, x retorna (None, []): ese SQL se usa tal cual.
+    """
+    for i in range(len(tokens) - 1, -1, -1):
+        if tokens[i].profundidad == 0 and tokens[i].valor == 'LIMIT':
+            limite = tokens[i + 1:]
+            if len(limite) != 1 or limite[0].tipo != 'numero' or i == 0:
+                return None, []
+            tope = int(limite[0].valor, 0)
+            return (tope if tope < limite_filas else None), tokens[:i]
+    return None, tokens
+
+
+def quitar_tope(sql, limite_filas):
+    """El SQL validado sin el LIMIT que puso el validador; si el LIMIT es de la pregunta queda igual"""
+    try:
+        tokens = tokenizar(sql)
+    except ErrorTokenizador:
+        return sql
+    while tokens and tokens[-1].valor == ';':
+        tokens.pop()
+    tope, sin_limite = separar_limite(tokens, limite_filas)
+    if tope is not None or not sin_limite:
+        return sql
+    return sql[tokens[0].inicio:sin_limite[-1].fin]
+
+
+class ValidadorSQL:
+    """Valida (y acota con LIMIT) el SQL del LLM; los resultados se cachean por hash del SQL"""
+
+    def __init__(self, bd, max_joins=5, limite_filas=10000, max_filas_escaneo=5_000_000,
+                 max_escaneos_grandes=1, umbral_tabla_grande=10_000, max_entradas_cache=2048):
+        self.bd = bd
+        self.max_joins = max_joins
+        self.limite_filas = limite_filas
+        self.max_filas_escaneo = max_filas_escaneo
+        self.max_escaneos_grandes = max_escaneos_grandes
+        self.umbral_tabla_grande = umbral_tabla_grande
+        self.max_entradas_cache = max_entradas_cache
+        self._cache = OrderedDict()  # sha1 del SQL -> Validacion
+        self._esquema = None
+        self._bloqueo = threading.Lock()
+        self._estadisticas = {'aciertos': 0, 'validadas': 0, 'rechazadas': 0, 'especulativas': 0}
+
+    def validar(self, sql, marcadores=0, especulativa=False):
+        """Retorna Validacion(valido, sql_a_ejecutar, motivo); `marcadores` es cuántos ? enlaza quien la ejecuta.
+
+        `especulativa` marca las validaciones de SQL parcial mientras el LLM sigue generando: solo se
+        cachean las válidas (un prefijo a medias no volverá a pedirse) y no cuentan como validadas.
+        """
+        clave = hashlib.sha1(f"{marcadores}:{sql or ''}".encode('utf-8')).hexdigest()
+        # El EXPLAIN depende de índices y tablas: un cambio de esquema vacía la cache
+        esquema = self.bd.introspeccionar_esquema()
+        with self._bloqueo:
+            if self._esquema is not esquema:
+                self._cache.clear()
+                self._esquema = esquema
+            validacion = self._cache.get(clave)
+            if validacion is not None:
+                self._cache.move_to_end(clave)
+                if not especulativa:
+                    self._estadisticas['aciertos'] += 1
+                return validacion
+
+        validacion = self._validar(sql, marcadores, especulativa)
+        with self._bloqueo:
+            if especulativa:
+                self._estadisticas['especulativas'] += 1
+                if not validacion.valido:
+                    return validacion
+            else:
+                self._estadisticas['validadas'] += 1
+            if not validacion.valido:
+                self._estadisticas['rechazadas'] += 1
+            self._cache[clave] = validacion
+            while len(self._cache) > self.max_entradas_cache:
+                self._cache.popitem(last=False)
+        return validacion
+
+    def estadisticas(self):
+        """Retorna entradas, validaciones, rechazos y tasa de aciertos de la cache"""
+        with self._bloqueo:
+            total = self._estadisticas['aciertos'] + self._estadisticas['validadas']
+            return {
+                'entradas': len(self._cache),
+                **self._estadisticas,
+                'tasa_aciertos': self._estadisticas['aciertos'] / total if total else 0.0,
+            }
+
+    def _validar(self, sql, marcadores, especulativa=False):
+        if not sql or not sql.strip():
+            return Validacion(False, None, "consulta vacía")
+        try:
+            tokens = tokenizar(sql)
+        except ErrorTokenizador as e:
+            return Validacion(False, None, f"SQL mal formado: {e}")
+
+        # Una sola sentencia: el único ';' permitido es el final
+        while tokens and tokens[-1].valor == ';':
+            tokens.pop()
+        if not tokens:
+            return Validacion(False, None, "consulta vacía")
+        if any(token.valor == ';' for token in tokens):
+            return Validacion(False, None, "solo se permite una sentencia")
+        if tokens[0].valor not in ('SELECT', 'WITH'):
+            return Validacion(False, None, "solo se permiten consultas SELECT")
+        # Solo ? posicionales, y exactamente los que se van a enlazar (el LLM no enlaza ninguno)
+        parametros = [token for token in tokens if token.tipo == 'parametro']
+        if len(parametros) != marcadores or any(token.valor != '?' for token in parametros):
+            return Validacion(False, None, "la consulta tiene parámetros sin valor")
+
+        for i, token in enumerate(tokens):
+            if token.tipo != 'palabra':
+                continue
+            siguiente = tokens[i + 1] if i + 1 < len(tokens) else None
+            es_llamada = siguiente is not None and siguiente.valor == '('
+            if token.valor in _PROHIBIDAS and not (token.valor in _PROHIBIDAS_SALVO_FUNCION and es_llamada):
+                return Validacion(False, None, f"{token.valor} no está permitido")
+            if token.valor.lower() in _FUNCIONES_PROHIBIDAS and es_llamada:
+                return Validacion(False, None, f"la función {token.valor.lower()} no está permitida")
+
+        alias, joins, sin_condicion = analizar_from(tokens)
+        if joins > self.max_joins:
+            return Validacion(False, None, f"demasiados JOIN ({joins}, máximo {self.max_joins})")
+        tiene_where = any(token.valor == 'WHERE' for token in tokens)
+        if sin_condicion and not tiene_where:
+            return Validacion(False, None, "producto cartesiano: JOIN sin ON/USING ni WHERE")
+
+        # LIMIT obligatorio: si falta se agrega y si supera el presupuesto se recorta
+        # (rechazarlo costaría otra vuelta al LLM). Lo que sigue al último token (';', comentarios) se descarta
+        sql_final = sql[tokens[0].inicio:tokens[-1].fin]
+        tiene_limite, cantidad = _limite(tokens)
+        if not tiene_limite:
+            sql_final = f"{sql_final}\nLIMIT {self.limite_filas}"
+        elif cantidad is None:
+            return Validacion(False, None, "LIMIT debe ser un número entero")
+        elif int(cantidad.valor) > self.limite_filas:
+            sql_final = f"{sql[tokens[0].inicio:cantidad.inicio]}{self.limite_filas}{sql[cantidad.fin:tokens[-1].fin]}"
+
+        # Un prefijo especulativo que SQLite no acepta es normal: no se avisa
+        plan = self.bd.explicar(sql_final, (None,) * marcadores, avisar=not especulativa)
+        if plan is None:
+            return Validacion(False, None, "la consulta no es válida para este esquema")
+        motivo = self._revisar_plan(plan, alias)
+        if motivo:
+            return Validacion(False, None, motivo)
+        return Validacion(True, sql_final, None)
+
+    def _revisar_plan(self, plan, alias):
+        """Rechaza planes que recorren tablas enormes completas o anidan recorridos de tablas grandes"""
+        grandes = []
+        for linea in plan:
+            coincidencia = re.match(r'SCAN (\w+)', linea)
+            if not coincidencia or linea.startswith('SCAN CONSTANT'):
+                continue
+            # Una tabla FTS5 con MATCH (índice 0:M...) se consulta por su índice invertido, no se recorre
+            if re.search(r'VIRTUAL TABLE INDEX \d+:M', linea):
+                continue
+            tabla = alias.get(coincidencia.group(1).lower(), coincidencia.group(1).lower())
+            filas = self.bd.filas_estimadas(tabla)
+            if filas is None:
+                continue
+            if self.max_filas_escaneo is not None and filas > self.max_filas_escaneo:
+                return f"recorrería completa la tabla {tabla} (~{filas:,} filas) sin usar un índice"
+            if filas >= self.umbral_tabla_grande:
+                grandes.append(tabla)
+        if len(grandes) > self.max_escaneos_grandes:
+            return f"recorre completas varias tablas grandes ({', '.join(grandes)}); falta una condición de JOIN"
+        return None